@@ -1,22 +1,28 @@
-import PyPDF2
-from tqdm import tqdm
-from sentence_transformers import SentenceTransformer, CrossEncoder
-import faiss
-import numpy as np
-from langchain.schema import Document
-import torch
-from transformers import LlamaForCausalLM, LlamaTokenizer, BitsAndBytesConfig
-from langchain_text_splitters import RecursiveCharacterTextSplitter
-from langchain_community.docstore.in_memory import InMemoryDocstore
-from langchain_community.vectorstores import FAISS
+import os
+import time
 import streamlit as st
-from rank_bm25 import BM25Okapi
+from rag.bilingual import CONFIG as LANG_CONFIG
+from rag.cascade import ModelCascade
+from rag.conversation import CONFIG as CONV_CONFIG, Conversation, llm_rewriter
+from rag.corpus import load_pdf_chunks
+from rag.decision import DecisionStage
+from rag.embeddings import EmbeddingService
+from rag.flat_index import ANALYZERS, INDEX_DIR, QUERY_ANALYZERS, open_or_build
+from rag.knowledge import lookup as knowledge_lookup
+from rag.province_stores import PINNED, ProvinceStores
+from rag.retrieval import get_reranker
+from rag.selection import select_retrieve
+from rag.small_to_big import SmallToBigRetriever, load_tex_sections, tex_for_province
+from rag.tracing import tracer, current_trace
+from rag.warmup import Warmup, render_status
 
 st.title("Du lịch và Ẩm thực Việt Nam")
 
 # --- Load LLM Model Efficiently ---
-@st.cache_resource
 def load_llm_and_tokenizer():
+    # torch/transformers are imported here, in the warm-up thread, not before the page renders
+    import torch
+    from transformers import LlamaForCausalLM, LlamaTokenizer, BitsAndBytesConfig
     model_id = "llm4fun/vietrag-7b-v1.0"
     device = "cuda" if torch.cuda.is_available() else "cpu"
     tokenizer = LlamaTokenizer.from_pretrained(model_id)
@@ -24,32 +30,59 @@ def load_llm_and_tokenizer():
     model = LlamaForCausalLM.from_pretrained(model_id, quantization_config=quant_config).to(device).eval()
     return model, tokenizer, device
 
-model, tokenizer, device = load_llm_and_tokenizer()
+# "small_to_big": match sentences, answer with whole tex sections (rag.small_to_big)
+RETRIEVAL_MODE = os.getenv("RAG_RETRIEVAL_MODE", "chunks")
 
 # --- Improved Vector Store with Hybrid Search (FAISS + BM25) ---
+def create_retriever(pdf_path):
+    build_start = time.perf_counter()
+    embedding_model = warmup.result("embedder")  # batched, cached on disk
+    stem = os.path.splitext(os.path.basename(pdf_path))[0]
+    tex_path = tex_for_province(stem) if RETRIEVAL_MODE == "small_to_big" else None
+    sections = load_tex_sections([tex_path]) if tex_path else []
+    if sections:
+        retriever = SmallToBigRetriever(sections, embedding_model, LANG_CONFIG['reranker'],
+                                        ANALYZERS[LANG_CONFIG['analyzer']],
+                                        query_analyzer=QUERY_ANALYZERS.get(LANG_CONFIG['analyzer']))
+    else:
+        # flat mmap'd files under .cache/index: every Streamlit process shares one copy in the page cache
+        retriever = open_or_build(os.path.join(INDEX_DIR, stem), lambda: load_pdf_chunks([pdf_path]),
+                                  embedding_model, sources=[pdf_path], reranker_id=LANG_CONFIG['reranker'],
+                                  analyzer=LANG_CONFIG['analyzer'])
+
+    tracer.cache("embedding", embedding_model.stats["cache_hits"], embedding_model.stats["encoded"])
+    tracer.event("index_build", time.perf_counter() - build_start, source=pdf_path, chunks=len(retriever))
+    return retriever
+
+# --- Province indexes: bounded LRU (RAG_MAX_STORES), popular provinces pinned ---
+@st.cache_resource
+def get_stores():
+    return ProvinceStores(lambda province: create_retriever(f"data/{province}.pdf"), pinned=PINNED)
+
+stores = get_stores()
+
+# --- Model cascade: with RAG_CASCADE=1 a small LLM answers easy questions (rag.cascade) ---
 @st.cache_resource
-def create_vector_store(pdf_path):
-    def extract_text_from_pdf(pdf_path):
-        with open(pdf_path, "rb") as file:
-            reader = PyPDF2.PdfReader(file)
-            return [page.extract_text().strip() for page in reader.pages if page.extract_text()]
-    
-    raw_texts = extract_text_from_pdf(pdf_path)
-    docs = [Document(page_content=text) for text in raw_texts]
-    text_splitter = RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=200)
-    all_splits = text_splitter.split_documents(docs)
-
-    embedding_model = SentenceTransformer("all-mpnet-base-v2")
-    bm25 = BM25Okapi([doc.page_content.split() for doc in all_splits])  # BM25 Index
-
-    def embed_documents(texts):
-        return embedding_model.encode(texts, convert_to_tensor=True).cpu().numpy()
-
-    dimension = embedding_model.get_sentence_embedding_dimension()
-    index = faiss.IndexFlatL2(dimension)
-    vector_store = FAISS(embedding_function=embed_documents, index=index, docstore=InMemoryDocstore(), index_to_docstore_id={})
-    vector_store.add_documents(all_splits)
-    return vector_store, embedding_model, bm25, all_splits
+def get_cascade():
+    return ModelCascade()
+
+cascade = get_cascade()
+
+# --- Background warm-up: the page renders while models load ---
+@st.cache_resource
+def get_warmup():
+    warmup = Warmup()
+    warmup.submit("llm", load_llm_and_tokenizer)
+    if cascade.enabled or CONV_CONFIG['rewrite_llm']:
+        warmup.submit("small_llm", cascade.load)
+    # RAG_LANGUAGE_MODE=bilingual: multilingual embedder/reranker, language-routed BM25 (rag.bilingual)
+    warmup.submit("embedder", EmbeddingService, LANG_CONFIG['embed_model'])
+    warmup.submit("reranker", get_reranker, LANG_CONFIG['reranker'])
+    for province in PINNED:
+        warmup.submit(f"index:{province}", stores.load, province, after="embedder")
+    return warmup
+
+warmup = get_warmup()
 
 provinces = [
     "AnGiang", "BaRiaVungTau", "BacGiang", "BacKan", "BacLieu", "BacNinh", "BenTre", 
@@ -65,18 +98,29 @@ provinces = [
 ]
 
 selected_province = st.selectbox("Chọn tỉnh:", provinces)
-pdf_path = f"data/{selected_province}.pdf"
-vector_store, embedding_model, bm25, all_splits = create_vector_store(pdf_path)
+index_task = f"index:{selected_province}"
+warmup.submit(index_task, stores.load, selected_province, after="embedder")
+render_status(st, warmup, {"llm": "LLM (vietrag-7b)", "embedder": "Embedding", "reranker": "Reranker", index_task: f"Chỉ mục {selected_province}"})
+store_stats = stores.stats()
+st.sidebar.caption(f"Chỉ mục trong bộ nhớ: {store_stats['stores']}/{store_stats['max_stores']} ({store_stats['total_mb']} MB)")
 
 # --- Hybrid Retrieval (FAISS + BM25 + Reranking) ---
-def retrieve(question, topk=5):
-    bm25_scores = bm25.get_scores(question.split())
-    top_bm25_indices = np.argsort(bm25_scores)[-topk:][::-1]
-    faiss_results = vector_store.similarity_search(question, k=topk)
-    hybrid_results = [all_splits[i] for i in top_bm25_indices] + faiss_results
-    reranker = CrossEncoder("cross-encoder/ms-marco-MiniLM-L-6-v2")
-    reranked = sorted(hybrid_results, key=lambda doc: reranker.predict([question, doc.page_content]), reverse=True)
-    return reranked[:topk]
+def retrieve(turn, topk=5):
+    # [(passage, reranker score)], diverse and within the context budget (rag.selection); reloads from disk if evicted
+    retriever = stores.get(selected_province)
+    return select_retrieve(retriever, turn.standalone, topk, conversation.candidates(turn, retriever, topk))
+
+# --- Decision stage: extractive answer / "not in the documents" without the LLM (rag.decision) ---
+@st.cache_resource
+def get_decider():
+    return DecisionStage()
+
+decider = get_decider()
+
+# --- Conversation: follow-ups rewritten to standalone queries, candidates reused while the topic holds (rag.conversation) ---
+if "conversation" not in st.session_state:
+    st.session_state.conversation = Conversation(rewriter=llm_rewriter(cascade) if CONV_CONFIG['rewrite_llm'] else None)
+conversation = st.session_state.conversation
 
 # --- Improved Prompt with Few-shot & Chain-of-Thought (CoT) ---
 prompt_template = """
@@ -102,26 +146,69 @@ def get_prompt(question, contexts):
     return prompt_template.format(context=context_text, question=question)
 
 def generate(prompt, max_new_tokens=1024):
-    input_ids = tokenizer(prompt, return_tensors="pt")["input_ids"].to(device)
+    import torch
+    model, tokenizer, device = warmup.result("llm")
+    trace = current_trace()
+    with trace.stage("tokenize"):
+        input_ids = tokenizer(prompt, return_tensors="pt")["input_ids"].to(device)
     with torch.no_grad():
-        generated = model.generate(input_ids, max_new_tokens=max_new_tokens, pad_token_id=tokenizer.pad_token_id, repetition_penalty=1.13)
-    return tokenizer.batch_decode(generated[:, input_ids.shape[-1]:], skip_special_tokens=True)[0]
+        generated = model.generate(input_ids, max_new_tokens=max_new_tokens, pad_token_id=tokenizer.pad_token_id, repetition_penalty=1.13, streamer=trace.generation_streamer())
+    trace.count("prompt_tokens", input_ids.shape[-1])
+    trace.count("generated_tokens", generated.shape[-1] - input_ids.shape[-1])
+    with trace.stage("detokenize"):
+        return tokenizer.batch_decode(generated[:, input_ids.shape[-1]:], skip_special_tokens=True)[0]
 
 # --- RAG Pipeline ---
-def rag_pipeline(question, topk=5):
-    top_passages = retrieve(question, topk)
-    prompt = get_prompt(question, top_passages)
-    generated_answer = generate(prompt)
-    return {"retrieved_context": top_passages, "generated_answer": generated_answer}
+def rag_pipeline(turn, topk=5):
+    question = turn.standalone  # follow-ups carry the conversation's subject and province
+    with tracer.request(question=question, asked=turn.question, turn=turn.how, topk=topk, province=selected_province) as trace:
+        # list questions (dishes, attractions, seasons) straight from the knowledge tables, no retrieval
+        structured = knowledge_lookup(question, selected_province)
+        if structured:
+            return {"retrieved_context": [], "generated_answer": structured.answer, "decision": decider.record(structured)}
+        with trace.stage("warmup_wait"):  # nonzero only when asked before loading finished
+            warmup.result(index_task)
+            warmup.result("llm")
+        results = retrieve(turn, topk)
+        top_passages = [chunk for chunk, _ in results]
+        trace.count("context_chunks", len(top_passages))
+        with trace.stage("decision"):
+            decision = decider.decide(question, results)
+        if decision.action != "generate":
+            return {"retrieved_context": top_passages, "generated_answer": decision.answer, "decision": decision}
+        with trace.stage("prompt"):
+            prompt = get_prompt(conversation.with_history(turn), top_passages)
+        generated_answer = cascade.generate(question, top_passages, lambda: generate(prompt))
+    return {"retrieved_context": top_passages, "generated_answer": generated_answer, "decision": decision}
 
 # --- Streamlit UI ---
+if st.sidebar.button("Hội thoại mới"):
+    conversation.reset()
+if conversation.turns:
+    with st.expander(f"Hội thoại ({len(conversation.turns)} lượt gần nhất)"):
+        for past in conversation.turns:
+            st.write(f"**Hỏi:** {past.question}")
+            st.write(f"**Đáp:** {past.answer}")
 user_question = st.text_input(f"Nhập câu hỏi của bạn về {selected_province}:")
 if st.button("Hỏi"):
     if user_question:
         with st.spinner("Đang xử lý..."):
-            result = rag_pipeline(user_question, topk=5)
+            turn = conversation.prepare(user_question, selected_province)
+            result = rag_pipeline(turn, topk=5)
+            conversation.commit(turn, result["generated_answer"])
             st.write("**Câu trả lời:**")
             st.write(result["generated_answer"])
+            if turn.standalone != turn.question:
+                st.caption(f"Câu hỏi được hiểu là: {turn.standalone}")
+            decision = result["decision"]
+            if decision.action == "extractive":
+                source = decision.span["metadata"].get("source") or decision.span["metadata"].get("url", "")
+                st.caption(f"Trích nguyên văn từ {source} (ký tự {decision.span['start']}–{decision.span['end']}), không qua LLM")
+            st.sidebar.caption(f"Lượt gọi LLM đã bỏ qua: {decider.stats['llm_calls_avoided']}/{decider.stats['decisions']}")
+            if cascade.enabled:
+                st.sidebar.caption(f"LLM nhỏ trả lời: {cascade.stats['small']}/{cascade.stats['questions']}, "
+                                   f"chuyển lên 7B: {cascade.stats['escalated']}")
+            st.sidebar.caption(f"Hội thoại: {len(conversation.turns)} lượt, dùng lại ứng viên: {conversation.stats['reused']}")
             with st.expander("Ngữ cảnh được sử dụng"):
                 for i, context in enumerate(result["retrieved_context"]):
                     st.write(f"**Ngữ cảnh {i+1}:**")
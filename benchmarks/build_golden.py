@@ -0,0 +1,102 @@
+"""
+Build the retrieval golden set from search-engine/data/metadata.json.
+
+Each crawled page in metadata.json was found by a (province, category)
+search, so a question about that province and category is answered by any
+of those pages. Every (province, category) pair with crawled pages gets a
+few phrasings, Vietnamese and English, each labelled with the URLs of the
+pages that answer it.
+
+The output is committed and versioned (golden/v1.jsonl, v2, ...): change
+the templates or the corpus, then write a new version instead of
+overwriting the old one, so scores stay comparable across commits.
+
+Usage:
+    python benchmarks/build_golden.py --version 1
+"""
+
+import argparse
+import json
+import os
+import sys
+from collections import defaultdict
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from rag.corpus import CRAWL_DATA_DIR, SEARCH_ENGINE_DIR, iter_crawled_pages  # noqa: E402
+
+sys.path.insert(0, str(SEARCH_ENGINE_DIR))
+
+from provinces import fold  # noqa: E402
+
+GOLDEN_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "golden")
+
+TEMPLATES = {
+    "travel": {
+        "vi": [
+            "Những địa điểm du lịch nổi tiếng ở {name} là gì?",
+            "Đến {name} nên tham quan ở đâu?",
+        ],
+        "en": ["What are the must-visit attractions in {ascii_name}?"],
+    },
+    "food": {
+        "vi": [
+            "Món ăn đặc sản nào nên thử khi đến {name}?",
+            "Ở {name} có những món ngon nổi tiếng nào?",
+        ],
+        "en": ["What local food should I try in {ascii_name}?"],
+    },
+}
+
+
+def display_name(name: str) -> str:
+    """"TỈNH HÀ GIANG" -> "Hà Giang", "THÀNH PHỐ HÀ NỘI" -> "Hà Nội"."""
+    for prefix in ("THÀNH PHỐ ", "TỈNH "):
+        if name.startswith(prefix):
+            name = name[len(prefix):]
+    return name.title()
+
+
+def build(data_dir=CRAWL_DATA_DIR):
+    groups = defaultdict(list)
+    for page in iter_crawled_pages(data_dir):
+        groups[(page["province_id"], page["province"], page["category"])].append(page["url"])
+
+    rows = []
+    for (province_id, province, category), urls in sorted(groups.items()):
+        name = display_name(province)
+        for lang, templates in TEMPLATES.get(category, {}).items():
+            for n, template in enumerate(templates):
+                rows.append({
+                    "id": f"{province_id}-{category}-{lang}{n}",
+                    "question": template.format(name=name, ascii_name=fold(name)),
+                    "lang": lang,
+                    "province_id": province_id,
+                    "category": category,
+                    "relevant_urls": sorted(set(urls)),
+                })
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--version", type=int, required=True, help="golden set version to write")
+    parser.add_argument("--data-dir", default=str(CRAWL_DATA_DIR))
+    parser.add_argument("--force", action="store_true", help="overwrite an existing version")
+    args = parser.parse_args()
+
+    path = os.path.join(GOLDEN_DIR, f"v{args.version}.jsonl")
+    if os.path.exists(path) and not args.force:
+        print(f"{path} exists; golden sets are immutable, bump --version (or --force)")
+        sys.exit(1)
+
+    rows = build(args.data_dir)
+    os.makedirs(GOLDEN_DIR, exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        for row in rows:
+            f.write(json.dumps(row, ensure_ascii=False) + "\n")
+    print(f"Wrote {len(rows)} questions to {path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,369 @@
+"""
+Load generator for the RAG pipeline.
+
+Replays a province-weighted question mix against the service and finds the
+point where it stops keeping up.
+
+Questions come from a golden set (benchmarks/golden/*.jsonl) or from trace
+logs written with RAG_TRACE (their "question"/"province" fields). Province
+weights are the question counts in the logs, a JSON file of
+{province: weight} (--weights), or uniform.
+
+Load is either open-loop (--rps: Poisson arrivals, requests do not wait for
+each other) or closed-loop (--concurrency: N users asking back to back).
+Several comma-separated values run as consecutive steps of --duration
+seconds each. Targets:
+
+    --url http://127.0.0.1:8900   the HTTP service (python -m rag.server)
+    --in-process                  the same RagService pipeline without HTTP
+
+Per step the report has offered load, throughput, latency percentiles (end
+to end, per stage when the server traces, time to first token for
+/answer/stream), error/429/timeout rates. The saturation point is the first
+step where throughput falls below 90% of the offered rate (open loop) or
+grows by less than 10% over the previous step (closed loop), or p95 exceeds
+--slo-ms, or more than 1% of requests fail.
+
+Usage:
+    python benchmarks/load_test.py --url http://127.0.0.1:8900 --endpoint retrieve \\
+        --rps 1,2,4,8,16 --duration 30 --out load.json
+    python benchmarks/load_test.py --in-process --concurrency 1,2,4,8 --endpoint retrieve
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import subprocess
+import sys
+import time
+from collections import Counter
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+
+from retrieval_bench import GOLDEN_DIR, load_golden, percentiles  # noqa: E402
+
+ENDPOINTS = ["retrieve", "answer", "answer/stream"]
+
+
+@dataclass
+class Result:
+    ok: bool
+    latency: float
+    status: str                   # "200", "429", "504", "timeout", "error:<type>"
+    stages: Dict[str, float] = field(default_factory=dict)   # seconds
+    ttft: Optional[float] = None
+
+
+# --- question mix ---
+
+def load_questions(args) -> List[Dict]:
+    """[{"question", "province"}] with province as the service expects it (PDF stem or None)."""
+    if args.logs:
+        questions = []
+        with open(args.logs, "r", encoding="utf-8") as f:
+            for line in f:
+                record = json.loads(line)
+                if record.get("question"):
+                    questions.append({"question": record["question"], "province": record.get("province")})
+        return questions
+
+    from rag.corpus import province_pdf_names
+
+    names = province_pdf_names()
+    rows = load_golden(args.golden, args.lang)
+    return [{"question": r["question"], "province": names.get(r["province_id"])} for r in rows]
+
+
+class QuestionMix:
+    def __init__(self, questions: List[Dict], weights: Optional[Dict[str, float]] = None, seed: int = 0):
+        self.rng = random.Random(seed)
+        self.by_province: Dict[Optional[str], List[Dict]] = {}
+        for q in questions:
+            self.by_province.setdefault(q["province"], []).append(q)
+        self.provinces = list(self.by_province)
+        if weights:
+            self.weights = [weights.get(p or "all", 0.0) for p in self.provinces]
+        else:
+            # logs: weight by how often a province was asked; golden set: every province equally
+            counts = Counter(q["province"] for q in questions)
+            uniform = len(set(counts.values())) == 1
+            self.weights = [1.0 if uniform else counts[p] for p in self.provinces]
+        if not any(self.weights):
+            raise ValueError("all province weights are zero")
+
+    def sample(self) -> Dict:
+        province = self.rng.choices(self.provinces, weights=self.weights)[0]
+        return self.rng.choice(self.by_province[province])
+
+
+# --- targets ---
+
+class HttpTarget:
+    def __init__(self, url: str, endpoint: str, timeout: float, payload_extra: Dict):
+        self.url = url.rstrip("/")
+        self.endpoint = endpoint
+        self.timeout = timeout
+        self.payload_extra = payload_extra
+        self.session = None
+
+    async def start(self) -> None:
+        import aiohttp
+
+        connector = aiohttp.TCPConnector(limit=0)
+        self.session = aiohttp.ClientSession(connector=connector, timeout=aiohttp.ClientTimeout(total=self.timeout))
+
+    async def close(self) -> None:
+        await self.session.close()
+
+    async def call(self, question: Dict) -> Result:
+        import aiohttp
+
+        payload = {**question, "timeout_ms": int(self.timeout * 1000), **self.payload_extra}
+        start = time.perf_counter()
+        try:
+            async with self.session.post(f"{self.url}/{self.endpoint}", json=payload) as response:
+                if response.status != 200:
+                    await response.read()
+                    return Result(False, time.perf_counter() - start, str(response.status))
+                if self.endpoint == "answer/stream":
+                    ttft, failed = None, False
+                    async for raw in response.content:
+                        line = raw.decode("utf-8", errors="ignore")
+                        if line.startswith("event: token") and ttft is None:
+                            ttft = time.perf_counter() - start
+                        elif line.startswith("event: error"):
+                            failed = True
+                    status = "stream_error" if failed else "200"
+                    return Result(not failed, time.perf_counter() - start, status, ttft=ttft)
+                body = await response.json()
+                stages = {k: v / 1000 for k, v in body.get("stages_ms", {}).items()}
+                return Result(True, time.perf_counter() - start, "200", stages)
+        except asyncio.TimeoutError:
+            return Result(False, time.perf_counter() - start, "timeout")
+        except aiohttp.ClientError as e:
+            return Result(False, time.perf_counter() - start, f"error:{type(e).__name__}")
+
+
+class InProcessTarget:
+    """Drives rag.server.RagService directly: same batchers, no HTTP."""
+
+    def __init__(self, endpoint: str, timeout: float, payload_extra: Dict):
+        if endpoint != "retrieve" and endpoint != "answer":
+            raise ValueError("in-process mode supports the retrieve and answer endpoints")
+        self.endpoint = endpoint
+        self.timeout = timeout
+        self.payload_extra = payload_extra
+
+    async def start(self) -> None:
+        from rag import tracing
+        from rag.server import CONFIG, RagService
+
+        tracing.tracer.enabled = True  # keep per-stage timings in memory
+        self.tracer = tracing.tracer
+        self.service = RagService(CONFIG, load_llm=self.endpoint == "answer")
+        await self.service.start(None)
+        while not self.service.ready:
+            await asyncio.sleep(0.5)
+
+    async def close(self) -> None:
+        await self.service.stop(None)
+
+    async def call(self, question: Dict) -> Result:
+        from rag.batching import DeadlineExceeded, QueueFull
+        from rag.prompts import build_prompt
+
+        start = time.perf_counter()
+        payload = {**question, "timeout_ms": int(self.timeout * 1000), **self.payload_extra}
+        try:
+            req = self.service.parse(payload)
+            with self.tracer.request(question=req["question"], province=req["province"]) as trace:
+                results = await self.service.retrieve(req, trace)
+                if self.endpoint == "answer":
+                    prompt = build_prompt(req["question"], [c for c, _ in results], req["template"])
+                    with trace.stage("generate"):
+                        await self.service.generate_batcher.submit(
+                            {"prompt": prompt, "max_new_tokens": req["max_new_tokens"]},
+                            req["deadline"],
+                        )
+            return Result(True, time.perf_counter() - start, "200", dict(trace.stages))
+        except QueueFull:
+            return Result(False, time.perf_counter() - start, "429")
+        except DeadlineExceeded:
+            return Result(False, time.perf_counter() - start, "504")
+        except Exception as e:
+            return Result(False, time.perf_counter() - start, f"error:{type(e).__name__}")
+
+
+# --- load shapes ---
+
+async def open_loop(target, mix: QuestionMix, rps: float, duration: float, rng: random.Random) -> List[Result]:
+    tasks = []
+    start = time.perf_counter()
+    next_at = start
+    while True:
+        next_at += rng.expovariate(rps)
+        if next_at - start >= duration:
+            break
+        await asyncio.sleep(max(0.0, next_at - time.perf_counter()))
+        tasks.append(asyncio.create_task(target.call(mix.sample())))
+    return list(await asyncio.gather(*tasks))
+
+
+async def closed_loop(target, mix: QuestionMix, concurrency: int, duration: float) -> List[Result]:
+    results: List[Result] = []
+    end = time.perf_counter() + duration
+
+    async def user():
+        while time.perf_counter() < end:
+            results.append(await target.call(mix.sample()))
+
+    await asyncio.gather(*(user() for _ in range(concurrency)))
+    return results
+
+
+def summarize(results: List[Result], offered: Dict, elapsed: float) -> Dict:
+    ok = [r for r in results if r.ok]
+    statuses = Counter(r.status for r in results)
+    n = max(len(results), 1)
+    stages: Dict[str, List[float]] = {}
+    for r in ok:
+        for stage, seconds in r.stages.items():
+            stages.setdefault(stage, []).append(seconds)
+    ttfts = [r.ttft for r in ok if r.ttft is not None]
+    return {
+        **offered,
+        "requests": len(results),
+        "ok": len(ok),
+        "throughput_rps": round(len(ok) / elapsed, 3) if elapsed else 0.0,
+        "error_rate": round((len(results) - len(ok)) / n, 4),
+        "rejected_rate": round(statuses.get("429", 0) / n, 4),
+        "timeout_rate": round((statuses.get("504", 0) + statuses.get("timeout", 0)) / n, 4),
+        "statuses": dict(statuses),
+        "latency_ms": percentiles([r.latency for r in ok]),
+        "stages_ms": {stage: percentiles(values) for stage, values in sorted(stages.items())},
+        **({"ttft_ms": percentiles(ttfts)} if ttfts else {}),
+    }
+
+
+def find_saturation(steps: List[Dict], mode: str, slo_ms: Optional[float]) -> Optional[Dict]:
+    previous = None
+    for step in steps:
+        reasons = []
+        if mode == "rps" and step["throughput_rps"] < 0.9 * step["offered_rps"]:
+            reasons.append("throughput below 90% of offered load")
+        if mode == "concurrency" and previous and step["throughput_rps"] < 1.1 * previous["throughput_rps"]:
+            reasons.append("throughput grew less than 10%")
+        if slo_ms and step["latency_ms"].get("p95", 0) > slo_ms:
+            reasons.append(f"p95 above {slo_ms} ms")
+        if step["error_rate"] > 0.01:
+            reasons.append("more than 1% errors")
+        if reasons:
+            return {"step": step.get("offered_rps", step.get("concurrency")), "reasons": reasons,
+                    "max_sustained_rps": previous["throughput_rps"] if previous else 0.0}
+        previous = step
+    return None
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=BENCH_DIR, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+async def run(args) -> Dict:
+    weights = None
+    if args.weights:
+        with open(args.weights, "r", encoding="utf-8") as f:
+            weights = json.load(f)
+    mix = QuestionMix(load_questions(args), weights, args.seed)
+    extra = {"topk": args.topk}
+    if args.endpoint != "retrieve":
+        extra["max_new_tokens"] = args.max_new_tokens
+
+    if args.in_process:
+        target = InProcessTarget(args.endpoint, args.timeout, extra)
+    else:
+        target = HttpTarget(args.url, args.endpoint, args.timeout, extra)
+    await target.start()
+
+    mode = "rps" if args.rps else "concurrency"
+    levels = [float(x) for x in (args.rps or args.concurrency).split(",")]
+    rng = random.Random(args.seed)
+    steps = []
+    try:
+        if args.warmup:
+            await closed_loop(target, mix, 1, args.warmup)
+        for level in levels:
+            print(f"Step {mode}={level:g} for {args.duration:g}s...", file=sys.stderr)
+            start = time.perf_counter()
+            if mode == "rps":
+                results = await open_loop(target, mix, level, args.duration, rng)
+                offered = {"offered_rps": level}
+            else:
+                results = await closed_loop(target, mix, int(level), args.duration)
+                offered = {"concurrency": int(level)}
+            step = summarize(results, offered, time.perf_counter() - start)
+            steps.append(step)
+            print(f"  {step['throughput_rps']:.2f} req/s, p50 {step['latency_ms'].get('p50', 0):.0f} ms, "
+                  f"p95 {step['latency_ms'].get('p95', 0):.0f} ms, errors {step['error_rate']:.1%}", file=sys.stderr)
+    finally:
+        await target.close()
+
+    return {
+        "run": {
+            "commit": git_commit(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "target": "in-process" if args.in_process else args.url,
+            "endpoint": args.endpoint,
+            "mode": mode,
+            "duration_s": args.duration,
+            "questions": args.logs or os.path.basename(args.golden),
+            "seed": args.seed,
+        },
+        "steps": steps,
+        "saturation": find_saturation(steps, mode, args.slo_ms),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    target = parser.add_mutually_exclusive_group()
+    target.add_argument("--url", default="http://127.0.0.1:8900")
+    target.add_argument("--in-process", action="store_true")
+    load = parser.add_mutually_exclusive_group(required=True)
+    load.add_argument("--rps", help="open-loop request rates, e.g. 1,2,4,8")
+    load.add_argument("--concurrency", help="closed-loop user counts, e.g. 1,2,4,8")
+    parser.add_argument("--endpoint", choices=ENDPOINTS, default="retrieve")
+    parser.add_argument("--duration", type=float, default=30.0, help="seconds per step")
+    parser.add_argument("--warmup", type=float, default=5.0, help="seconds of single-user traffic first")
+    parser.add_argument("--timeout", type=float, default=60.0, help="per-request deadline in seconds")
+    parser.add_argument("--slo-ms", type=float, default=None, help="p95 latency objective")
+    parser.add_argument("--golden", default=os.path.join(GOLDEN_DIR, "v1.jsonl"))
+    parser.add_argument("--lang", choices=["vi", "en"], default=None)
+    parser.add_argument("--logs", default=None, help="replay questions from a RAG_TRACE JSONL file")
+    parser.add_argument("--weights", default=None, help="JSON {province: weight}; 'all' for no province")
+    parser.add_argument("--topk", type=int, default=5)
+    parser.add_argument("--max-new-tokens", type=int, default=256)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", default=None, help="write the JSON report here (default: stdout)")
+    args = parser.parse_args()
+
+    report = asyncio.run(run(args))
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+        print(f"Report written to {args.out}", file=sys.stderr)
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
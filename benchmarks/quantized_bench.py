@@ -0,0 +1,168 @@
+"""
+Quantized candidate generation vs exact search: recall, latency and memory.
+
+Opens a flat index directory (rag.flat_index) and answers the same queries
+with:
+
+    exact            faiss IndexFlatL2 over all vectors in RAM (the reference)
+    binary           IndexBinaryFlat Hamming candidates + exact rescoring
+    binary_hnsw      IndexBinaryHNSW (--hnsw-m) candidates + exact rescoring
+    int8             8-bit IndexScalarQuantizer candidates + exact rescoring
+
+each quantized variant at several oversampling factors (candidates = k x
+oversample). recall@k is the overlap with the exact top-k; latency is per
+single query, as the apps search. Memory compares the resident codes with
+the float32 vectors the exact index keeps in RAM.
+
+Queries are the golden-set questions embedded with the index's model
+(--queries golden), or stored vectors plus Gaussian noise (--queries sample),
+which needs no model and works on synthetic corpora from scale_corpus.py.
+
+Usage:
+    python benchmarks/quantized_bench.py .cache/index/all [--queries golden|sample] [--k 10]
+        [--oversample 1,4,10,20] [--hnsw-m 32] [--limit N] [--offline] [--out quant.json]
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+from typing import Dict, List
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+
+from retrieval_bench import GOLDEN_DIR, load_golden, percentiles  # noqa: E402
+
+
+def golden_queries(manifest: Dict, golden_path: str, limit: int, gpu: bool):
+    from rag.embeddings import EmbeddingService
+
+    model_id = manifest["model_key"].rsplit("-", 3)[0]  # "<model>-<backend>-<precision>-<norm>"
+    embedder = EmbeddingService(model_id, device="cuda" if gpu else "cpu",
+                                normalize=manifest["model_key"].endswith("-norm"))
+    if embedder.model_key != manifest["model_key"]:
+        print(f"Index was built with {manifest['model_key']}, embedding queries with {embedder.model_key}")
+    questions = [row["question"] for row in load_golden(golden_path, limit=limit)]
+    return embedder.embed_queries(questions)
+
+
+def sample_queries(vectors, count: int, noise: float, seed: int = 0):
+    import numpy as np
+
+    rng = np.random.default_rng(seed)
+    ids = rng.choice(len(vectors), min(count, len(vectors)), replace=False)
+    picked = np.asarray(vectors[np.sort(ids)], dtype=np.float32)
+    scale = noise * float(np.linalg.norm(picked, axis=1).mean()) / np.sqrt(picked.shape[1])
+    return picked + rng.normal(0.0, scale, picked.shape).astype(np.float32)
+
+
+def time_search(index, queries, k: int):
+    labels, seconds = [], []
+    for q in queries:
+        start = time.perf_counter()
+        _, found = index.search(q[None, :], k)
+        seconds.append(time.perf_counter() - start)
+        labels.append([int(i) for i in found[0] if i >= 0])
+    return labels, seconds
+
+
+def recall(found: List[List[int]], exact: List[List[int]], k: int) -> float:
+    return sum(len(set(f[:k]) & set(e[:k])) / max(len(e[:k]), 1) for f, e in zip(found, exact)) / max(len(exact), 1)
+
+
+def print_report(report: Dict) -> None:
+    k, exact = report["k"], report["exact"]
+    print(f"\n{report['chunks']} chunks, {report['dim']}-d, {report['queries']} queries ({report['query_source']})")
+    print(f"{'variant':<22}{'oversample':>11}{f'recall@{k}':>11}{'p50 ms':>10}{'p95 ms':>10}{'RAM MB':>10}")
+    print(f"{'exact (IndexFlatL2)':<22}{'-':>11}{1.0:>11.4f}{exact['latency_ms']['p50']:>10.3f}"
+          f"{exact['latency_ms']['p95']:>10.3f}{exact['ram_mb']:>10.2f}")
+    for row in report["variants"]:
+        print(f"{row['variant']:<22}{row['oversample']:>11}{row['recall']:>11.4f}{row['latency_ms']['p50']:>10.3f}"
+              f"{row['latency_ms']['p95']:>10.3f}{row['ram_mb']:>10.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("index", help="flat index directory")
+    parser.add_argument("--queries", choices=["golden", "sample"], default="golden")
+    parser.add_argument("--golden", default=os.path.join(GOLDEN_DIR, "v1.jsonl"))
+    parser.add_argument("--samples", type=int, default=500, help="--queries sample: how many")
+    parser.add_argument("--noise", type=float, default=0.3, help="--queries sample: relative noise")
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--oversample", default="1,4,10,20", help="comma-separated factors")
+    parser.add_argument("--hnsw-m", type=int, default=32, help="0 skips binary_hnsw")
+    parser.add_argument("--limit", type=int, default=None, help="first N golden questions only")
+    parser.add_argument("--offline", action="store_true", help="do not contact the Hugging Face hub")
+    parser.add_argument("--gpu", action="store_true", help="allow CUDA (default: CPU only)")
+    parser.add_argument("--out", default=None, help="write the report as JSON")
+    args = parser.parse_args()
+
+    if args.offline:
+        os.environ["HF_HUB_OFFLINE"] = "1"
+        os.environ["TRANSFORMERS_OFFLINE"] = "1"
+    if not args.gpu:
+        os.environ["CUDA_VISIBLE_DEVICES"] = ""
+
+    import faiss
+    import numpy as np
+
+    from rag.flat_index import MmapFlatL2, read_manifest, resolve
+    from rag.quantized import QuantizedL2, build_codes
+
+    root = resolve(args.index)
+    manifest = read_manifest(root)
+    if manifest is None:
+        print(f"No flat index at {args.index}")
+        sys.exit(1)
+    mapped = MmapFlatL2(root, manifest)
+    if args.queries == "golden":
+        queries = golden_queries(manifest, args.golden, args.limit, args.gpu)
+    else:
+        queries = sample_queries(mapped.vectors, args.samples, args.noise)
+    queries = np.ascontiguousarray(queries, dtype=np.float32)
+
+    exact_index = faiss.IndexFlatL2(manifest["dim"])
+    exact_index.add(np.ascontiguousarray(mapped.vectors))
+    exact, seconds = time_search(exact_index, queries, args.k)
+    report = {
+        "index": str(root),
+        "chunks": manifest["chunks"],
+        "dim": manifest["dim"],
+        "queries": len(queries),
+        "query_source": args.queries,
+        "k": args.k,
+        "exact": {"latency_ms": percentiles(seconds),
+                  "ram_mb": round(manifest["chunks"] * manifest["dim"] * 4 / 2**20, 2)},
+        "builds": [],
+        "variants": [],
+    }
+
+    variants = [("binary", "binary", 0), ("int8", "int8", 0)]
+    if args.hnsw_m:
+        variants.insert(1, ("binary_hnsw", "binary", args.hnsw_m))
+    factors = [int(f) for f in args.oversample.split(",")]
+    for name, kind, hnsw_m in variants:
+        print(f"Quantizing: {name}...")
+        report["builds"].append({"variant": name, **build_codes(root, kind, hnsw_m)})
+        for factor in factors:
+            index = QuantizedL2(root, manifest, kind, hnsw_m=hnsw_m, oversample=factor)
+            found, seconds = time_search(index, queries, args.k)
+            report["variants"].append({
+                "variant": name,
+                "oversample": factor,
+                "recall": round(recall(found, exact, args.k), 4),
+                "latency_ms": percentiles(seconds),
+                "ram_mb": round(index.code_bytes / 2**20, 2),
+            })
+
+    print_report(report)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"\nReport written to {args.out}")
+
+
+if __name__ == "__main__":
+    main()
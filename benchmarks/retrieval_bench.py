@@ -0,0 +1,284 @@
+"""
+Retrieval quality and speed benchmark.
+
+Indexes the crawled pages (search-engine/data, via metadata.json) with the
+same HybridRetriever the apps use, runs every question of a golden set
+through each retrieval configuration and reports:
+
+    quality  recall@k, hit@k, MRR and nDCG@k, scored on URLs (a chunk counts
+             as its source page; repeated pages are collapsed before scoring)
+    speed    per-stage latency percentiles (bm25, embed_query, dense, rerank)
+             from rag.tracing, plus end-to-end per query
+    memory   RSS after indexing, peak RSS, FAISS index size
+
+Configurations: bm25, dense, hybrid (reciprocal rank fusion), hybrid_rerank
+(BM25 + dense candidates reranked by the cross-encoder, as in the apps) and
+small_to_big (sentences reranked, their parent sections returned; see
+rag.small_to_big). context_chars@k is the text the top k contexts would put
+in a prompt.
+
+--analyzer bilingual tokenizes BM25 per language and translates English
+questions for the lexical side (rag.bilingual); compare it with --lang en and
+a multilingual --embed-model / --reranker.
+
+Defaults are small CPU models, so the run fits a laptop; with --offline the
+models must already be in the Hugging Face cache.
+
+Usage:
+    python benchmarks/retrieval_bench.py [--golden benchmarks/golden/v1.jsonl]
+        [--configs bm25,dense,hybrid,hybrid_rerank] [--k 1,5,10] [--limit N]
+        [--lang vi] [--analyzer whitespace|bilingual] [--offline] [--out results.json]
+
+Example:
+    python benchmarks/retrieval_bench.py --offline --limit 100 --out bench.json
+"""
+
+import argparse
+import json
+import math
+import os
+import resource
+import sys
+import time
+from typing import Dict, List, Sequence
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+GOLDEN_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "golden")
+CONFIGS = ["bm25", "dense", "hybrid", "hybrid_rerank", "small_to_big"]
+PERCENTILES = (50, 90, 95, 99)
+
+
+# --- metrics (binary relevance on deduplicated URL rankings) ---
+
+def dedupe(urls: Sequence[str]) -> List[str]:
+    seen = {}
+    for url in urls:
+        seen.setdefault(url, None)
+    return list(seen)
+
+
+def recall_at_k(ranking: Sequence[str], relevant: set, k: int) -> float:
+    return len(set(ranking[:k]) & relevant) / len(relevant) if relevant else 0.0
+
+
+def hit_at_k(ranking: Sequence[str], relevant: set, k: int) -> float:
+    return float(any(url in relevant for url in ranking[:k]))
+
+
+def reciprocal_rank(ranking: Sequence[str], relevant: set) -> float:
+    for rank, url in enumerate(ranking, 1):
+        if url in relevant:
+            return 1.0 / rank
+    return 0.0
+
+
+def ndcg_at_k(ranking: Sequence[str], relevant: set, k: int) -> float:
+    dcg = sum(1.0 / math.log2(rank + 1) for rank, url in enumerate(ranking[:k], 1) if url in relevant)
+    ideal = sum(1.0 / math.log2(rank + 1) for rank in range(1, min(k, len(relevant)) + 1))
+    return dcg / ideal if ideal else 0.0
+
+
+def percentiles(values: Sequence[float]) -> Dict[str, float]:
+    if not values:
+        return {}
+    ordered = sorted(values)
+    out = {}
+    for p in PERCENTILES:
+        idx = min(len(ordered) - 1, max(0, math.ceil(p / 100 * len(ordered)) - 1))
+        out[f"p{p}"] = round(ordered[idx] * 1000, 3)
+    out["mean"] = round(sum(ordered) / len(ordered) * 1000, 3)
+    return out
+
+
+def rss_mb() -> float:
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2**20
+    except OSError:
+        return float("nan")
+
+
+def peak_rss_mb() -> float:
+    # ru_maxrss is KiB on Linux, bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (2**20 if sys.platform == "darwin" else 2**10)
+
+
+# --- benchmark ---
+
+def load_golden(path: str, lang: str = None, limit: int = None) -> List[Dict]:
+    with open(path, "r", encoding="utf-8") as f:
+        rows = [json.loads(line) for line in f if line.strip()]
+    if lang:
+        rows = [r for r in rows if r["lang"] == lang]
+    return rows[:limit] if limit else rows
+
+
+def rank_chunks(retriever, config: str, question: str, depth: int, candidates: int) -> List:
+    if config == "bm25":
+        return [i for i, _ in retriever.bm25_search(question, depth)]
+    if config == "dense":
+        return [i for i, _ in retriever.dense_search(question, depth)]
+    if config == "hybrid":
+        return [i for i, _ in retriever.hybrid_search(question, depth, candidates=depth)]
+    if config == "hybrid_rerank":
+        return [i for i, _ in retriever.rerank(question, retriever.candidates(question, candidates))]
+    if config == "small_to_big":
+        # (parent, matched sentences): depth parents from `candidates` reranked sentences
+        return retriever.rank_parents(question, depth, candidates)
+    raise ValueError(f"unknown config {config!r}")
+
+
+def run_config(retriever, bench_tracer, config: str, golden: List[Dict], ks: List[int],
+               depth: int, candidates: int) -> Dict:
+    sums = {f"{name}@{k}": 0.0 for k in ks for name in ("recall", "hit", "ndcg")}
+    sums["mrr"] = 0.0
+    sums.update({f"context_chars@{k}": 0.0 for k in ks})
+    totals, stages = [], {}
+    for row in golden:
+        relevant = set(row["relevant_urls"])
+        with bench_tracer.request(id=row["id"], config=config) as trace:
+            ranked = rank_chunks(retriever, config, row["question"], depth, candidates)
+        if config == "small_to_big":
+            contexts = [retriever.context(p, positions) for p, positions in ranked]
+        else:
+            contexts = [retriever.chunks[i] for i in ranked]
+        urls = dedupe(c.metadata["url"] for c in contexts)
+        for k in ks:
+            sums[f"recall@{k}"] += recall_at_k(urls, relevant, k)
+            sums[f"hit@{k}"] += hit_at_k(urls, relevant, k)
+            sums[f"ndcg@{k}"] += ndcg_at_k(urls, relevant, k)
+        sums["mrr"] += reciprocal_rank(urls, relevant)
+        for k in ks:
+            sums[f"context_chars@{k}"] += sum(len(c.page_content) for c in contexts[:k])
+        totals.append(trace.total)
+        for stage, seconds in trace.stages.items():
+            stages.setdefault(stage, []).append(seconds)
+
+    n = max(len(golden), 1)
+    return {
+        "quality": {name: round(value / n, 4) for name, value in sums.items()},
+        "latency_ms": {"total": percentiles(totals), **{s: percentiles(v) for s, v in sorted(stages.items())}},
+    }
+
+
+def print_report(report: Dict, ks: List[int]) -> None:
+    columns = [f"recall@{k}" for k in ks] + [f"hit@{k}" for k in ks] + ["mrr"] + [f"ndcg@{k}" for k in ks]
+    print(f"\n{'config':<15}" + "".join(f"{c:>10}" for c in columns) + f"{'p50 ms':>10}{'p95 ms':>10}")
+    for config, result in report["configs"].items():
+        quality, total = result["quality"], result["latency_ms"]["total"]
+        print(f"{config:<15}" + "".join(f"{quality[c]:>10.4f}" for c in columns)
+              + f"{total.get('p50', 0):>10.2f}{total.get('p95', 0):>10.2f}")
+
+    print("\nContext size (characters of the top k contexts, mean per question):")
+    for config, result in report["configs"].items():
+        print(f"  {config:<15}" + "  ".join(f"@{k}={result['quality'][f'context_chars@{k}']:.0f}" for k in ks))
+
+    print("\nPer-stage latency (ms):")
+    for config, result in report["configs"].items():
+        for stage, stats in result["latency_ms"].items():
+            if stage != "total":
+                print(f"  {config:<15}{stage:<13}" + "  ".join(f"{p}={v:.2f}" for p, v in stats.items()))
+
+    mem, build = report["memory_mb"], report["build"]
+    print(f"\nIndex: {build['chunks']} chunks from {build['pages']} pages in {build['seconds']:.1f}s "
+          f"(embedding cache hits {build['embedding_cache_hits']}/{build['chunks']})")
+    print(f"Memory: RSS after build {mem['rss_after_build']:.0f} MB, peak {mem['peak_rss']:.0f} MB, "
+          f"FAISS index {mem['faiss_index']:.1f} MB")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--golden", default=os.path.join(GOLDEN_DIR, "v1.jsonl"))
+    parser.add_argument("--configs", default=",".join(CONFIGS))
+    parser.add_argument("--k", default="1,5,10", help="comma-separated cutoffs")
+    parser.add_argument("--depth", type=int, default=50, help="chunks retrieved per query before URL dedup")
+    parser.add_argument("--candidates", type=int, default=20, help="BM25 and dense candidates each for reranking")
+    parser.add_argument("--embed-model", default="all-MiniLM-L6-v2")
+    parser.add_argument("--reranker", default="cross-encoder/ms-marco-MiniLM-L-6-v2")
+    parser.add_argument("--analyzer", choices=["whitespace", "bilingual"], default="whitespace", help="BM25 tokenization")
+    parser.add_argument("--data-dir", default=None, help="crawled data (default search-engine/data)")
+    parser.add_argument("--lang", choices=["vi", "en"], default=None)
+    parser.add_argument("--limit", type=int, default=None, help="first N questions only")
+    parser.add_argument("--offline", action="store_true", help="do not contact the Hugging Face hub")
+    parser.add_argument("--gpu", action="store_true", help="allow CUDA (default: CPU only)")
+    parser.add_argument("--out", default=None, help="write the full report as JSON")
+    args = parser.parse_args()
+
+    if args.offline:
+        os.environ["HF_HUB_OFFLINE"] = "1"
+        os.environ["TRANSFORMERS_OFFLINE"] = "1"
+    if not args.gpu:
+        os.environ["CUDA_VISIBLE_DEVICES"] = ""
+
+    from rag.corpus import CRAWL_DATA_DIR, load_crawled_chunks
+    from rag.embeddings import EmbeddingService
+    from rag.flat_index import ANALYZERS, QUERY_ANALYZERS
+    from rag.retrieval import HybridRetriever
+    from rag.tracing import Tracer
+
+    configs = [c.strip() for c in args.configs.split(",") if c.strip()]
+    unknown = set(configs) - set(CONFIGS)
+    if unknown:
+        print(f"Unknown config(s): {', '.join(sorted(unknown))}")
+        sys.exit(1)
+    ks = sorted(int(k) for k in args.k.split(","))
+    golden = load_golden(args.golden, args.lang, args.limit)
+    if not golden:
+        print(f"No questions in {args.golden}")
+        sys.exit(1)
+
+    build_start = time.perf_counter()
+    chunks = load_crawled_chunks(args.data_dir or CRAWL_DATA_DIR)
+    embedder = EmbeddingService(args.embed_model, device="cuda" if args.gpu else "cpu")
+    analyzers = {"analyzer": ANALYZERS[args.analyzer], "query_analyzer": QUERY_ANALYZERS.get(args.analyzer)}
+    retriever = HybridRetriever(chunks, embedder, reranker_id=args.reranker, **analyzers)
+    build_seconds = time.perf_counter() - build_start
+    rss_after_build = rss_mb()
+    if "hybrid_rerank" in configs:
+        from rag.retrieval import get_reranker
+        get_reranker(args.reranker)  # keep model loading out of the latency numbers
+
+    bench_tracer = Tracer(enabled=True)
+    report = {
+        "golden": os.path.basename(args.golden),
+        "questions": len(golden),
+        "models": {"embedding": args.embed_model, "reranker": args.reranker, "analyzer": args.analyzer},
+        "params": {"k": ks, "depth": args.depth, "candidates": args.candidates, "lang": args.lang},
+        "build": {
+            "pages": len({c.metadata["url"] for c in chunks}),
+            "chunks": len(chunks),
+            "seconds": round(build_seconds, 3),
+            "embedding_cache_hits": embedder.stats["cache_hits"],
+        },
+        "configs": {},
+    }
+    small_to_big = None
+    if "small_to_big" in configs:
+        from rag.small_to_big import SmallToBigRetriever, load_crawled_sections
+
+        start = time.perf_counter()
+        small_to_big = SmallToBigRetriever(load_crawled_sections(args.data_dir or CRAWL_DATA_DIR), embedder,
+                                           reranker_id=args.reranker, **analyzers)
+        report["build"]["small_to_big"] = {"parents": len(small_to_big.chunks), "units": len(small_to_big),
+                                           "seconds": round(time.perf_counter() - start, 3)}
+    for config in configs:
+        print(f"Running {config} on {len(golden)} questions...")
+        report["configs"][config] = run_config(small_to_big if config == "small_to_big" else retriever,
+                                               bench_tracer, config, golden, ks, args.depth, args.candidates)
+
+    report["memory_mb"] = {
+        "rss_after_build": round(rss_after_build, 1),
+        "peak_rss": round(peak_rss_mb(), 1),
+        "faiss_index": round(retriever.index.ntotal * retriever.index.d * 4 / 2**20, 2),
+    }
+    print_report(report, ks)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"\nReport written to {args.out}")
+
+
+if __name__ == "__main__":
+    main()
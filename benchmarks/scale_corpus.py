@@ -0,0 +1,209 @@
+"""
+Synthesize a larger travel corpus for stress-testing indexing and retrieval.
+
+Sources are the crawled pages (search-engine/data, via metadata.json) and
+the raw page dumps in travel/{odd,even}/<province id>_<slug>_<idx>.txt.
+For every (province, category) pair the generator writes `scale` times as
+many documents as the sources have, so the province/category distribution
+is preserved. A synthetic document:
+
+    - takes its paragraph count from the source length distribution,
+    - draws paragraphs from the same province and category; a share of them
+      comes from another province of the same category, with the province
+      name swapped in, so the vocabulary keeps growing with the corpus,
+    - drops or reorders some sentences, so chunks are not verbatim copies
+      (which would make the embedding cache hide the real cost).
+
+Output uses the crawler layout (<out>/<id>/<category>/<n>_tag.txt plus
+<out>/metadata.json), so rag.corpus.load_crawled_chunks(<out>) reads it
+like the real corpus. An existing <out> is replaced only if an earlier run
+created it (it holds a .generated_by_scale_corpus marker) and it neither
+is, contains nor lies inside a source directory.
+
+Usage:
+    python benchmarks/scale_corpus.py --scale 10 --out /tmp/corpus_x10 [--seed 0]
+"""
+
+import argparse
+import json
+import os
+import random
+import re
+import shutil
+import sys
+import time
+from collections import defaultdict
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from rag.corpus import CRAWL_DATA_DIR, SEARCH_ENGINE_DIR, TRAVEL_DIR, iter_crawled_pages, read_tag_text  # noqa: E402
+
+# only a directory carrying this file is ever deleted by --out
+MARKER = ".generated_by_scale_corpus"
+
+sys.path.insert(0, str(SEARCH_ENGINE_DIR))
+
+from provinces import province_dict  # noqa: E402
+
+CONFIG = {
+    'min_paragraph_chars': 60,    # shorter lines are menus, dates, breadcrumbs
+    'foreign_share': 0.3,         # paragraphs borrowed from another province
+    'sentence_drop': 0.15,
+    'sentence_shuffle': 0.2,      # chance to shuffle a paragraph's sentences
+}
+
+TRAVEL_FILE_RE = re.compile(r"^(\d+)_(.+)_(\d+)\.txt$")
+FOOD_HINTS = ("ẩm thực", "món", "ăn", "đặc sản", "quán", "food")
+SENTENCE_RE = re.compile(r"(?<=[.!?])\s+")
+
+Pool = Dict[Tuple[int, str], Dict[str, list]]
+
+
+def province_names() -> Dict[int, str]:
+    names = {}
+    for name, pid in province_dict.items():
+        for prefix in ("THÀNH PHỐ ", "TỈNH "):
+            if name.startswith(prefix):
+                name = name[len(prefix):]
+        names[pid] = name.title()
+    return names
+
+
+def paragraphs(text: str) -> List[str]:
+    return [line.strip() for line in text.splitlines() if len(line.strip()) >= CONFIG['min_paragraph_chars']]
+
+
+def guess_category(title: str) -> str:
+    lowered = title.lower()
+    return "food" if any(hint in lowered for hint in FOOD_HINTS) else "travel"
+
+
+def load_pool(data_dir=CRAWL_DATA_DIR, travel_dir=TRAVEL_DIR) -> Pool:
+    """Paragraphs, titles and document lengths per (province id, category)."""
+    pool: Pool = defaultdict(lambda: {"paragraphs": [], "titles": [], "lengths": []})
+
+    def add(key, title, paras):
+        if paras:
+            entry = pool[key]
+            entry["paragraphs"].extend(paras)
+            entry["titles"].append(title)
+            entry["lengths"].append(len(paras))
+
+    for page in iter_crawled_pages(data_dir):
+        add((page["province_id"], page["category"]), page["title"], paragraphs(read_tag_text(page["source"])))
+
+    for path in sorted(Path(travel_dir).glob("*/*.txt")):
+        match = TRAVEL_FILE_RE.match(path.name)
+        if not match:
+            continue
+        text = path.read_text(encoding="utf-8", errors="ignore")
+        title = text.split("\n", 1)[0].strip()
+        add((int(match.group(1)), guess_category(title)), title, paragraphs(text))
+    return dict(pool)
+
+
+def perturb(paragraph: str, rng: random.Random) -> str:
+    sentences = SENTENCE_RE.split(paragraph)
+    if len(sentences) > 2:
+        kept = [s for s in sentences if rng.random() >= CONFIG['sentence_drop']] or sentences[:1]
+        if rng.random() < CONFIG['sentence_shuffle']:
+            rng.shuffle(kept)
+        sentences = kept
+    return " ".join(sentences)
+
+
+def synthesize(key, pool: Pool, names: Dict[int, str], by_category: Dict[str, list],
+               rng: random.Random) -> Tuple[str, str]:
+    pid, category = key
+    entry = pool[key]
+    own_name = names.get(pid, "")
+    donors = [k for k in by_category[category] if k != key]
+    body = []
+    for _ in range(rng.choice(entry["lengths"])):
+        if donors and rng.random() < CONFIG['foreign_share']:
+            donor = rng.choice(donors)
+            paragraph = rng.choice(pool[donor]["paragraphs"])
+            donor_name = names.get(donor[0])
+            if donor_name and own_name:
+                paragraph = paragraph.replace(donor_name, own_name)
+        else:
+            paragraph = rng.choice(entry["paragraphs"])
+        body.append(perturb(paragraph, rng))
+    return rng.choice(entry["titles"]), "\n".join(body)
+
+
+def write_corpus(pool: Pool, out_dir: Path, scale: float, seed: int) -> Dict:
+    rng = random.Random(seed)
+    names = province_names()
+    by_category = defaultdict(list)
+    for key in pool:
+        by_category[key[1]].append(key)
+
+    provinces = defaultdict(lambda: defaultdict(list))
+    n_docs = n_bytes = 0
+    for key in sorted(pool):
+        pid, category = key
+        target = max(1, round(len(pool[key]["titles"]) * scale))
+        folder = out_dir / str(pid) / category
+        folder.mkdir(parents=True, exist_ok=True)
+        for idx in range(1, target + 1):
+            title, body = synthesize(key, pool, names, by_category, rng)
+            url = f"https://synthetic.invalid/{pid}/{category}/{idx}"
+            text = f"Title: {title}\nURL: {url}\n\nContent with tag:\n" + \
+                "\n".join(f"[P] {line}" for line in body.split("\n"))
+            path = folder / f"{idx}_tag.txt"
+            path.write_text(text, encoding="utf-8")
+            n_docs += 1
+            n_bytes += len(text.encode("utf-8"))
+            provinces[pid][category].append({
+                "idx": idx, "title": title, "url": url, "json_path": "", "txt_path": "",
+                # relative to the parent of out_dir, like search-engine/ for data/
+                "tag_txt_path": f"{out_dir.name}/{pid}/{category}/{idx}_tag.txt",
+            })
+
+    ids = {pid: name for name, pid in province_dict.items()}
+    metadata = {"provinces": [
+        {"id": pid, "name": ids.get(pid, str(pid)),
+         "content": [{"category": c, "items": items} for c, items in sorted(cats.items())]}
+        for pid, cats in sorted(provinces.items())
+    ]}
+    with open(out_dir / "metadata.json", "w", encoding="utf-8") as f:
+        json.dump(metadata, f, ensure_ascii=False, indent=2)
+    return {"documents": n_docs, "bytes": n_bytes}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scale", type=float, required=True, help="documents per source document (10, 100, ...)")
+    parser.add_argument("--out", required=True, help="output directory (replaced if it exists)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--data-dir", default=str(CRAWL_DATA_DIR))
+    parser.add_argument("--travel-dir", default=str(TRAVEL_DIR))
+    args = parser.parse_args()
+
+    out_dir = Path(args.out).resolve()
+    for source in (Path(args.data_dir).resolve(), Path(args.travel_dir).resolve()):
+        if out_dir == source or out_dir in source.parents or source in out_dir.parents:
+            print(f"--out {out_dir} overlaps the source directory {source}; refusing to write there")
+            sys.exit(1)
+    if out_dir.exists():
+        if not (out_dir / MARKER).is_file():
+            print(f"{out_dir} exists and was not written by this script (no {MARKER}); refusing to replace it")
+            sys.exit(1)
+        shutil.rmtree(out_dir)
+    out_dir.mkdir(parents=True)
+    (out_dir / MARKER).write_text(f"scale={args.scale} seed={args.seed}\n", encoding="utf-8")
+
+    start = time.perf_counter()
+    pool = load_pool(args.data_dir, args.travel_dir)
+    sources = sum(len(e["titles"]) for e in pool.values())
+    print(f"Sources: {sources} documents in {len(pool)} province/category groups")
+    stats = write_corpus(pool, out_dir, args.scale, args.seed)
+    elapsed = time.perf_counter() - start
+    print(f"Wrote {stats['documents']} documents ({stats['bytes'] / 2**20:.1f} MB) to {out_dir} in {elapsed:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,199 @@
+"""
+Index-scaling load test over synthetic corpora.
+
+For each corpus (generated by scale_corpus.py, or the real search-engine/data)
+a fresh subprocess builds the indexes and reports, so RSS numbers do not leak
+from one size to the next:
+
+    build     load + chunk, embed, BM25Okapi build, FAISS IndexFlatL2 add (s)
+    memory    RSS before/after the build and peak RSS (MB); FAISS index,
+              chunk text (the docstore) and BM25 postings sizes (MB)
+    queries   BM25, dense and hybrid latency percentiles (ms) over golden
+              questions
+
+--random-vectors swaps the embedding model for deterministic random vectors
+of the same dimension: embedding cost grows linearly and is already covered
+by rag.embeddings, so this isolates the index structures at 100x sizes.
+
+Usage:
+    python benchmarks/scale_load.py --corpus /tmp/corpus_x10 --corpus /tmp/corpus_x100
+        [--scales 10,100 --work-dir /tmp]  [--random-vectors] [--out scale.json]
+
+Example:
+    python benchmarks/scale_load.py --scales 1,10,50 --work-dir /tmp/scale --random-vectors
+"""
+
+import argparse
+import json
+import os
+import random
+import subprocess
+import sys
+import time
+from typing import Dict, List
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+
+from retrieval_bench import GOLDEN_DIR, load_golden, peak_rss_mb, percentiles, rss_mb  # noqa: E402
+
+
+class RandomEmbedder:
+    """Deterministic per-text random vectors with the EmbeddingService interface."""
+
+    def __init__(self, dimension: int = 384):
+        self.dimension = dimension
+        self.stats = {"texts": 0, "cache_hits": 0, "encoded": 0}
+
+    def _vector(self, text: str):
+        import numpy as np
+
+        from rag.embeddings import text_key
+
+        rng = np.random.default_rng(int.from_bytes(text_key(text)[:8], "little"))
+        return rng.standard_normal(self.dimension, dtype=np.float32)
+
+    def encode(self, texts):
+        import numpy as np
+
+        texts = list(texts)
+        self.stats["texts"] += len(texts)
+        self.stats["encoded"] += len(texts)
+        if not texts:
+            return np.zeros((0, self.dimension), dtype=np.float32)
+        return np.stack([self._vector(t) for t in texts])
+
+    def embed_query(self, text: str):
+        return self._vector(text).tolist()
+
+
+def bm25_postings_mb(bm25) -> float:
+    # rank_bm25 keeps one term-frequency dict per document plus the idf table
+    entries = sum(len(doc) for doc in bm25.doc_freqs) + len(bm25.idf)
+    return entries * 100 / 2**20  # ~100 bytes per CPython dict entry with str key + int
+
+
+def measure(corpus: str, args) -> Dict:
+    """Build the indexes for one corpus in this process and time queries."""
+    from rag.corpus import load_crawled_chunks
+    from rag.retrieval import HybridRetriever
+
+    rss_before = rss_mb()
+    timings = {}
+    start = time.perf_counter()
+    chunks = load_crawled_chunks(corpus)
+    timings["load_chunk_s"] = time.perf_counter() - start
+
+    if args.random_vectors:
+        embedder = RandomEmbedder(args.dimension)
+    else:
+        from rag.embeddings import EmbeddingService
+        embedder = EmbeddingService(args.embed_model, device="cpu", cache_dir=args.cache_dir)
+    start = time.perf_counter()
+    vectors = embedder.encode([c.page_content for c in chunks])
+    timings["embed_s"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    retriever = HybridRetriever(chunks, embedder, reranker_id=None, vectors=vectors)
+    timings["index_s"] = time.perf_counter() - start  # BM25 + FAISS add, vectors are precomputed
+    del vectors
+
+    golden = load_golden(args.golden)
+    rng = random.Random(0)
+    questions = [rng.choice(golden)["question"] for _ in range(args.queries)]
+    latencies = {"bm25": [], "dense": [], "hybrid": []}
+    for question in questions:
+        for name, search in (("bm25", retriever.bm25_search), ("dense", retriever.dense_search),
+                             ("hybrid", retriever.hybrid_search)):
+            start = time.perf_counter()
+            search(question, 10)
+            latencies[name].append(time.perf_counter() - start)
+
+    rss_after = rss_mb()
+    text_bytes = sum(len(c.page_content.encode("utf-8")) for c in chunks)
+    return {
+        "corpus": corpus,
+        "documents": len({c.metadata["url"] for c in chunks}),
+        "chunks": len(chunks),
+        "build_s": {k: round(v, 3) for k, v in timings.items()},
+        "memory_mb": {
+            "rss_before": round(rss_before, 1),
+            "rss_after": round(rss_after, 1),
+            "peak_rss": round(peak_rss_mb(), 1),
+            "faiss_index": round(retriever.index.ntotal * retriever.index.d * 4 / 2**20, 1),
+            "chunk_text": round(text_bytes / 2**20, 1),
+            "bm25_postings_est": round(bm25_postings_mb(retriever.bm25), 1),
+        },
+        "query_latency_ms": {name: percentiles(values) for name, values in latencies.items()},
+    }
+
+
+def run_isolated(corpus: str, argv: List[str]) -> Dict:
+    cmd = [sys.executable, os.path.abspath(__file__), "--single", corpus] + argv
+    proc = subprocess.run(cmd, stdout=subprocess.PIPE, text=True)
+    if proc.returncode != 0:
+        return {"corpus": corpus, "error": f"exit code {proc.returncode}"}
+    return json.loads(proc.stdout.strip().splitlines()[-1])
+
+
+def print_table(results: List[Dict]) -> None:
+    print(f"\n{'corpus':<28}{'docs':>8}{'chunks':>9}{'embed s':>9}{'index s':>9}"
+          f"{'peak MB':>9}{'faiss MB':>9}{'bm25 p95':>10}{'dense p95':>10}{'hybrid p95':>11}")
+    for r in results:
+        if "error" in r:
+            print(f"{os.path.basename(r['corpus']):<28} failed: {r['error']}")
+            continue
+        q, m, b = r["query_latency_ms"], r["memory_mb"], r["build_s"]
+        print(f"{os.path.basename(r['corpus'].rstrip('/')):<28}{r['documents']:>8}{r['chunks']:>9}"
+              f"{b['embed_s']:>9.1f}{b['index_s']:>9.1f}{m['peak_rss']:>9.0f}{m['faiss_index']:>9.1f}"
+              f"{q['bm25']['p95']:>10.2f}{q['dense']['p95']:>10.2f}{q['hybrid']['p95']:>11.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--corpus", action="append", default=[], help="generated corpus dir (repeatable)")
+    parser.add_argument("--scales", default=None, help="generate these scales first, e.g. 1,10,100")
+    parser.add_argument("--work-dir", default="/tmp/viettravel_scale", help="where --scales corpora go")
+    parser.add_argument("--golden", default=os.path.join(GOLDEN_DIR, "v1.jsonl"))
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--embed-model", default="all-MiniLM-L6-v2")
+    parser.add_argument("--cache-dir", default="", help="embedding cache (default: off, to measure real cost)")
+    parser.add_argument("--random-vectors", action="store_true")
+    parser.add_argument("--dimension", type=int, default=384, help="vector size for --random-vectors")
+    parser.add_argument("--out", default=None, help="write results as JSON")
+    parser.add_argument("--single", default=None, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.single:
+        print(json.dumps(measure(args.single, args)))
+        return
+
+    corpora = list(args.corpus)
+    if args.scales:
+        for scale in args.scales.split(","):
+            out = os.path.join(args.work_dir, f"corpus_x{scale}")
+            subprocess.run([sys.executable, os.path.join(BENCH_DIR, "scale_corpus.py"),
+                            "--scale", scale, "--out", out], check=True)
+            corpora.append(out)
+    if not corpora:
+        print("Nothing to measure: pass --corpus and/or --scales")
+        sys.exit(1)
+
+    child_args = ["--golden", args.golden, "--queries", str(args.queries), "--embed-model", args.embed_model,
+                  "--cache-dir", args.cache_dir, "--dimension", str(args.dimension)]
+    if args.random_vectors:
+        child_args.append("--random-vectors")
+
+    results = []
+    for corpus in corpora:
+        print(f"Measuring {corpus}...")
+        results.append(run_isolated(corpus, child_args))
+    print_table(results)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+        print(f"\nResults written to {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,150 @@
+"""
+Startup profile for the Streamlit apps: where do the cold-start seconds go?
+
+1. Import time, measured with `python -X importtime` in fresh interpreters:
+     eager  the modules the apps used to import at the top of the script
+            (torch, transformers, langchain, sentence_transformers, faiss, ...)
+     lazy   what the apps import now before the first render
+   Each group runs in one interpreter in the listed order, so a module
+   already pulled in by an earlier one costs nothing the second time.
+
+2. Warm-up, measured in this process with rag.warmup.Warmup exactly as the
+   apps schedule it: embedder, reranker, LLM (with --llm) and one province
+   index, run concurrently; reports each task and the time until all ready.
+
+Usage:
+    python benchmarks/startup_profile.py [--warmup] [--llm] [--province HaNoi] [--out startup.json]
+"""
+
+import argparse
+import json
+import os
+import re
+import subprocess
+import sys
+import time
+from typing import Dict, List
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+GROUPS = {
+    "eager": ["PyPDF2", "tqdm", "sentence_transformers", "faiss", "numpy", "langchain.schema", "torch",
+              "transformers", "langchain_text_splitters", "langchain_community.docstore.in_memory",
+              "langchain_community.vectorstores", "streamlit", "rank_bm25"],
+    "lazy": ["time", "tqdm", "streamlit", "rag.corpus", "rag.embeddings", "rag.retrieval", "rag.tracing",
+             "rag.warmup"],
+}
+
+IMPORTTIME_RE = re.compile(r"^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)$")
+
+
+def profile_imports(modules: List[str]) -> Dict:
+    """Cumulative import seconds per listed module, in one fresh interpreter."""
+    code = "\n".join(
+        f"try:\n    import {m}\nexcept Exception as e:\n    print('FAILED {m}', type(e).__name__, flush=True)"
+        for m in modules
+    )
+    start = time.perf_counter()
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", code], cwd=ROOT,
+                          capture_output=True, text=True)
+    wall = time.perf_counter() - start
+
+    cumulative = {}
+    for line in proc.stderr.splitlines():
+        match = IMPORTTIME_RE.match(line)
+        if match and len(match.group(3)) == 1:  # top level: one space after the bar
+            cumulative[match.group(4)] = int(match.group(2)) / 1e6
+    failed = {line.split()[1] for line in proc.stdout.splitlines() if line.startswith("FAILED ")}
+
+    rows = []
+    for m in modules:
+        if m in failed:
+            rows.append({"module": m, "seconds": None, "note": "not installed / import error"})
+        elif m in cumulative:
+            rows.append({"module": m, "seconds": round(cumulative[m], 4)})
+        else:
+            # a parent package or an earlier module already imported it
+            rows.append({"module": m, "seconds": 0.0, "note": "already loaded"})
+    heaviest = sorted(cumulative.items(), key=lambda kv: kv[1], reverse=True)[:10]
+    return {
+        "interpreter_wall_s": round(wall, 3),
+        "modules": rows,
+        "heaviest_top_level": [{"module": m, "seconds": round(s, 4)} for m, s in heaviest],
+    }
+
+
+def profile_warmup(province: str, with_llm: bool) -> Dict:
+    from rag.corpus import PDF_DIR, load_pdf_chunks
+    from rag.embeddings import EmbeddingService
+    from rag.retrieval import HybridRetriever, get_reranker
+    from rag.warmup import Warmup
+
+    def load_llm():
+        from rag.generation import Generator
+        return Generator()
+
+    def build_index(pdf_path):
+        return HybridRetriever(load_pdf_chunks([pdf_path]), warmup.result("embedder"))
+
+    start = time.perf_counter()
+    warmup = Warmup()
+    names = ["embedder", "reranker", f"index:{province}"]
+    warmup.submit("embedder", EmbeddingService, "all-mpnet-base-v2")
+    warmup.submit("reranker", get_reranker)
+    warmup.submit(names[-1], build_index, os.path.join(str(PDF_DIR), f"{province}.pdf"), after="embedder")
+    if with_llm:
+        warmup.submit("llm", load_llm)
+        names.append("llm")
+    first_render = time.perf_counter() - start  # everything above returns immediately
+
+    for name in names:
+        try:
+            warmup.result(name)
+        except Exception:
+            pass  # reported through status()
+    return {
+        "submit_s": round(first_render, 4),
+        "all_ready_s": round(time.perf_counter() - start, 3),
+        "tasks": warmup.status(),
+    }
+
+
+def print_report(report: Dict) -> None:
+    for group, result in report["imports"].items():
+        print(f"\n[{group}] imports: {result['interpreter_wall_s']:.2f}s interpreter wall time")
+        for row in result["modules"]:
+            seconds = f"{row['seconds']:.3f}s" if row["seconds"] is not None else "-"
+            print(f"  {row['module']:<42}{seconds:>10}  {row.get('note', '')}")
+    if "warmup" in report:
+        warm = report["warmup"]
+        print(f"\nWarm-up: page can render after {warm['submit_s'] * 1000:.1f} ms, "
+              f"everything ready after {warm['all_ready_s']:.1f}s")
+        for name, info in warm["tasks"].items():
+            seconds = f"{info['seconds']:.2f}s" if info["seconds"] is not None else "-"
+            print(f"  {name:<24}{info['state']:<9}{seconds:>9}  {info['error'] or ''}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--warmup", action="store_true", help="also time model loading and one index build")
+    parser.add_argument("--llm", action="store_true", help="include the 7B LLM in the warm-up")
+    parser.add_argument("--province", default="HaNoi")
+    parser.add_argument("--out", default=None, help="write the report as JSON")
+    args = parser.parse_args()
+
+    report = {"python": sys.version.split()[0], "imports": {}}
+    for group, modules in GROUPS.items():
+        report["imports"][group] = profile_imports(modules)
+    if args.warmup or args.llm:
+        report["warmup"] = profile_warmup(args.province, args.llm)
+
+    print_report(report)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"\nReport written to {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,6 @@
+"""
+Shared retrieval/generation building blocks for the Streamlit apps.
+
+The app scripts at the repository root import from here instead of each
+carrying its own copy of the embedding, retrieval and generation code.
+"""
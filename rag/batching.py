@@ -0,0 +1,137 @@
+"""
+Dynamic micro-batching for the HTTP service.
+
+A MicroBatcher owns a bounded asyncio queue and one worker task. Requests
+submit a payload and await its result; the worker takes the first queued
+item, keeps collecting until `max_batch` items or `max_wait` seconds have
+passed, drops items whose deadline already expired, and runs the blocking
+batch function once in its own single-thread executor (one model, one
+thread, no contention with the event loop). Batchers that drive the same
+model pass one executor, so their batches take turns on its thread.
+
+    embed = MicroBatcher("embed", embedder.embed_queries, max_batch=32)
+    await embed.start()
+    vector = await embed.submit("Hà Nội có gì?", deadline=time.monotonic() + 5)
+
+submit() raises QueueFull when the queue is at capacity (the service turns
+that into 429) and DeadlineExceeded when the result would arrive too late.
+"""
+
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional
+
+
+class QueueFull(Exception):
+    pass
+
+
+class DeadlineExceeded(Exception):
+    pass
+
+
+@dataclass
+class _Item:
+    payload: Any
+    deadline: Optional[float]
+    future: asyncio.Future
+
+
+class MicroBatcher:
+    def __init__(self, name: str, fn: Callable[[List[Any]], List[Any]], max_batch: int = 16,
+                 max_wait: float = 0.005, max_queue: int = 256, executor: Optional[ThreadPoolExecutor] = None):
+        self.name = name
+        self.fn = fn
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.max_queue = max_queue
+        self.queue: Optional[asyncio.Queue] = None
+        self.executor = executor or ThreadPoolExecutor(max_workers=1, thread_name_prefix=f"batch-{name}")
+        self._task: Optional[asyncio.Task] = None
+        self.stats: Dict[str, int] = {"batches": 0, "items": 0, "largest_batch": 0, "rejected": 0, "expired": 0}
+
+    async def start(self) -> None:
+        if self._task is None:
+            self.queue = asyncio.Queue(maxsize=self.max_queue)
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        self.executor.shutdown(wait=False)
+
+    @property
+    def depth(self) -> int:
+        return self.queue.qsize() if self.queue else 0
+
+    async def submit(self, payload: Any, deadline: Optional[float] = None) -> Any:
+        """Queue one payload and wait for its result; deadline is a time.monotonic() value."""
+        future = asyncio.get_running_loop().create_future()
+        try:
+            self.queue.put_nowait(_Item(payload, deadline, future))
+        except asyncio.QueueFull:
+            self.stats["rejected"] += 1
+            raise QueueFull(f"{self.name} queue is full ({self.max_queue})")
+        if deadline is None:
+            return await future
+        try:
+            return await asyncio.wait_for(future, timeout=max(0.0, deadline - time.monotonic()))
+        except asyncio.TimeoutError:
+            raise DeadlineExceeded(f"deadline passed while waiting for {self.name}")
+
+    async def _collect(self) -> List[_Item]:
+        batch = [await self.queue.get()]
+        loop = asyncio.get_running_loop()
+        end = loop.time() + self.max_wait
+        while len(batch) < self.max_batch:
+            try:
+                batch.append(self.queue.get_nowait())
+                continue
+            except asyncio.QueueEmpty:
+                pass
+            remaining = end - loop.time()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self.queue.get(), timeout=remaining))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = await self._collect()
+            now = time.monotonic()
+            live = []
+            for item in batch:
+                if item.future.done():  # caller gave up (deadline or disconnect)
+                    self.stats["expired"] += 1
+                elif item.deadline is not None and item.deadline <= now:
+                    self.stats["expired"] += 1
+                    item.future.set_exception(DeadlineExceeded(f"deadline passed in the {self.name} queue"))
+                else:
+                    live.append(item)
+            if not live:
+                continue
+
+            self.stats["batches"] += 1
+            self.stats["items"] += len(live)
+            self.stats["largest_batch"] = max(self.stats["largest_batch"], len(live))
+            try:
+                results = await loop.run_in_executor(self.executor, self.fn, [item.payload for item in live])
+            except Exception as e:
+                for item in live:
+                    if not item.future.done():
+                        item.future.set_exception(e)
+                continue
+            for item, result in zip(live, results):
+                if not item.future.done():
+                    item.future.set_result(result)
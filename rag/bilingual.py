@@ -0,0 +1,213 @@
+"""
+Vietnamese/English retrieval over one shared index.
+
+The default models are English-centric (all-mpnet-base-v2, the ms-marco
+cross-encoder) while the corpus is Vietnamese, and BM25 matches Vietnamese
+surface forms only, so an English question finds little. With
+RAG_LANGUAGE_MODE=bilingual:
+
+    dense    a multilingual sentence-transformers model embeds Vietnamese
+             chunks and questions in either language into one space
+    rerank   a multilingual cross-encoder (mMARCO)
+    BM25     "bilingual" analyzer: each chunk is routed by language ID
+             (search-engine/text_norm.detect_language, pure Python, ~µs) to
+             the Vietnamese analyzer (words plus diacritic-folded forms, so
+             "ha noi" matches "Hà Nội") or the English one (stopwords
+             dropped, plurals made singular)
+    queries  an English question is translated to Vietnamese (opus-mt-en-vi)
+             for the lexical side only; translations are cached in memory and
+             in SQLite, so a repeated question costs a lookup
+
+Chunks are indexed once, in their own language; nothing is duplicated per
+language. The default mode ("vi") keeps the current models and whitespace
+BM25, so existing indexes stay valid.
+
+    from rag.bilingual import CONFIG as LANG_CONFIG
+    embedder = EmbeddingService(LANG_CONFIG['embed_model'])
+    retriever = open_or_build(path, load_chunks, embedder, analyzer=LANG_CONFIG['analyzer'],
+                              reranker_id=LANG_CONFIG['reranker'])
+"""
+
+import os
+import re
+import sqlite3
+import sys
+import threading
+import unicodedata
+from collections import OrderedDict
+from functools import lru_cache
+from pathlib import Path
+from typing import List, Optional
+
+from rag.corpus import SEARCH_ENGINE_DIR
+from rag.retrieval import RERANKER_ID
+from rag.tracing import current_trace
+
+MODES = {
+    "vi": {
+        "embed_model": "all-mpnet-base-v2",
+        "reranker": RERANKER_ID,
+        "analyzer": "whitespace",
+    },
+    "bilingual": {
+        "embed_model": "paraphrase-multilingual-mpnet-base-v2",
+        "reranker": "cross-encoder/mmarco-mMiniLMv2-L12-H384-v1",
+        "analyzer": "bilingual",
+    },
+}
+MODE = os.getenv("RAG_LANGUAGE_MODE", "vi")
+CONFIG = {
+    'mode': MODE,
+    **MODES.get(MODE, MODES["vi"]),
+    'translator': os.getenv("RAG_TRANSLATOR", "Helsinki-NLP/opus-mt-en-vi"),
+    'translation_cache': os.getenv("RAG_TRANSLATION_CACHE", ".cache/translations.sqlite"),  # "" disables
+    'memory_cache_size': 1024,
+}
+
+TOKEN_RE = re.compile(r"[^\W_]+")
+KEEP_ENGLISH = {"food", "visit", "best", "eat", "try"}  # function words elsewhere, content words here
+
+
+@lru_cache(maxsize=1)
+def _text_norm():
+    """search-engine/text_norm.py: language ID and diacritic folding, shared with the crawler side."""
+    if str(SEARCH_ENGINE_DIR) not in sys.path:
+        sys.path.insert(0, str(SEARCH_ENGINE_DIR))
+    import text_norm
+
+    return text_norm
+
+
+def detect_language(text: str) -> str:
+    return _text_norm().detect_language(text)
+
+
+def _tokens(text: str) -> List[str]:
+    return TOKEN_RE.findall(unicodedata.normalize("NFC", text).lower())
+
+
+def vietnamese_analyzer(text: str) -> List[str]:
+    tokens = []
+    for token in _tokens(text):
+        tokens.append(token)
+        folded = _text_norm().fold_diacritics(token)
+        if folded != token:
+            tokens.append(folded)
+    return tokens
+
+
+def _singular(token: str) -> str:
+    if len(token) <= 3 or not token.endswith("s") or token.endswith("ss"):
+        return token
+    if token.endswith("ies"):
+        return token[:-3] + "y"
+    if token.endswith(("ches", "shes", "xes", "sses")):
+        return token[:-2]
+    return token[:-1]
+
+
+def english_analyzer(text: str) -> List[str]:
+    stopwords = _text_norm().ENGLISH_WORDS
+    tokens = []
+    for token in _tokens(text):
+        if token in stopwords and token not in KEEP_ENGLISH:
+            continue
+        tokens.append(_singular(token))
+    return tokens
+
+
+def bilingual_analyzer(text: str) -> List[str]:
+    """Document side: each chunk is analyzed in the language it is written in."""
+    return english_analyzer(text) if detect_language(text[:2000]) == "en" else vietnamese_analyzer(text)
+
+
+def bilingual_query_analyzer(question: str) -> List[str]:
+    """Query side: English questions also match Vietnamese chunks through a cached translation."""
+    trace = current_trace()
+    if detect_language(question) != "en":
+        return vietnamese_analyzer(question)
+    trace.count("query_lang_en", 1)
+    with trace.stage("translate"):
+        translated = get_translator().translate(question)
+    return english_analyzer(question) + vietnamese_analyzer(translated)
+
+
+class TranslationCache:
+    """SQLite (model, text) -> translation, shared by every process on the host."""
+
+    def __init__(self, path: str):
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("CREATE TABLE IF NOT EXISTS translations (model TEXT, source TEXT, target TEXT,"
+                          " PRIMARY KEY (model, source))")
+        self.conn.commit()
+        self.lock = threading.Lock()
+
+    def get(self, model: str, source: str) -> Optional[str]:
+        with self.lock:
+            row = self.conn.execute("SELECT target FROM translations WHERE model = ? AND source = ?",
+                                    (model, source)).fetchone()
+        return row[0] if row else None
+
+    def put(self, model: str, source: str, target: str) -> None:
+        with self.lock:
+            self.conn.execute("INSERT OR REPLACE INTO translations VALUES (?, ?, ?)", (model, source, target))
+            self.conn.commit()
+
+
+class QueryTranslator:
+    """English -> Vietnamese for short queries; the model loads on the first cache miss."""
+
+    def __init__(self, model_id: str = CONFIG['translator'], cache_path: Optional[str] = CONFIG['translation_cache'],
+                 memory_size: int = CONFIG['memory_cache_size']):
+        self.model_id = model_id
+        self.cache = TranslationCache(cache_path) if cache_path else None
+        self.memory: "OrderedDict[str, str]" = OrderedDict()
+        self.memory_size = memory_size
+        self.lock = threading.Lock()
+        self.model = None
+        self.tokenizer = None
+        self.stats = {"requests": 0, "memory_hits": 0, "disk_hits": 0, "translated": 0}
+
+    def _load(self) -> None:
+        from transformers import MarianMTModel, MarianTokenizer
+
+        self.tokenizer = MarianTokenizer.from_pretrained(self.model_id)
+        self.model = MarianMTModel.from_pretrained(self.model_id).eval()
+
+    def _translate(self, text: str) -> str:
+        import torch
+
+        with self.lock:
+            if self.model is None:
+                self._load()
+            batch = self.tokenizer([text], return_tensors="pt", truncation=True, max_length=128)
+            with torch.no_grad():
+                generated = self.model.generate(**batch, num_beams=2, max_new_tokens=128)
+            return self.tokenizer.decode(generated[0], skip_special_tokens=True)
+
+    def translate(self, text: str) -> str:
+        key = " ".join(unicodedata.normalize("NFC", text).split())
+        self.stats["requests"] += 1
+        if key in self.memory:
+            self.memory.move_to_end(key)
+            self.stats["memory_hits"] += 1
+            return self.memory[key]
+        target = self.cache.get(self.model_id, key) if self.cache else None
+        if target is not None:
+            self.stats["disk_hits"] += 1
+        else:
+            target = self._translate(key)
+            self.stats["translated"] += 1
+            if self.cache:
+                self.cache.put(self.model_id, key, target)
+        self.memory[key] = target
+        if len(self.memory) > self.memory_size:
+            self.memory.popitem(last=False)
+        return target
+
+
+@lru_cache(maxsize=1)
+def get_translator() -> QueryTranslator:
+    return QueryTranslator()
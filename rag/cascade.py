@@ -0,0 +1,170 @@
+"""
+Model cascade: a small LLM answers easy questions, vietrag-7b the rest.
+
+On CPU (or the 4GB RTX 3050 the project targets) the 7B model is most of
+the latency. Short factual questions over a small context rarely need it,
+so with RAG_CASCADE=1 every question is routed first:
+
+    route        open-ended wording (itinerary, compare, why, ...), a question
+                 over CONFIG['max_question_words'] or contexts over
+                 CONFIG['max_context_words'] go straight to the large tier
+    small tier   CONFIG['small_model'] (an instruct model with a chat
+                 template) answers from the same contexts, greedily, with at
+                 most CONFIG['small_max_new_tokens'] tokens
+    check        the answer escalates to the large tier if it is empty, if
+                 less than CONFIG['min_grounding'] of its words occur in the
+                 contexts, or if CONFIG['consistency_samples'] sampled answers
+                 share less than CONFIG['min_agreement'] of its words
+                 (self-consistency; 0 samples skips the check)
+
+Every routed question is logged (logger.info, and a "cascade_small" /
+"cascade_large" tracer event with the reason, the check scores and the
+tier's latency), so the thresholds can be tuned from the RAG_TRACE file;
+stats holds the running totals. With RAG_CASCADE unset, generate() calls
+the large tier directly and the small model is never loaded.
+
+    cascade = ModelCascade()
+    answer = cascade.generate(question, contexts, lambda: generate(prompt))
+"""
+
+import logging
+import os
+import re
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+from rag.decision import OPEN_RE
+from rag.tracing import current_trace, tracer
+
+logger = logging.getLogger(__name__)
+
+CONFIG = {
+    'enabled': os.getenv("RAG_CASCADE", "0") == "1",
+    'small_model': os.getenv("RAG_SMALL_LLM", "Qwen/Qwen2.5-1.5B-Instruct"),
+    'max_question_words': int(os.getenv("RAG_CASCADE_QUESTION_WORDS", "25")),
+    'max_context_words': int(os.getenv("RAG_CASCADE_CONTEXT_WORDS", "1200")),
+    'small_max_new_tokens': 256,
+    'min_grounding': float(os.getenv("RAG_CASCADE_GROUNDING", "0.6")),
+    'consistency_samples': int(os.getenv("RAG_CASCADE_SAMPLES", "1")),
+    'min_agreement': float(os.getenv("RAG_CASCADE_AGREEMENT", "0.4")),
+    'temperature': 0.7,
+}
+
+WORD_RE = re.compile(r"[^\W_]+")
+SYSTEM_PROMPT = ("Bạn là trợ lý du lịch. Trả lời ngắn gọn, chính xác, chỉ dựa trên ngữ cảnh được cung cấp, "
+                 "bằng ngôn ngữ của câu hỏi. / Answer briefly, using only the given context, "
+                 "in the language of the question.")
+
+
+def _words(text: str) -> List[str]:
+    return WORD_RE.findall(text.lower())
+
+
+def grounding(answer: str, context_words: set) -> float:
+    """Share of the answer's words that occur in the contexts."""
+    words = _words(answer)
+    return sum(w in context_words for w in words) / len(words) if words else 0.0
+
+
+def agreement(answer: str, other: str) -> float:
+    """Jaccard overlap of the two answers' word sets."""
+    a, b = set(_words(answer)), set(_words(other))
+    return len(a & b) / len(a | b) if a | b else 0.0
+
+
+class ModelCascade:
+    def __init__(self, config: Dict = CONFIG):
+        self.config = config
+        self.enabled = config['enabled']
+        self.small = None
+        self.lock = threading.Lock()
+        self.stats = {"questions": 0, "small": 0, "large": 0, "escalated": 0,
+                      "small_seconds": 0.0, "large_seconds": 0.0}
+
+    def load(self):
+        """The small tier's Generator; loaded once, on first use or from a warm-up thread."""
+        with self.lock:
+            if self.small is None:
+                from rag.generation import Generator
+
+                self.small = Generator(self.config['small_model'], load_in_4bit=False)
+        return self.small
+
+    def route(self, question: str, contexts: Sequence) -> Tuple[str, str]:
+        """("small" | "large", reason) before anything is generated."""
+        if not self.enabled:
+            return "large", "cascade off"
+        if OPEN_RE.search(question):
+            return "large", "open-ended question"
+        if len(_words(question)) > self.config['max_question_words']:
+            return "large", "long question"
+        context_words = sum(len(_words(c.page_content)) for c in contexts)
+        if context_words > self.config['max_context_words']:
+            return "large", f"{context_words} context words"
+        return "small", "short question, small context"
+
+    def small_prompt(self, question: str, contexts: Sequence) -> str:
+        context = "\n\n".join(f"[{i + 1}] {c.page_content}" for i, c in enumerate(contexts))
+        messages = [{"role": "system", "content": SYSTEM_PROMPT},
+                    {"role": "user", "content": f"Ngữ cảnh / Context:\n{context}\n\nCâu hỏi / Question: {question}"}]
+        return self.small.tokenizer.apply_chat_template(messages, tokenize=False, add_generation_prompt=True)
+
+    def answer_small(self, question: str, contexts: Sequence) -> Tuple[Optional[str], Dict]:
+        """The small tier's answer, or None when a check says escalate; the dict has the check scores."""
+        small = self.load()
+        prompt = self.small_prompt(question, contexts)
+        max_new_tokens = self.config['small_max_new_tokens']
+        answer = small.generate([prompt], max_new_tokens)[0].strip()
+        checks: Dict = {}
+        if not answer:
+            return None, {"reason": "empty answer"}
+        context_words = {w for c in contexts for w in _words(c.page_content)}
+        checks["grounding"] = round(grounding(answer, context_words), 3)
+        if checks["grounding"] < self.config['min_grounding']:
+            return None, {**checks, "reason": "ungrounded answer"}
+        samples = self.config['consistency_samples']
+        if samples > 0:
+            others = small.generate([prompt] * samples, max_new_tokens, temperature=self.config['temperature'])
+            checks["agreement"] = round(min(agreement(answer, other) for other in others), 3)
+            if checks["agreement"] < self.config['min_agreement']:
+                return None, {**checks, "reason": "inconsistent samples"}
+        return answer, {**checks, "reason": "accepted"}
+
+    def record(self, tier: str, seconds: float, **fields) -> None:
+        """Per-tier latency and the routing decision: stats, the request's trace, a tracer event and the log."""
+        self.stats[f"{tier}_seconds"] += seconds
+        trace = current_trace()
+        trace.set("cascade_tier", tier)
+        trace.set("cascade_reason", fields.get("reason"))
+        tracer.event(f"cascade_{tier}", seconds, **fields)
+        logger.info(f"cascade: {tier} tier {seconds:.2f}s, {fields}")
+
+    def try_small(self, question: str, contexts: Sequence) -> Tuple[Optional[str], str]:
+        """(small tier answer, reason) for easy questions; (None, reason) means use the large tier."""
+        tier, reason = self.route(question, contexts)
+        if tier == "large":
+            return None, reason
+        start = time.perf_counter()
+        with current_trace().stage("generate_small"):
+            answer, checks = self.answer_small(question, contexts)
+        escalated = answer is None
+        self.stats["escalated"] += escalated
+        self.record("small", time.perf_counter() - start, escalated=escalated,
+                    question_words=len(_words(question)), **checks)
+        return answer, checks["reason"]
+
+    def generate(self, question: str, contexts: Sequence, large: Callable[[], str]) -> str:
+        """The cascade around a large-tier call (e.g. the apps' generate(prompt))."""
+        if not self.enabled:
+            return large()
+        self.stats["questions"] += 1
+        answer, reason = self.try_small(question, contexts)
+        if answer is not None:
+            self.stats["small"] += 1
+            return answer
+        self.stats["large"] += 1
+        start = time.perf_counter()
+        answer = large()
+        self.record("large", time.perf_counter() - start, reason=reason)
+        return answer
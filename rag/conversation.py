@@ -0,0 +1,243 @@
+"""
+Conversation mode: follow-up questions, condensed history, candidate reuse.
+
+Each submission used to be answered on its own, so "còn món ăn thì sao?"
+after a question about Cần Thơ lost the province and the topic, and ran the
+whole retrieval again. A Conversation (one per Streamlit session) keeps the
+last CONFIG['max_turns'] turns and, per question:
+
+    rewrite   a standalone query, by rules first:
+                topic switch   "còn X thì sao?", "what about X?" -> X, with
+                               the conversation's province
+                follow-up      a reference ("ở đó", "nó", "there", "it") or
+                               an elliptical factoid ("giá vé bao nhiêu?")
+                               -> the previous turn's subject + the question,
+                               with the province
+                new question   as asked, with the province if it names none
+              a question naming a place that is not a known province (a
+              district, an island, a city abroad) never gets the
+              conversation's province added
+              with RAG_REWRITE_LLM=1 the small cascade model rewrites
+              follow-ups instead (rules stay the fallback)
+    reuse     when the province is the same and the subject's words overlap
+              the previous turn's by >= CONFIG['reuse_overlap'], the previous
+              candidate set is reranked again instead of searched for (BM25,
+              query embedding and dense search are skipped), at most
+              CONFIG['max_reuse'] turns in a row
+    history   condensed(): newest turns first, each as its standalone
+              question and the first sentence of its answer, cut at
+              CONFIG['history_tokens'], so prefill stays bounded however long
+              the conversation grows
+
+    conversation = Conversation()
+    turn = conversation.prepare(question, province="CanTho")
+    results = select_retrieve(retriever, turn.standalone, 5, conversation.candidates(turn, retriever, 5))
+    prompt = get_prompt(conversation.with_history(turn), [c for c, _ in results])
+    conversation.commit(turn, answer)
+"""
+
+import os
+import re
+import sys
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Callable, List, Optional, Tuple
+
+from rag.bilingual import detect_language
+from rag.corpus import SEARCH_ENGINE_DIR
+from rag.decision import FACTOID_RE, OPEN_RE
+from rag.selection import estimate_tokens
+from rag.small_to_big import split_sentences
+from rag.tracing import current_trace
+
+CONFIG = {
+    'enabled': os.getenv("RAG_CONVERSATION", "1") == "1",
+    'max_turns': 8,
+    'history_tokens': int(os.getenv("RAG_HISTORY_TOKENS", "200")),
+    'answer_chars': 160,      # of each past answer kept in the history
+    'reuse_overlap': float(os.getenv("RAG_REUSE_OVERLAP", "0.5")),
+    'max_reuse': 3,
+    'elliptical_words': 6,    # factoid questions this short lean on the previous subject
+    'rewrite_llm': os.getenv("RAG_REWRITE_LLM", "0") == "1",
+    'rewrite_max_tokens': 48,
+}
+
+SWITCH_RE = re.compile(
+    r"^\s*(?:(?:thế|vậy)\s+)?còn\s+(?:về\s+)?(?P<vi>.+?)\s*(?:thì\s+)?(?:sao|thế nào|ra sao)?\s*[?.!]*\s*$|"
+    r"^\s*(?:and\s+)?(?:what|how)\s+about\s+(?P<en>.+?)\s*[?.!]*\s*$",
+    re.IGNORECASE,
+)
+LOCATION_REF_RE = re.compile(r"\b(?:ở|tại)\s+(?:đó|đấy|đây)\b|\bchỗ (?:đó|đấy)\b|\bnơi (?:đó|đấy)\b|(?<!is )(?<!are )\bthere\b",
+                             re.IGNORECASE)
+REFERENCE_RE = re.compile(r"\bnó\b|\b(?:cái|món|quán|điểm) (?:đó|đấy|này)\b|\b(?:it|its|that place|this place)\b",
+                          re.IGNORECASE)
+FILLER_RE = re.compile(
+    r"\b(?:gì|nào|không|sao|ạ|nhỉ|vậy|thế|có|là|ở|tại|của|và|thì|nhất|"
+    r"what|which|is|are|the|a|an|in|of|do|does|to|for|there)\b|[?.!,:;]",
+    re.IGNORECASE,
+)
+WORD_RE = re.compile(r"[^\W_]+")
+REWRITE_PROMPT = ("Viết lại câu hỏi cuối thành một câu hỏi độc lập, đầy đủ chủ đề và địa điểm, cùng ngôn ngữ. "
+                  "Chỉ trả lời bằng câu hỏi. / Rewrite the last question as a standalone question, in the same "
+                  "language. Reply with the question only.\n\n{history}\n\nCâu hỏi cuối / Last question: {question}")
+
+
+def _words(text: str) -> List[str]:
+    return WORD_RE.findall(text.lower())
+
+
+def _province_helpers():
+    if str(SEARCH_ENGINE_DIR) not in sys.path:
+        sys.path.insert(0, str(SEARCH_ENGINE_DIR))
+    import knowledge
+
+    return knowledge
+
+
+def subject_of(question: str, province_name: Optional[str] = None) -> str:
+    """What a question is about: the question without its question words, fillers and province."""
+    text = FACTOID_RE.sub(" ", OPEN_RE.sub(" ", question))
+    if province_name:
+        text = re.sub(re.escape(province_name), " ", text, flags=re.IGNORECASE)
+    return " ".join(FILLER_RE.sub(" ", text).split())
+
+
+def overlap(a: str, b: str) -> float:
+    """Jaccard overlap of two subjects' word sets."""
+    x, y = set(_words(a)), set(_words(b))
+    return len(x & y) / len(x | y) if x | y else 0.0
+
+
+def condense_answer(answer: str, max_chars: int = CONFIG['answer_chars']) -> str:
+    sentences = split_sentences(answer or "")
+    text = sentences[0] if sentences else (answer or "").strip()
+    return text if len(text) <= max_chars else text[:max_chars].rsplit(" ", 1)[0] + "…"
+
+
+@dataclass
+class Turn:
+    question: str
+    standalone: str
+    subject: str
+    province_id: Optional[int] = None
+    how: str = "new question"               # new question | topic switch | follow-up | llm
+    answer: Optional[str] = None
+    candidates: Optional[List[int]] = None
+    reused: int = 0                         # turns in a row on the same candidate set
+
+
+@dataclass
+class Conversation:
+    rewriter: Optional[Callable[[str], str]] = None   # prompt -> text, e.g. llm_rewriter(cascade)
+    turns: deque = field(default_factory=lambda: deque(maxlen=CONFIG['max_turns']))
+    stats: dict = field(default_factory=lambda: {"turns": 0, "rewritten": 0, "reused": 0})
+
+    def reset(self) -> None:
+        self.turns.clear()
+
+    def province_name(self, province_id: Optional[int]) -> Optional[str]:
+        name = _province_helpers().PROVINCE_NAMES.get(province_id) if province_id is not None else None
+        return re.sub(r"^(?:thành phố|tỉnh)\s+", "", name, flags=re.IGNORECASE) if name else None
+
+    def with_province(self, text: str, province_id: Optional[int]) -> str:
+        name = self.province_name(province_id)
+        if not name or _province_helpers().find_province(text) is not None:
+            return text
+        text = text.rstrip(" ?.!")
+        return f"{text} in {name}?" if detect_language(text) == "en" else f"{text} ở {name}?"
+
+    def rewrite_rules(self, question: str, province_id: Optional[int]) -> Tuple[str, str, str]:
+        """(standalone query, subject, how) for a question, given the turns so far."""
+        if _province_helpers().unresolved_places(question):
+            province_id = None  # "what about Paris?" is not asked about the conversation's province
+        name = self.province_name(province_id)
+        previous = self.turns[-1] if self.turns else None
+        if previous is None:
+            return question, subject_of(question, name), "new question"
+        switch = SWITCH_RE.match(question)
+        body = (switch.group("vi") or switch.group("en")) if switch else question
+        elliptical = (FACTOID_RE.search(body) is not None and len(_words(body)) <= CONFIG['elliptical_words']
+                      and len(_words(subject_of(body, name))) <= 2)
+        if LOCATION_REF_RE.search(body) or REFERENCE_RE.search(body) or elliptical:
+            # "there" is the province (added by with_province), "it" the previous subject
+            body = " ".join(LOCATION_REF_RE.sub(" ", body).split())
+            standalone = f"{previous.subject}: {body}" if previous.subject else body
+            return self.with_province(standalone, province_id), previous.subject, "follow-up"
+        if switch:
+            return self.with_province(body, province_id), subject_of(body, name), "topic switch"
+        return self.with_province(question, province_id), subject_of(question, name), "new question"
+
+    def prepare(self, question: str, province: Optional[str] = None) -> Turn:
+        """
+        The next turn's standalone query; province is the app's data/ PDF stem
+        ("CanTho"), else the province the question or the conversation names.
+        """
+        helpers = _province_helpers()
+        province_id = helpers.find_province(question)
+        if province_id is None and province:
+            province_id = helpers.province_for_stem(province)
+        if province_id is None and self.turns and not helpers.unresolved_places(question):
+            # a place the conversation's province may not contain ends the inheritance
+            province_id = self.turns[-1].province_id
+        if not CONFIG['enabled']:
+            return Turn(question, question, subject_of(question), province_id)
+        standalone, subject, how = self.rewrite_rules(question, province_id)
+        if how == "follow-up" and self.rewriter is not None:
+            with current_trace().stage("rewrite"):
+                rewritten = (self.rewriter(REWRITE_PROMPT.format(history=self.condensed(), question=question))
+                             .strip().split("\n")[0].strip())
+            if rewritten and len(rewritten) <= 3 * len(standalone):
+                standalone, how = rewritten, "llm"
+        self.stats["rewritten"] += standalone != question
+        return Turn(question, standalone, subject, province_id, how)
+
+    def candidates(self, turn: Turn, retriever, topk: int) -> Optional[List[int]]:
+        """The previous turn's candidates while the topic holds, else a fresh search (None if the retriever has none)."""
+        if not hasattr(retriever, "candidates") or not hasattr(retriever, "index"):  # as select_retrieve
+            return None
+        previous = self.turns[-1] if self.turns else None
+        trace = current_trace()
+        if (CONFIG['enabled'] and previous is not None and previous.candidates
+                and previous.province_id == turn.province_id and previous.reused < CONFIG['max_reuse']
+                and max(previous.candidates) < len(retriever.chunks)
+                and overlap(previous.subject, turn.subject) >= CONFIG['reuse_overlap']):
+            turn.candidates, turn.reused = previous.candidates, previous.reused + 1
+            self.stats["reused"] += 1
+            trace.count("reused_candidates", len(turn.candidates))
+            return turn.candidates
+        turn.candidates = retriever.candidates(turn.standalone, topk)
+        return turn.candidates
+
+    def commit(self, turn: Turn, answer: Optional[str]) -> None:
+        turn.answer = answer
+        self.turns.append(turn)
+        self.stats["turns"] += 1
+
+    def condensed(self, budget: int = CONFIG['history_tokens'], count_tokens: Callable[[str], int] = estimate_tokens
+                  ) -> str:
+        """Past turns, newest kept first, within budget tokens; oldest first in the text."""
+        lines: List[str] = []
+        for turn in reversed(self.turns):
+            line = f"Q: {turn.standalone}\nA: {condense_answer(turn.answer)}"
+            budget -= count_tokens(line)
+            if budget < 0:
+                break
+            lines.append(line)
+        return "\n".join(reversed(lines))
+
+    def with_history(self, turn: Turn) -> str:
+        """The question for the prompt: the standalone query after the condensed history."""
+        history = self.condensed()
+        if not history:
+            return turn.standalone
+        return f"Hội thoại trước / Previous turns:\n{history}\n\nCâu hỏi hiện tại / Current question: {turn.standalone}"
+
+
+def llm_rewriter(cascade) -> Callable[[str], str]:
+    """Follow-up rewriting with the cascade's small model (rag.cascade), greedy and short."""
+    def rewrite(prompt: str) -> str:
+        small = cascade.load()
+        text = small.tokenizer.apply_chat_template([{"role": "user", "content": prompt}], tokenize=False,
+                                                   add_generation_prompt=True)
+        return small.generate([text], CONFIG['rewrite_max_tokens'])[0]
+    return rewrite
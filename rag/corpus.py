@@ -0,0 +1,183 @@
+"""
+Corpus loading and chunking.
+
+Two sources feed the indexes:
+    - the province PDFs in data/ (what the Streamlit apps index), and
+    - the crawled pages in search-engine/data/<id>/<category>/*_tag.txt,
+      described by search-engine/data/metadata.json, or by the corpus
+      catalog built from it (search-engine/catalog.py); these carry URLs,
+      province ids and categories, so retrieval can be scored against them.
+
+Chunks are plain objects with `page_content` and `metadata`, the same two
+attributes the apps read from LangChain Documents.
+"""
+
+import json
+import os
+import sys
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Sequence
+
+ROOT = Path(__file__).resolve().parent.parent
+PDF_DIR = ROOT / "data"
+TEX_DIR = ROOT / "tex"
+TRAVEL_DIR = ROOT / "travel"
+SEARCH_ENGINE_DIR = ROOT / "search-engine"
+CRAWL_DATA_DIR = SEARCH_ENGINE_DIR / "data"
+
+CHUNK_SIZE = 1000
+CHUNK_OVERLAP = 200
+
+
+@dataclass
+class Chunk:
+    page_content: str
+    metadata: Dict = field(default_factory=dict)
+
+
+def extract_text_from_pdf(pdf_path) -> List[str]:
+    import PyPDF2
+
+    with open(pdf_path, "rb") as file:
+        reader = PyPDF2.PdfReader(file)
+        pages = [page.extract_text() for page in reader.pages]
+    return [text.strip() for text in pages if text]
+
+
+def split_texts(texts: Sequence[str], metadatas: Optional[Sequence[Dict]] = None,
+                chunk_size: int = CHUNK_SIZE, chunk_overlap: int = CHUNK_OVERLAP) -> List[Chunk]:
+    from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+    splitter = RecursiveCharacterTextSplitter(chunk_size=chunk_size, chunk_overlap=chunk_overlap)
+    metadatas = metadatas or [{} for _ in texts]
+    chunks = []
+    for text, metadata in zip(texts, metadatas):
+        for i, piece in enumerate(splitter.split_text(text)):
+            chunks.append(Chunk(page_content=piece, metadata={**metadata, "chunk": i}))
+    return chunks
+
+
+def load_pdf_chunks(pdf_paths: Iterable, **split_kwargs) -> List[Chunk]:
+    """Chunks of one or more PDFs, one text per page like the apps always did."""
+    texts, metadatas = [], []
+    for pdf_path in pdf_paths:
+        for page_no, text in enumerate(extract_text_from_pdf(pdf_path)):
+            texts.append(text)
+            metadatas.append({"source": os.fspath(pdf_path), "page": page_no})
+    return split_texts(texts, metadatas, **split_kwargs)
+
+
+def pdf_files(data_dir=PDF_DIR) -> List[str]:
+    return sorted(os.path.join(data_dir, f) for f in os.listdir(data_dir) if f.endswith(".pdf"))
+
+
+def province_pdf_names(data_dir=PDF_DIR) -> Dict[int, str]:
+    """Province id (as in provinces.province_dict) -> PDF stem ("THÀNH PHỐ HÀ NỘI" -> "HaNoi")."""
+    if str(SEARCH_ENGINE_DIR) not in sys.path:
+        sys.path.insert(0, str(SEARCH_ENGINE_DIR))
+    from provinces import fold, province_dict
+
+    stems = [os.path.splitext(os.path.basename(p))[0] for p in pdf_files(data_dir)]
+    names = {}
+    for name, pid in province_dict.items():
+        for prefix in ("THÀNH PHỐ ", "TỈNH "):
+            if name.startswith(prefix):
+                name = name[len(prefix):]
+        compact = fold(name).title().replace(" ", "")
+        # "TỈNH THỪA THIÊN" is ThuaThienHue.pdf
+        match = compact if compact in stems else next((s for s in stems if s.startswith(compact)), None)
+        if match:
+            names[pid] = match
+    return names
+
+
+def read_tag_text(path) -> str:
+    """Body of a *_tag.txt page without the header and the [TAG] prefixes."""
+    lines = []
+    with open(path, "r", encoding="utf-8", errors="ignore") as f:
+        in_body = False
+        for line in f:
+            if not in_body:
+                in_body = line.startswith("Content")
+                continue
+            line = line.strip()
+            if line.startswith("[") and "]" in line[:5]:
+                line = line[line.index("]") + 1:].strip()
+            if line:
+                lines.append(line)
+    return "\n".join(lines)
+
+
+def iter_crawled_pages(data_dir=CRAWL_DATA_DIR, metadata_path=None, province_id: Optional[int] = None,
+                       category: Optional[str] = None, unique: bool = False):
+    """Yield one metadata dict per crawled page listed in metadata.json.
+
+    When data_dir has a catalog (search-engine/catalog.py) at least as new as
+    metadata.json, the pages come from a catalog query instead. `unique` (one
+    page per near-duplicate cluster) needs the catalog and is ignored otherwise.
+    """
+    data_dir = Path(data_dir)
+    catalog_path = data_dir / "catalog.sqlite"
+    use_catalog = metadata_path is None and catalog_path.exists()
+    metadata_path = Path(metadata_path or data_dir / "metadata.json")
+    if use_catalog and (not metadata_path.exists()
+                        or catalog_path.stat().st_mtime >= metadata_path.stat().st_mtime):
+        yield from _catalog_pages(catalog_path, province_id, category, unique)
+        return
+    with open(metadata_path, "r", encoding="utf-8") as f:
+        metadata = json.load(f)
+    for province in metadata["provinces"]:
+        if province_id is not None and province["id"] != province_id:
+            continue
+        for category_data in province["content"]:
+            if category is not None and category_data["category"] != category:
+                continue
+            for item in category_data["items"]:
+                # paths in metadata.json are relative to search-engine/
+                tag_path = data_dir.parent / item["tag_txt_path"]
+                if not tag_path.exists():
+                    continue
+                yield {
+                    "province_id": province["id"],
+                    "province": province["name"],
+                    "category": category_data["category"],
+                    "idx": item["idx"],
+                    "url": item["url"],
+                    "title": item["title"],
+                    "source": str(tag_path),
+                }
+
+
+def _catalog_pages(catalog_path: Path, province_id: Optional[int], category: Optional[str], unique: bool):
+    if str(SEARCH_ENGINE_DIR) not in sys.path:
+        sys.path.insert(0, str(SEARCH_ENGINE_DIR))
+    from catalog import ROOT as CATALOG_ROOT, Catalog
+    from provinces import province_dict
+
+    names = {pid: name for name, pid in province_dict.items()}
+    with Catalog(catalog_path) as catalog:
+        rows = catalog.documents(province_id, category, source="crawl", unique=unique)
+    for row in rows:
+        tag_path = CATALOG_ROOT / row["tag_path"]
+        if not tag_path.exists():
+            continue
+        yield {
+            "province_id": row["province_id"],
+            "province": names.get(row["province_id"], ""),
+            "category": row["category"],
+            "idx": row["idx"],
+            "url": row["url"],
+            "title": row["title"],
+            "source": str(tag_path),
+        }
+
+
+def load_crawled_chunks(data_dir=CRAWL_DATA_DIR, metadata_path=None, **split_kwargs) -> List[Chunk]:
+    texts, metadatas = [], []
+    for meta in iter_crawled_pages(data_dir, metadata_path):
+        text = read_tag_text(meta["source"])
+        if text:
+            texts.append(f"{meta['title']}\n{text}")
+            metadatas.append(meta)
+    return split_texts(texts, metadatas, **split_kwargs)
@@ -0,0 +1,149 @@
+"""
+Decision stage between reranking and the LLM.
+
+Every question used to go through vietrag-7b, even when the best reranked
+chunk already states the answer verbatim (opening hours, a price, a dish
+name) or when nothing retrieved is relevant at all. decide() looks at the
+cross-encoder scores first:
+
+    abstain     every score is below CONFIG['abstain_below']: a fixed "not in
+                the documents" reply, no generation
+    extractive  a factoid question (mấy giờ, giá vé, ở đâu, what time, how
+                much, ...) whose top chunk scores >= CONFIG['extract_above']
+                and has one sentence that scores >= CONFIG['sentence_above']
+                on its own: that sentence is the answer, with its source
+                chunk and character span
+    generate    anything else: build the prompt and call the LLM as before
+
+("lookup" decisions are made before retrieval, by rag.knowledge, and only
+counted here.)
+
+Sentences of the top chunk are scored with the same cross-encoder, in one
+batch of a dozen pairs, which costs milliseconds next to a 7B generate.
+Thresholds are logits of the English ms-marco cross-encoder and have not
+been calibrated on Vietnamese question/chunk pairs, where a wrong abstain
+answers a valid question with "not in the documents", so the stage is
+opt-in: RAG_DECISION=1, after checking RAG_ABSTAIN_SCORE, RAG_EXTRACT_SCORE
+and RAG_EXTRACT_SENTENCE_SCORE against the reranker in use (e.g. with
+benchmarks/retrieval_bench.py on the golden set). Without scores (rerank off, real-time or small-to-big retrieval) the stage
+always says generate.
+
+    decider = DecisionStage()
+    decision = decider.decide(question, scored_retrieve(retriever, question, topk))
+    if decision.action == "generate":
+        answer = generate(build_prompt(question, [c for c, _ in results]))
+    decider.stats["llm_calls_avoided"]
+"""
+
+import os
+import re
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+from rag.bilingual import CONFIG as LANG_CONFIG, detect_language
+from rag.retrieval import get_reranker
+from rag.small_to_big import split_sentences
+from rag.tracing import current_trace
+
+CONFIG = {
+    'enabled': os.getenv("RAG_DECISION", "0") == "1",
+    'abstain_below': float(os.getenv("RAG_ABSTAIN_SCORE", "-4.0")),
+    'extract_above': float(os.getenv("RAG_EXTRACT_SCORE", "6.0")),
+    'sentence_above': float(os.getenv("RAG_EXTRACT_SENTENCE_SCORE", "5.0")),
+    'max_sentences': 12,      # sentences of the top chunk scored for the extractive answer
+}
+
+# questions with a short, literal answer
+FACTOID_RE = re.compile(
+    r"mấy giờ|giờ mở cửa|giờ đóng cửa|bao giờ|khi nào|thời gian nào|giá vé|giá bao nhiêu|bao nhiêu|"
+    r"ở đâu|địa chỉ|nằm ở|tên (là )?gì|món gì|món nào|là gì|cách bao xa|số điện thoại|"
+    r"what time|opening hours|when|how much|how many|how far|where|address|price|what is the name|which dish",
+    re.IGNORECASE,
+)
+# questions that want an explanation or a plan, never answered with one sentence
+OPEN_RE = re.compile(
+    r"giới thiệu|lịch trình|kế hoạch|so sánh|tại sao|vì sao|như thế nào|kinh nghiệm|gợi ý|"
+    r"itinerary|plan|compare|why|how to|how should|recommend|describe|tell me about",
+    re.IGNORECASE,
+)
+NOT_FOUND = {
+    "vi": "Xin lỗi, tài liệu hiện có không chứa thông tin để trả lời câu hỏi này.",
+    "en": "Sorry, the available documents do not contain the information to answer this question.",
+}
+
+
+@dataclass
+class Decision:
+    action: str                             # lookup | abstain | extractive | generate
+    answer: Optional[str] = None            # set unless action == "generate"
+    top_score: Optional[float] = None
+    span: Optional[Dict] = None             # extractive: chunk metadata, start/end in the chunk, score
+    reason: str = ""
+
+
+@dataclass
+class DecisionStage:
+    reranker_id: str = LANG_CONFIG['reranker']
+    abstain_below: float = CONFIG['abstain_below']
+    extract_above: float = CONFIG['extract_above']
+    sentence_above: float = CONFIG['sentence_above']
+    enabled: bool = CONFIG['enabled']
+    stats: Dict[str, int] = field(default_factory=lambda: {
+        "decisions": 0, "lookup": 0, "abstain": 0, "extractive": 0, "generate": 0, "llm_calls_avoided": 0})
+
+    def score_sentences(self, question: str, sentences: Sequence[str]) -> List[float]:
+        with current_trace().stage("decision_rerank"):
+            return [float(s) for s in get_reranker(self.reranker_id).predict([(question, s) for s in sentences])]
+
+    def record(self, decision: Decision) -> Decision:
+        """Count a decision, including ones made before retrieval (rag.knowledge lookups)."""
+        self.stats["decisions"] += 1
+        self.stats[decision.action] += 1
+        trace = current_trace()
+        trace.count(f"decision_{decision.action}", 1)
+        if decision.action != "generate":
+            self.stats["llm_calls_avoided"] += 1
+            trace.count("llm_calls_avoided", 1)
+        return decision
+
+    def extract(self, question: str, chunk, score_sentences: Callable[[str, Sequence[str]], List[float]]
+                ) -> Optional[Tuple[str, Dict]]:
+        text = chunk.page_content
+        sentences = split_sentences(text)[:CONFIG['max_sentences']]
+        if not sentences:
+            return None
+        scores = score_sentences(question, sentences)
+        best = max(range(len(sentences)), key=lambda i: scores[i])
+        if scores[best] < self.sentence_above:
+            return None
+        sentence = sentences[best]
+        start = text.find(sentence)
+        return sentence, {"metadata": chunk.metadata, "start": start, "end": start + len(sentence) if start >= 0 else -1,
+                          "score": round(scores[best], 3)}
+
+    def decide(self, question: str, results: Sequence[Tuple[object, Optional[float]]],
+               score_sentences: Optional[Callable[[str, Sequence[str]], List[float]]] = None) -> Decision:
+        """results: [(chunk, reranker score or None)] best first, as scored_retrieve() returns them."""
+        scores = [s for _, s in results if s is not None]
+        if not self.enabled or not results or len(scores) < len(results):
+            return self.record(Decision("generate", reason="no reranker scores"))
+        top = max(scores)
+        if top < self.abstain_below:
+            language = "en" if detect_language(question) == "en" else "vi"
+            return self.record(Decision("abstain", NOT_FOUND[language], top,
+                                         reason=f"top score {top:.2f} < {self.abstain_below}"))
+        if top >= self.extract_above and FACTOID_RE.search(question) and not OPEN_RE.search(question):
+            found = self.extract(question, results[0][0], score_sentences or self.score_sentences)
+            if found:
+                sentence, span = found
+                return self.record(Decision("extractive", sentence, top, span,
+                                             reason=f"sentence score {span['score']} >= {self.sentence_above}"))
+        return self.record(Decision("generate", top_score=top, reason=f"top score {top:.2f}"))
+
+
+def scored_retrieve(retriever, question: str, topk: int = 5) -> List[Tuple[object, Optional[float]]]:
+    """What retriever.retrieve() returns, paired with the reranker scores when there are any."""
+    if hasattr(retriever, "candidates") and hasattr(retriever, "rerank") and getattr(retriever, "reranker_id", None):
+        ranked = retriever.rerank(question, retriever.candidates(question, topk))[:topk]
+        return [(retriever.chunks[i], score) for i, score in ranked]
+    return [(chunk, None) for chunk in retriever.retrieve(question, topk)]
@@ -0,0 +1,276 @@
+"""
+Embedding computation with length-sorted batching and an on-disk cache.
+
+EmbeddingService wraps a sentence-transformers model (all-mpnet-base-v2,
+all-MiniLM-L6-v2, ...) and adds:
+    - inputs sorted by length before batching, so each batch pads to
+      similar lengths, then results scattered back to the caller's order
+    - numpy output straight from encode (no tensor -> .cpu() round-trip)
+    - precision/backends: fp32, fp16 (CUDA), int8 (dynamic quantization on
+      CPU with torch, or the quantized ONNX export with backend="onnx")
+    - EmbeddingCache: float16 vectors in a memory-mapped file keyed by
+      (model id, text hash), so re-indexing mostly becomes a cache read
+
+Settings default from CONFIG and can be overridden with environment
+variables (RAG_EMBED_BACKEND, RAG_EMBED_PRECISION, RAG_EMBED_BATCH_SIZE,
+RAG_EMBED_CACHE).
+"""
+
+import hashlib
+import os
+import re
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+
+CONFIG = {
+    "backend": os.getenv("RAG_EMBED_BACKEND", "torch"),        # torch | onnx
+    "precision": os.getenv("RAG_EMBED_PRECISION", "fp32"),     # fp32 | fp16 | int8
+    "batch_size": int(os.getenv("RAG_EMBED_BATCH_SIZE", "64")),
+    "cache_dir": os.getenv("RAG_EMBED_CACHE", ".cache/embeddings"),  # "" disables the cache
+    # quantized exports shipped in the sentence-transformers model repos
+    "onnx_files": {
+        "fp32": "onnx/model.onnx",
+        "fp16": "onnx/model_O4.onnx",
+        "int8": "onnx/model_qint8_avx2.onnx",
+    },
+}
+
+
+def text_key(text: str) -> bytes:
+    return hashlib.blake2b(text.encode("utf-8"), digest_size=16).digest()
+
+
+@contextmanager
+def _file_lock(path: Path):
+    """Exclusive lock on path across processes: msvcrt on Windows, flock elsewhere."""
+    with open(path, "a+b") as f:
+        if os.name == "nt":
+            import msvcrt
+
+            f.seek(0)
+            while True:
+                try:
+                    msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)  # retries for ~10 s, then raises
+                    break
+                except OSError:
+                    continue
+            try:
+                yield
+            finally:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+        else:
+            import fcntl
+
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+
+class EmbeddingCache:
+    """
+    Append-only float16 vector store for one model variant.
+
+    Layout under <root>/<model key>/:
+        vectors.f16 -- (capacity, dim) float16 memmap, rows [0, n) are valid
+        keys.bin    -- n * 16-byte text hashes, row order
+        keys.lock   -- held by the writer appending rows
+
+    Writers lock keys.lock (flock, or msvcrt on Windows), so several processes
+    can share a cache.
+    """
+
+    GROW_ROWS = 4096
+
+    def __init__(self, root: str, model_key: str, dim: int):
+        self.dir = Path(root) / re.sub(r"[^A-Za-z0-9_.-]+", "_", model_key)
+        self.dir.mkdir(parents=True, exist_ok=True)
+        self.dim = dim
+        self.vectors_path = self.dir / "vectors.f16"
+        self.keys_path = self.dir / "keys.bin"
+        self.lock_path = self.dir / "keys.lock"
+        self.keys_path.touch(exist_ok=True)
+        self.rows: Dict[bytes, int] = {}
+        self.vectors: Optional[np.memmap] = None
+        self._refresh()
+
+    def _capacity(self) -> int:
+        if not self.vectors_path.exists():
+            return 0
+        return self.vectors_path.stat().st_size // (2 * self.dim)
+
+    def _map(self) -> None:
+        capacity = self._capacity()
+        self.vectors = (
+            np.memmap(self.vectors_path, dtype=np.float16, mode="r+", shape=(capacity, self.dim))
+            if capacity else None
+        )
+
+    def _refresh(self) -> None:
+        """Pick up rows appended by other processes (a stat when there are none)."""
+        known = len(self.rows)
+        if self.keys_path.stat().st_size // 16 == known:
+            return
+        with open(self.keys_path, "rb") as f:
+            f.seek(known * 16)
+            raw = f.read()
+        for offset in range(len(raw) // 16):
+            self.rows[raw[offset * 16:(offset + 1) * 16]] = known + offset
+        self._map()
+
+    def __len__(self) -> int:
+        return len(self.rows)
+
+    def get(self, keys: Sequence[bytes]):
+        """Return (hit mask, float32 matrix with hit rows filled)."""
+        self._refresh()
+        out = np.zeros((len(keys), self.dim), dtype=np.float32)
+        hits = np.zeros(len(keys), dtype=bool)
+        idx = [(i, self.rows[k]) for i, k in enumerate(keys) if k in self.rows]
+        if idx and self.vectors is not None:
+            positions, rows = map(np.asarray, zip(*idx))
+            order = np.argsort(rows)  # sequential reads from the mmap
+            out[positions[order]] = self.vectors[rows[order]]
+            hits[positions] = True
+        return hits, out
+
+    def put(self, keys: Sequence[bytes], vectors: np.ndarray) -> None:
+        with _file_lock(self.lock_path):
+            self._refresh()
+            new = [(k, v) for k, v in zip(keys, vectors) if k not in self.rows]
+            if not new:
+                return
+            start = len(self.rows)
+            needed = start + len(new)
+            if needed > self._capacity():
+                capacity = needed + self.GROW_ROWS
+                self.vectors = None  # Windows cannot resize a file this process still maps
+                with open(self.vectors_path, "ab") as f:
+                    f.truncate(capacity * self.dim * 2)
+            # the file may have room this process has not mapped: grown by another
+            # process, or by a put interrupted before it wrote its keys
+            if self.vectors is None or self.vectors.shape[0] < needed:
+                self._map()
+            block = np.stack([v for _, v in new]).astype(np.float16)
+            self.vectors[start:needed] = block
+            self.vectors.flush()
+            with open(self.keys_path, "ab") as f:
+                f.write(b"".join(k for k, _ in new))
+                f.flush()
+                os.fsync(f.fileno())
+            for offset, (k, _) in enumerate(new):
+                self.rows[k] = start + offset
+
+
+class EmbeddingService:
+    def __init__(self, model_id: str = "all-mpnet-base-v2", backend: Optional[str] = None,
+                 precision: Optional[str] = None, batch_size: Optional[int] = None,
+                 cache_dir: Optional[str] = None, device: Optional[str] = None,
+                 normalize: bool = False):
+        self.model_id = model_id
+        self.backend = backend or CONFIG["backend"]
+        self.precision = precision or CONFIG["precision"]
+        self.batch_size = batch_size or CONFIG["batch_size"]
+        self.normalize = normalize
+        self.model = self._load(device)
+        self.dimension = self.model.get_sentence_embedding_dimension()
+        cache_dir = CONFIG["cache_dir"] if cache_dir is None else cache_dir
+        self.cache = EmbeddingCache(cache_dir, self.model_key, self.dimension) if cache_dir else None
+        self.stats = {"texts": 0, "cache_hits": 0, "encoded": 0}
+
+    @property
+    def model_key(self) -> str:
+        # vectors from different precisions/backends differ slightly; never mix them
+        return f"{self.model_id}-{self.backend}-{self.precision}-{'norm' if self.normalize else 'raw'}"
+
+    def _load(self, device: Optional[str]):
+        import torch
+        from sentence_transformers import SentenceTransformer
+
+        device = device or ("cuda" if torch.cuda.is_available() else "cpu")
+        if self.backend == "onnx":
+            return SentenceTransformer(
+                self.model_id, device="cpu", backend="onnx",
+                model_kwargs={"file_name": CONFIG["onnx_files"][self.precision]},
+            )
+        model = SentenceTransformer(self.model_id, device=device)
+        if self.precision == "fp16" and device.startswith("cuda"):
+            model.half()
+        elif self.precision == "int8":
+            # dynamic int8 quantization of the Linear layers, CPU only
+            model.to("cpu")
+            model = torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+        return model
+
+    def _encode(self, texts: List[str]) -> np.ndarray:
+        # longest first: the first batch fails fast on OOM and padding stays tight
+        order = sorted(range(len(texts)), key=lambda i: len(texts[i]), reverse=True)
+        encoded = self.model.encode(
+            [texts[i] for i in order], batch_size=self.batch_size, convert_to_numpy=True,
+            normalize_embeddings=self.normalize, show_progress_bar=False,
+        ).astype(np.float32, copy=False)
+        out = np.empty_like(encoded)
+        out[np.asarray(order)] = encoded
+        return out
+
+    def encode(self, texts: Sequence[str]) -> np.ndarray:
+        """Embed texts as a float32 (n, dim) matrix, reading cached vectors where possible."""
+        texts = list(texts)
+        self.stats["texts"] += len(texts)
+        if not texts:
+            return np.zeros((0, self.dimension), dtype=np.float32)
+        if self.cache is None:
+            self.stats["encoded"] += len(texts)
+            return self._encode(texts)
+
+        keys = [text_key(t) for t in texts]
+        hits, out = self.cache.get(keys)
+        self.stats["cache_hits"] += int(hits.sum())
+        misses = np.flatnonzero(~hits)
+        if len(misses):
+            # duplicate texts in one call are encoded once
+            unique: Dict[bytes, int] = {}
+            for i in misses:
+                unique.setdefault(keys[i], i)
+            first = list(unique.values())
+            vectors = self._encode([texts[i] for i in first])
+            self.stats["encoded"] += len(first)
+            by_key = {keys[i]: v for i, v in zip(first, vectors)}
+            for i in misses:
+                out[i] = by_key[keys[i]]
+            self.cache.put([keys[i] for i in first], vectors)
+        return out
+
+    def embed_documents(self, texts: Sequence[str]) -> List[List[float]]:
+        return self.encode(texts).tolist()
+
+    def embed_query(self, text: str) -> List[float]:
+        # queries are rarely repeated verbatim; skip the cache write
+        return self._encode([text])[0].tolist()
+
+    def embed_queries(self, texts: Sequence[str]) -> np.ndarray:
+        """Several queries in one batch (the HTTP service coalesces concurrent requests)."""
+        texts = list(texts)
+        if not texts:
+            return np.zeros((0, self.dimension), dtype=np.float32)
+        return self._encode(texts)
+
+    def as_langchain(self):
+        """LangChain Embeddings adapter, so FAISS embeds documents in batches, not one by one."""
+        from langchain_core.embeddings import Embeddings
+
+        service = self
+
+        class _ServiceEmbeddings(Embeddings):
+            def embed_documents(self, texts):
+                return service.embed_documents(texts)
+
+            def embed_query(self, text):
+                return service.embed_query(text)
+
+        return _ServiceEmbeddings()
@@ -0,0 +1,390 @@
+"""
+Flat, memory-mappable index files shared by every worker on a host.
+
+st.cache_resource (and each server worker) keeps its own FAISS index, chunk
+list and BM25 token lists, so N workers hold N copies. Written once as flat
+arrays and opened with np.memmap, the same data lives once in the page cache
+and every process maps it read-only.
+
+An index directory holds one complete build per subdirectory and a pointer
+to the live one:
+    CURRENT           name of the live build, replaced atomically
+    build-<ns>-<pid>/ the files below
+
+A rebuild writes a fresh build-* directory and only then swaps CURRENT, so
+readers see the old index or the new one, never a mix; an interrupted build
+leaves a stray directory behind, not a half-replaced index. The previous
+build is kept for workers that resolved CURRENT just before the swap; older
+ones are removed. Directories written before builds were versioned (files at
+the top level, no CURRENT) are still read.
+
+Layout of a build:
+    manifest.json     version, counts, embedding model key, analyzer, BM25
+                      parameters, source fingerprints; written last
+    texts.bin/.idx    UTF-8 chunk texts, uint64 offsets (n + 1)
+    meta.bin/.idx     JSON metadata per chunk, same scheme
+    vectors.f32       (n, dim) float32 embeddings
+    norms.f32         (n,) squared L2 norms, so search needs one matvec
+    vocab.json        term -> term id
+    idf.f32           (V,) BM25Okapi idf (negative idf floored like rank_bm25)
+    postings.idx      uint64 offsets (V + 1) into the two arrays below
+    postings.doc      uint32 chunk ids, grouped by term
+    postings.tf       float32 term frequencies
+    doclen.u32        (n,) tokens per chunk
+
+FlatBM25 and MmapFlatL2 answer get_scores()/search() like BM25Okapi and
+IndexFlatL2, so open_retriever() returns an ordinary HybridRetriever. With
+quantization="binary"/"int8" the dense side is rag.quantized.QuantizedL2,
+whose codes are stored next to these files.
+
+Usage:
+    python -m rag.flat_index build --out .cache/index/HaNoi --pdf data/HaNoi.pdf
+    python -m rag.flat_index build --out .cache/index/all --pdf-dir data
+    python -m rag.flat_index info .cache/index/HaNoi
+"""
+
+import argparse
+import json
+import os
+import shutil
+import sys
+import time
+from collections import Counter
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Sequence
+
+import numpy as np
+
+from rag.bilingual import CONFIG as LANG_CONFIG, bilingual_analyzer, bilingual_query_analyzer
+from rag.corpus import Chunk
+from rag.retrieval import RERANKER_ID, HybridRetriever, whitespace_analyzer
+
+FORMAT_VERSION = 1
+POINTER = "CURRENT"
+BUILD_PREFIX = "build-"
+INDEX_DIR = os.getenv("RAG_INDEX_DIR", ".cache/index")
+ANALYZERS: Dict[str, Callable[[str], List[str]]] = {"whitespace": whitespace_analyzer, "bilingual": bilingual_analyzer}
+# analyzers whose queries are tokenized differently from chunks (see rag.bilingual)
+QUERY_ANALYZERS: Dict[str, Callable[[str], List[str]]] = {"bilingual": bilingual_query_analyzer}
+BM25_PARAMS = {"k1": 1.5, "b": 0.75, "epsilon": 0.25}  # rank_bm25.BM25Okapi defaults
+
+
+def _write_array(path: Path, array: np.ndarray) -> None:
+    tmp = path.with_name(path.name + ".tmp")
+    with open(tmp, "wb") as f:
+        f.write(np.ascontiguousarray(array).tobytes())
+    os.replace(tmp, path)
+
+
+def _write_blobs(path: Path, blobs: Sequence[bytes]) -> None:
+    offsets = np.zeros(len(blobs) + 1, dtype=np.uint64)
+    offsets[1:] = np.cumsum([len(b) for b in blobs], dtype=np.uint64)
+    tmp = path.with_suffix(".bin.tmp")
+    with open(tmp, "wb") as f:
+        for blob in blobs:
+            f.write(blob)
+    os.replace(tmp, path.with_suffix(".bin"))
+    _write_array(path.with_suffix(".idx"), offsets)
+
+
+def source_fingerprint(paths: Sequence) -> List[Dict]:
+    out = []
+    for p in paths:
+        st = os.stat(p)
+        out.append({"path": os.path.abspath(p), "mtime": st.st_mtime, "size": st.st_size})
+    return out
+
+
+def resolve(path) -> Path:
+    """The directory holding the live build of the index at path (path itself for an unversioned index)."""
+    root = Path(path)
+    try:
+        name = (root / POINTER).read_text(encoding="utf-8").strip()
+    except OSError:
+        return root
+    return root / name if name else root
+
+
+def _publish(root: Path, build: Path) -> None:
+    """Point CURRENT at build, then drop every build but it and the one it replaces."""
+    previous = resolve(root)
+    tmp = root / f"{POINTER}.tmp-{os.getpid()}"
+    tmp.write_text(build.name, encoding="utf-8")
+    os.replace(tmp, root / POINTER)
+    keep = {build.name, previous.name}
+    for old in root.glob(BUILD_PREFIX + "*"):
+        # on Windows a build still mapped by a worker cannot go yet; the next rebuild retries
+        if old.name not in keep and old.is_dir():
+            shutil.rmtree(old, ignore_errors=True)
+
+
+def write_index(out_dir, chunks: Sequence, vectors: np.ndarray, model_key: str,
+                analyzer: str = "whitespace", sources: Sequence = ()) -> Dict:
+    """Write chunks, their vectors and BM25 postings as a new build under out_dir and make it the live one."""
+    n = len(chunks)
+    vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+    if vectors.shape[0] != n:
+        raise ValueError(f"{n} chunks but {vectors.shape[0]} vectors")
+    root = Path(out_dir)
+    root.mkdir(parents=True, exist_ok=True)
+    out = root / f"{BUILD_PREFIX}{time.time_ns()}-{os.getpid()}"
+    out.mkdir()
+    try:
+        manifest = _write_build(out, chunks, vectors, model_key, analyzer, sources)
+    except BaseException:
+        shutil.rmtree(out, ignore_errors=True)
+        raise
+    _publish(root, out)
+    return manifest
+
+
+def _write_build(out: Path, chunks: Sequence, vectors: np.ndarray, model_key: str, analyzer: str,
+                 sources: Sequence) -> Dict:
+    n = len(chunks)
+    _write_blobs(out / "texts", [c.page_content.encode("utf-8") for c in chunks])
+    _write_blobs(out / "meta", [json.dumps(c.metadata, ensure_ascii=False).encode("utf-8") for c in chunks])
+    _write_array(out / "vectors.f32", vectors)
+    _write_array(out / "norms.f32", np.einsum("ij,ij->i", vectors, vectors).astype(np.float32))
+
+    # BM25 postings, grouped by term id
+    tokenize = ANALYZERS[analyzer]
+    vocab: Dict[str, int] = {}
+    per_term: List[List[tuple]] = []
+    doclen = np.zeros(n, dtype=np.uint32)
+    for doc_id, chunk in enumerate(chunks):
+        tokens = tokenize(chunk.page_content)
+        doclen[doc_id] = len(tokens)
+        for term, tf in Counter(tokens).items():
+            term_id = vocab.setdefault(term, len(vocab))
+            if term_id == len(per_term):
+                per_term.append([])
+            per_term[term_id].append((doc_id, tf))
+
+    offsets = np.zeros(len(vocab) + 1, dtype=np.uint64)
+    offsets[1:] = np.cumsum([len(p) for p in per_term], dtype=np.uint64)
+    docs = np.fromiter((d for p in per_term for d, _ in p), dtype=np.uint32, count=int(offsets[-1]))
+    tfs = np.fromiter((tf for p in per_term for _, tf in p), dtype=np.float32, count=int(offsets[-1]))
+
+    # idf exactly as rank_bm25.BM25Okapi._calc_idf
+    df = np.diff(offsets).astype(np.float64)
+    idf = np.log(n - df + 0.5) - np.log(df + 0.5)
+    average_idf = float(idf.mean()) if len(idf) else 0.0
+    idf[idf < 0] = BM25_PARAMS["epsilon"] * average_idf
+
+    _write_array(out / "postings.idx", offsets)
+    _write_array(out / "postings.doc", docs)
+    _write_array(out / "postings.tf", tfs)
+    _write_array(out / "idf.f32", idf.astype(np.float32))
+    _write_array(out / "doclen.u32", doclen)
+    tmp = out / "vocab.json.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(vocab, f, ensure_ascii=False)
+    os.replace(tmp, out / "vocab.json")
+
+    manifest = {
+        "version": FORMAT_VERSION,
+        "chunks": n,
+        "dim": int(vectors.shape[1]) if n else 0,
+        "model_key": model_key,
+        "analyzer": analyzer,
+        "bm25": {**BM25_PARAMS, "avgdl": float(doclen.mean()) if n else 0.0},
+        "terms": len(vocab),
+        "postings": int(offsets[-1]),
+        "sources": source_fingerprint(sources),
+        "created": time.time(),
+    }
+    # the manifest goes last: a directory without one is an unfinished build
+    tmp = out / "manifest.json.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+    os.replace(tmp, out / "manifest.json")
+    return manifest
+
+
+def _map(path: Path, dtype, shape=None) -> np.ndarray:
+    if path.stat().st_size == 0:
+        return np.zeros(shape or 0, dtype=dtype)
+    return np.memmap(path, dtype=dtype, mode="r", shape=shape)
+
+
+class FlatChunks:
+    """Read-only sequence of Chunks decoded on access from texts/meta blobs."""
+
+    def __init__(self, root: Path):
+        self.texts = _map(root / "texts.bin", np.uint8)
+        self.text_offsets = _map(root / "texts.idx", np.uint64)
+        self.meta = _map(root / "meta.bin", np.uint8)
+        self.meta_offsets = _map(root / "meta.idx", np.uint64)
+
+    def __len__(self) -> int:
+        return len(self.text_offsets) - 1
+
+    def text(self, i: int) -> str:
+        start, end = int(self.text_offsets[i]), int(self.text_offsets[i + 1])
+        return bytes(self.texts[start:end]).decode("utf-8")
+
+    def metadata(self, i: int) -> Dict:
+        start, end = int(self.meta_offsets[i]), int(self.meta_offsets[i + 1])
+        return json.loads(bytes(self.meta[start:end]).decode("utf-8"))
+
+    def __getitem__(self, i: int) -> Chunk:
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError(i)
+        return Chunk(page_content=self.text(i), metadata=self.metadata(i))
+
+    def __iter__(self):
+        return (self[i] for i in range(len(self)))
+
+
+class FlatBM25:
+    """BM25Okapi scoring over memory-mapped postings."""
+
+    def __init__(self, root: Path, manifest: Dict):
+        with open(root / "vocab.json", "r", encoding="utf-8") as f:
+            self.vocab: Dict[str, int] = json.load(f)
+        params = manifest["bm25"]
+        self.k1, self.b, self.avgdl = params["k1"], params["b"], params["avgdl"]
+        self.idf = _map(root / "idf.f32", np.float32)
+        self.offsets = _map(root / "postings.idx", np.uint64)
+        self.docs = _map(root / "postings.doc", np.uint32)
+        self.tfs = _map(root / "postings.tf", np.float32)
+        doclen = _map(root / "doclen.u32", np.uint32)
+        self.corpus_size = len(doclen)
+        # per-document length normalisation, the only per-process array (4 bytes per chunk)
+        self.norm = (self.k1 * (1 - self.b + self.b * doclen / max(self.avgdl, 1e-9))).astype(np.float32)
+
+    def get_scores(self, query: Sequence[str]) -> np.ndarray:
+        scores = np.zeros(self.corpus_size, dtype=np.float32)
+        for term in query:  # repeated query terms count again, as in rank_bm25
+            term_id = self.vocab.get(term)
+            if term_id is None:
+                continue
+            start, end = int(self.offsets[term_id]), int(self.offsets[term_id + 1])
+            docs, tf = self.docs[start:end], self.tfs[start:end]
+            scores[docs] += self.idf[term_id] * tf * (self.k1 + 1) / (tf + self.norm[docs])
+        return scores
+
+
+class MmapFlatL2:
+    """Exact L2 search over memory-mapped vectors, with IndexFlatL2's search()."""
+
+    def __init__(self, root: Path, manifest: Dict):
+        self.d = manifest["dim"]
+        self.ntotal = manifest["chunks"]
+        self.vectors = _map(root / "vectors.f32", np.float32, (self.ntotal, self.d))
+        self.norms = _map(root / "norms.f32", np.float32)
+
+    def search(self, queries: np.ndarray, k: int):
+        queries = np.asarray(queries, dtype=np.float32)
+        k = min(k, self.ntotal)
+        distances = np.empty((len(queries), k), dtype=np.float32)
+        labels = np.empty((len(queries), k), dtype=np.int64)
+        if k <= 0:
+            return distances, labels
+        for row, q in enumerate(queries):
+            dist = self.norms - 2 * (self.vectors @ q) + float(q @ q)
+            top = np.argpartition(dist, k - 1)[:k] if k < self.ntotal else np.arange(self.ntotal)
+            top = top[np.argsort(dist[top])]
+            distances[row], labels[row] = dist[top], top
+        return distances, labels
+
+
+def read_manifest(path) -> Optional[Dict]:
+    try:
+        with open(resolve(path) / "manifest.json", "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, json.JSONDecodeError):
+        return None
+
+
+def is_current(path, model_key: str, sources: Sequence = (), analyzer: str = "whitespace") -> bool:
+    """True if the index exists, was built with this model and analyzer and its sources are unchanged."""
+    manifest = read_manifest(path)
+    if manifest is None or manifest.get("version") != FORMAT_VERSION or manifest.get("model_key") != model_key:
+        return False
+    if manifest.get("analyzer") != analyzer:
+        return False
+    try:
+        return manifest.get("sources") == source_fingerprint(sources)
+    except OSError:
+        return False
+
+
+def open_retriever(path, embedder, reranker_id: Optional[str] = RERANKER_ID,
+                   quantization: Optional[str] = None) -> HybridRetriever:
+    """Open the live build of an index directory zero-copy as a HybridRetriever."""
+    root = resolve(path)
+    manifest = read_manifest(root)
+    if manifest is None:
+        raise FileNotFoundError(f"no flat index at {root}")
+    if manifest["dim"] and manifest["dim"] != embedder.dimension:
+        raise ValueError(f"{root} has {manifest['dim']}-d vectors, the embedder makes {embedder.dimension}-d")
+    if quantization:
+        from rag.quantized import QuantizedL2
+        index = QuantizedL2(root, manifest, quantization)
+    else:
+        index = MmapFlatL2(root, manifest)
+    return HybridRetriever.from_parts(
+        FlatChunks(root), embedder, FlatBM25(root, manifest), index,
+        analyzer=ANALYZERS[manifest["analyzer"]], reranker_id=reranker_id,
+        query_analyzer=QUERY_ANALYZERS.get(manifest["analyzer"]),
+    )
+
+
+def open_or_build(path, load_chunks: Callable[[], Sequence], embedder, sources: Sequence = (),
+                  reranker_id: Optional[str] = RERANKER_ID, quantization: Optional[str] = None,
+                  analyzer: str = "whitespace") -> HybridRetriever:
+    """
+    Map the index at `path`, (re)building it first if it is missing, was built
+    with another embedding model or analyzer, or its source files changed.
+    Concurrent builders each write a private build directory and the last to
+    swap CURRENT wins; a reader never sees a partly written index.
+    """
+    if not is_current(path, embedder.model_key, sources, analyzer):
+        chunks = load_chunks()
+        vectors = embedder.encode([c.page_content for c in chunks])
+        write_index(path, chunks, vectors, embedder.model_key, analyzer=analyzer, sources=sources)
+    return open_retriever(path, embedder, reranker_id, quantization)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = parser.add_subparsers(dest="command", required=True)
+    build = sub.add_parser("build", help="build an index directory from PDFs")
+    build.add_argument("--out", required=True)
+    source = build.add_mutually_exclusive_group(required=True)
+    source.add_argument("--pdf", action="append", help="PDF file (repeatable)")
+    source.add_argument("--pdf-dir", help="every PDF in this directory")
+    build.add_argument("--embed-model", default=LANG_CONFIG['embed_model'])
+    build.add_argument("--analyzer", choices=sorted(ANALYZERS), default=LANG_CONFIG['analyzer'])
+    info = sub.add_parser("info", help="print an index manifest and file sizes")
+    info.add_argument("path")
+    args = parser.parse_args()
+
+    if args.command == "info":
+        manifest = read_manifest(args.path)
+        if manifest is None:
+            print(f"No flat index at {args.path}")
+            sys.exit(1)
+        print(json.dumps({k: v for k, v in manifest.items() if k != "sources"}, indent=2))
+        for f in sorted(resolve(args.path).iterdir()):
+            print(f"  {f.name:<16}{f.stat().st_size / 2**20:>10.2f} MB")
+        return
+
+    from rag.corpus import load_pdf_chunks, pdf_files
+    from rag.embeddings import EmbeddingService
+
+    paths = args.pdf or pdf_files(args.pdf_dir)
+    start = time.perf_counter()
+    chunks = load_pdf_chunks(paths)
+    embedder = EmbeddingService(args.embed_model)
+    vectors = embedder.encode([c.page_content for c in chunks])
+    manifest = write_index(args.out, chunks, vectors, embedder.model_key, analyzer=args.analyzer, sources=paths)
+    print(f"Wrote {manifest['chunks']} chunks, {manifest['terms']} terms to {args.out} "
+          f"in {time.perf_counter() - start:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+"""
+Answer generation with the vietrag LLM, batched or streamed.
+
+The Streamlit apps call model.generate once per question. Generator.generate
+takes a list of prompts and runs them as one left-padded batch, which costs
+little more than a single prompt on a GPU; Generator.stream yields text as
+it is decoded. Both accept the repetition_penalty the apps use.
+
+Any other causal LM (e.g. the small tier of rag.cascade) loads through the
+transformers Auto classes; vietrag keeps its Llama classes.
+"""
+
+import threading
+from typing import Iterator, List, Optional, Sequence
+
+from rag.tracing import current_trace
+
+MODEL_ID = "llm4fun/vietrag-7b-v1.0"
+REPETITION_PENALTY = 1.13
+
+
+class Generator:
+    def __init__(self, model_id: str = MODEL_ID, load_in_4bit: bool = True, device: Optional[str] = None):
+        import torch
+        from transformers import (AutoModelForCausalLM, AutoTokenizer, BitsAndBytesConfig, LlamaForCausalLM,
+                                  LlamaTokenizer)
+
+        self.model_id = model_id
+        self.device = device or ("cuda" if torch.cuda.is_available() else "cpu")
+        tokenizer_class, model_class = ((LlamaTokenizer, LlamaForCausalLM) if model_id == MODEL_ID
+                                        else (AutoTokenizer, AutoModelForCausalLM))
+        self.tokenizer = tokenizer_class.from_pretrained(model_id)
+        # batched prompts must be padded on the left so generation continues each one
+        self.tokenizer.padding_side = "left"
+        if self.tokenizer.pad_token is None:
+            self.tokenizer.pad_token = self.tokenizer.unk_token or self.tokenizer.eos_token
+        kwargs = {}
+        if load_in_4bit and self.device.startswith("cuda"):
+            kwargs = {"quantization_config": BitsAndBytesConfig(load_in_4bit=True), "device_map": self.device}
+        self.model = model_class.from_pretrained(model_id, **kwargs).eval()
+        if not kwargs:
+            self.model.to(self.device)
+
+    def _inputs(self, prompts: Sequence[str]):
+        with current_trace().stage("tokenize"):
+            return self.tokenizer(list(prompts), return_tensors="pt", padding=True).to(self.device)
+
+    def generate(self, prompts: Sequence[str], max_new_tokens: int = 1024, temperature: float = 0.0) -> List[str]:
+        """Greedy by default; temperature > 0 samples (e.g. for self-consistency checks)."""
+        import torch
+
+        trace = current_trace()
+        inputs = self._inputs(prompts)
+        prompt_len = inputs["input_ids"].shape[-1]
+        sampling = {"do_sample": True, "temperature": temperature, "top_p": 0.95} if temperature > 0 else {}
+        with torch.no_grad(), trace.stage("generate"):
+            generated = self.model.generate(
+                **inputs, max_new_tokens=max_new_tokens, pad_token_id=self.tokenizer.pad_token_id,
+                repetition_penalty=REPETITION_PENALTY, **sampling,
+            )
+        trace.count("prompt_tokens", int(inputs["attention_mask"].sum()))
+        trace.count("generated_tokens", int((generated[:, prompt_len:] != self.tokenizer.pad_token_id).sum()))
+        with trace.stage("detokenize"):
+            return self.tokenizer.batch_decode(generated[:, prompt_len:], skip_special_tokens=True)
+
+    def stream(self, prompt: str, max_new_tokens: int = 1024,
+               stop: Optional[threading.Event] = None) -> Iterator[str]:
+        """
+        Yield decoded text pieces as generation proceeds (generate runs in a
+        helper thread). Setting `stop` ends generation at the next token, e.g.
+        when the client went away or its deadline passed.
+        """
+        import torch
+        from transformers import StoppingCriteria, StoppingCriteriaList, TextIteratorStreamer
+
+        inputs = self._inputs([prompt])
+        streamer = TextIteratorStreamer(self.tokenizer, skip_prompt=True, skip_special_tokens=True)
+        stop = stop or threading.Event()
+
+        class _Stop(StoppingCriteria):
+            def __call__(self, input_ids, scores, **kwargs):
+                return stop.is_set()
+
+        def run():
+            with torch.no_grad():
+                self.model.generate(
+                    **inputs, max_new_tokens=max_new_tokens, pad_token_id=self.tokenizer.pad_token_id,
+                    repetition_penalty=REPETITION_PENALTY, streamer=streamer,
+                    stopping_criteria=StoppingCriteriaList([_Stop()]),
+                )
+
+        worker = threading.Thread(target=run, daemon=True)
+        worker.start()
+        yield from streamer
+        worker.join()
@@ -0,0 +1,90 @@
+"""
+Instant answers from the province knowledge tables.
+
+search-engine/knowledge.py extracts attractions, dishes and best seasons
+per province, with their sources, into data/knowledge.sqlite. lookup() runs
+before retrieval: an explicit list question ("Cần Thơ có món gì ngon",
+"địa điểm du lịch Hà Giang", "Hà Nội mùa nào đẹp nhất") that names a
+province, or is asked about the selected one, is answered from the tables
+in well under a millisecond, with no retrieval and no LLM. Anything else
+returns None and goes through the pipeline as before: questions about one
+named dish or place, comparisons and other open-ended questions (OPEN_RE),
+and questions naming a place the tables do not know.
+
+The extracted tables still hold some site chrome and unranked restaurant
+lists, so the lookup is opt-in: RAG_KNOWLEDGE=1. The tables are held in
+memory and reloaded when the file changes (the crawler rebuilds them after
+each crawl). Without the file lookup() always returns None.
+
+    decision = lookup(question, province="CanTho")
+    if decision:
+        decider.record(decision)
+        answer = decision.answer
+"""
+
+import os
+import sys
+import threading
+from typing import Optional
+
+from rag.corpus import SEARCH_ENGINE_DIR
+from rag.decision import OPEN_RE, Decision
+from rag.tracing import current_trace
+
+CONFIG = {
+    'enabled': os.getenv("RAG_KNOWLEDGE", "0") == "1",
+    'path': os.getenv("RAG_KNOWLEDGE_DB", str(SEARCH_ENGINE_DIR / "data" / "knowledge.sqlite")),
+    'limit': 10,
+}
+
+
+class KnowledgeTables:
+    """The search-engine KnowledgeBase, reopened when the database changes on disk."""
+
+    def __init__(self, path: str = CONFIG['path']):
+        self.path = path
+        self.lock = threading.Lock()
+        self.base = None
+        self.version = None
+
+    def get(self):
+        try:
+            # the builder's connection checkpoints into the main file when it closes
+            version = os.stat(self.path).st_mtime_ns
+        except OSError:
+            return None
+        with self.lock:
+            if version != self.version:
+                if str(SEARCH_ENGINE_DIR) not in sys.path:
+                    sys.path.insert(0, str(SEARCH_ENGINE_DIR))
+                from knowledge import KnowledgeBase
+
+                if self.base is not None:
+                    self.base.close()
+                self.base = KnowledgeBase(self.path)
+                self.base.load()
+                self.version = version
+            return self.base
+
+
+_tables = KnowledgeTables()
+
+
+def lookup(question: str, province: Optional[str] = None, limit: int = CONFIG['limit']) -> Optional[Decision]:
+    """A "lookup" Decision for a list question; province is a data/ PDF stem ("CanTho")."""
+    if not CONFIG['enabled'] or OPEN_RE.search(question):
+        return None
+    trace = current_trace()
+    with trace.stage("knowledge"):
+        base = _tables.get()
+        if base is None:
+            return None
+        from knowledge import province_for_stem
+
+        answer = base.lookup(question, province_for_stem(province) if province else None, limit)
+    if answer is None:
+        return None
+    trace.count("knowledge_hits", 1)
+    return Decision("lookup", answer.text, span={"province_id": answer.province_id, "kind": answer.kind,
+                                                 "entries": answer.entries},
+                    reason=f"{answer.kind} table, {len(answer.entries)} entries")
@@ -0,0 +1,120 @@
+"""
+Prompt templates shared by the Streamlit apps and the HTTP service.
+
+ONESHOT_COT is the one-shot chain-of-thought prompt of the OneShot_and_CoT_*
+apps, FEWSHOT_TOT the few-shot tree-of-thought prompt of
+FewShot_and_ToT_select_province.py.
+"""
+
+from typing import Sequence
+
+ONESHOT_COT = """
+### Instruction:
+You are an AI assistant. Provide a detailed answer based on the given contexts.
+Use structured information and reasoning to generate a complete response.
+
+### Contexts:
+{context}
+
+### Question:
+{question}
+
+### Example Response:
+**Q:** What is the best time to visit HaLong Bay?
+**A:** The best time to visit HaLong Bay is from **October to April** when the weather is cool and dry. Avoid June to August due to typhoons.
+
+### Answer:
+"""
+
+FEWSHOT_TOT = """
+### Instructions:
+You are an AI assistant. Use *Tree of Thought (ToT)* reasoning to analyze multiple perspectives before generating a complete response.
+Each thought branch should:
+- Identify a unique approach to answering the question.
+- Reason step by step.
+- Evaluate logical consistency.
+- Combine the best insights to form a well-structured response.
+- Translate the answer into the language of the question.
+
+### Context:
+{context}
+
+### Question:
+{question}
+
+### Example Tree of Thought:
+
+*Q:* How to plan a travel itinerary and enjoy local cuisine in Hanoi?
+
+* - Based on historical data & traveler reviews:*  
+A typical 3-day itinerary in Hanoi includes exploring the Old Quarter, Hoan Kiem Lake, and famous landmarks such as the Ho Chi Minh Mausoleum. Visitors should also experience traditional water puppet shows and take a cyclo tour.  
+
+* - Analyzing local food specialties:*  
+Hanoi is famous for dishes like *Pho, Bun Cha, and Egg Coffee*. A food tour covering local street vendors and hidden gems is highly recommended for an authentic experience.  
+
+* - Considering budget & travel season:*  
+The best time to visit is *autumn (September–November) and spring (March–April)* when the weather is cool. Travelers on a budget can explore street food stalls and local homestays to optimize costs.  
+
+*A:*  
+For a complete Hanoi travel experience, *explore historical sites*, *enjoy street food tours*, and *visit in autumn or spring* for the best weather.  
+
+---
+
+*Q:* What are the most interesting attractions to visit in Hai Phong?
+
+* - Based on popular tourist destinations:*  
+Hai Phong is known for *Do Son Beach, Cat Ba Island, and Lan Ha Bay*, offering beautiful coastal scenery and various water activities.  
+
+* - Analyzing cultural and historical significance:*  
+Historical sites such as *Trang Kenh relic site, Hang Kenh Communal House, and Du Hang Pagoda* provide insight into the city's rich heritage.  
+
+* - Considering travel experience & adventure:*  
+Cat Ba National Park is perfect for nature lovers, while Do Son Casino attracts visitors looking for entertainment. The *Buffalo Fighting Festival in Do Son (September)* is a must-see cultural event.  
+
+*A:*  
+Hai Phong’s top attractions include *Cat Ba Island, Do Son Beach, and Trang Kenh relic site*. For adventure seekers, Cat Ba National Park is ideal.  
+
+---
+
+*Q:* What are the must-try specialty dishes in Da Nang?
+
+*- Researching the city's culinary highlights:*  
+Da Nang is famous for *Mi Quang (turmeric-infused noodles with shrimp and pork), Bun Cha Ca (fish cake noodle soup), and Banh Xeo (crispy Vietnamese pancakes)*.  
+
+*- Understanding local dining culture:*  
+Street food stalls and traditional restaurants offer the best authentic flavors. *Han Market and Con Market* are great spots to try multiple dishes at affordable prices.  
+
+*- Considering seasonal specialties:*  
+Seafood is a must-try in Da Nang, with fresh catches like *grilled stingray, squid, and clams* available throughout the year.  
+
+*A:*  
+The must-try dishes in Da Nang include *Mi Quang, Bun Cha Ca, and Banh Xeo*. For an authentic experience, visit local markets and seafood restaurants.  
+
+---
+
+*Q:* When is the best time to travel to Can Tho?
+
+* - Considering customer reviews:*  
+Can Tho is famous for the Cai Rang floating market, fruit orchards, and its waterways. The peak fruit season is from June to August.
+
+* - Weather conditions:*  
+Can Tho has two seasons: the rainy season (May to November) and the dry season (December to April). The dry season is suitable for easy travel and visiting the floating markets.
+
+* - Economic factors & experiences:*  
+Summer (June to August) offers plenty of fruits and lively activities, but it is also the peak tourist season. If you want to avoid crowds, November to December is a good choice.
+
+*A:*  
+The ideal time to travel to Can Tho is *December to April* to enjoy the dry weather and ease of movement. If you want to experience the fruit season, you can visit in *June to August*.
+
+---
+
+### Answer:
+---
+"""
+
+TEMPLATES = {"oneshot_cot": ONESHOT_COT, "fewshot_tot": FEWSHOT_TOT}
+
+
+def build_prompt(question: str, contexts: Sequence, template: str = ONESHOT_COT) -> str:
+    context_text = "\n\n".join([f"Context [{i+1}]: {x.page_content}" for i, x in enumerate(contexts)])
+    return template.format(context=context_text, question=question)
@@ -0,0 +1,207 @@
+"""
+Bounded, evicting cache of per-province retrievers.
+
+@st.cache_resource keeps every province a user ever selected, so a server
+browsed across all 62 provinces ends up holding 62 indexes. ProvinceStores
+keeps at most `max_stores` of them (and at most `max_bytes`, if set), evicts
+the least recently used, and never evicts pinned provinces:
+
+    stores = ProvinceStores(load_province, max_stores=8, pinned=["HaNoi", "DaNang", "HoChiMinh"])
+    retriever = stores.get("HaNoi")
+
+Reloading an evicted province is cheap when the loader opens a flat index
+(rag.flat_index): the files are mapped again, usually straight from the
+page cache. Memory is accounted per store: "mapped" bytes live in shared,
+reclaimable page cache; "private" bytes are this process's own heap.
+"""
+
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, Iterable, Optional
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+PINNED = ["HaNoi", "DaNang", "HoChiMinh"]
+CONFIG = {
+    'max_stores': int(os.getenv("RAG_MAX_STORES", "8")),
+    'max_mb': float(os.getenv("RAG_MAX_STORES_MB", "0")),  # 0: no byte bound
+}
+
+DICT_ENTRY_BYTES = 100  # rough CPython cost of one str -> int dict entry
+
+
+def _array_bytes(array) -> Dict[str, int]:
+    if isinstance(array, np.memmap):
+        return {"mapped": int(array.nbytes), "private": 0}
+    return {"mapped": 0, "private": int(getattr(array, "nbytes", 0))}
+
+
+def store_memory(retriever) -> Dict[str, int]:
+    """Approximate bytes held by a HybridRetriever, split into mapped and private."""
+    total = {"mapped": 0, "private": 0}
+    if hasattr(retriever, "units"):  # rag.small_to_big.SmallToBigRetriever: sentence index + parents
+        total = store_memory(retriever.units)
+        total["private"] += sum(len(c.page_content.encode("utf-8")) * 2 for c in retriever.chunks)
+        return total
+
+    def add(part: Dict[str, int]) -> None:
+        for key in total:
+            total[key] += part[key]
+
+    index = retriever.index
+    if hasattr(index, "vectors"):  # rag.flat_index.MmapFlatL2
+        add(_array_bytes(index.vectors))
+        add(_array_bytes(index.norms))
+        add({"mapped": 0, "private": getattr(index, "code_bytes", 0)})  # rag.quantized.QuantizedL2
+    else:  # faiss IndexFlatL2
+        add({"mapped": 0, "private": int(index.ntotal) * int(index.d) * 4})
+
+    bm25 = retriever.bm25
+    if hasattr(bm25, "vocab"):  # rag.flat_index.FlatBM25
+        for name in ("idf", "offsets", "docs", "tfs", "norm"):
+            add(_array_bytes(getattr(bm25, name)))
+        add({"mapped": 0, "private": len(bm25.vocab) * DICT_ENTRY_BYTES})
+    else:  # rank_bm25.BM25Okapi
+        entries = sum(len(d) for d in bm25.doc_freqs) + len(bm25.idf)
+        add({"mapped": 0, "private": entries * DICT_ENTRY_BYTES + len(bm25.doc_len) * 8})
+
+    chunks = retriever.chunks
+    if hasattr(chunks, "texts"):  # rag.flat_index.FlatChunks
+        for name in ("texts", "text_offsets", "meta", "meta_offsets"):
+            add(_array_bytes(getattr(chunks, name)))
+    else:
+        text = sum(len(c.page_content.encode("utf-8")) for c in chunks)
+        add({"mapped": 0, "private": text + len(chunks) * 400})  # object and metadata overhead
+    return total
+
+
+class _Entry:
+    __slots__ = ("retriever", "memory", "load_seconds", "loaded_at", "hits")
+
+    def __init__(self, retriever, load_seconds: float):
+        self.retriever = retriever
+        self.memory = store_memory(retriever)
+        self.load_seconds = load_seconds
+        self.loaded_at = time.time()
+        self.hits = 0
+
+    @property
+    def bytes(self) -> int:
+        return self.memory["mapped"] + self.memory["private"]
+
+
+class ProvinceStores:
+    def __init__(self, loader: Callable[[str], object], max_stores: int = CONFIG['max_stores'],
+                 max_bytes: Optional[int] = None, pinned: Iterable[str] = ()):
+        self.loader = loader
+        self.max_stores = max_stores
+        if max_bytes is None and CONFIG['max_mb']:
+            max_bytes = int(CONFIG['max_mb'] * 2**20)
+        self.max_bytes = max_bytes
+        self.pinned = set(pinned)
+        self.lock = threading.Lock()
+        self.entries: "OrderedDict[str, _Entry]" = OrderedDict()
+        self._loading: Dict[str, threading.Lock] = {}
+        self.counters = {"hits": 0, "misses": 0, "evictions": 0, "reloads": 0}
+        self._evicted = set()
+
+    def get(self, province: str):
+        """The province's retriever, loading it (and evicting others) if needed."""
+        with self.lock:
+            entry = self.entries.get(province)
+            if entry is not None:
+                self.entries.move_to_end(province)
+                entry.hits += 1
+                self.counters["hits"] += 1
+                return entry.retriever
+            load_lock = self._loading.setdefault(province, threading.Lock())
+
+        # one loader per province; other callers for it wait here, the rest go on
+        with load_lock:
+            with self.lock:
+                entry = self.entries.get(province)
+                if entry is not None:
+                    self.entries.move_to_end(province)
+                    self.counters["hits"] += 1
+                    return entry.retriever
+            start = time.perf_counter()
+            retriever = self.loader(province)
+            entry = _Entry(retriever, time.perf_counter() - start)
+            with self.lock:
+                self.counters["misses"] += 1
+                if province in self._evicted:
+                    self.counters["reloads"] += 1
+                    self._evicted.discard(province)
+                self.entries[province] = entry
+                self._evict()
+            logger.info(f"Loaded {province} in {entry.load_seconds:.2f}s "
+                        f"({entry.memory['private'] / 2**20:.1f} MB private, {entry.memory['mapped'] / 2**20:.1f} MB mapped)")
+            return retriever
+
+    def load(self, province: str) -> None:
+        """get() without returning the retriever, for background prefetching."""
+        self.get(province)
+
+    def _evict(self) -> None:
+        # called with self.lock held; oldest first, pinned and the newest entry survive
+        newest = next(reversed(self.entries))
+        for name in list(self.entries):
+            if not self._over_budget():
+                break
+            if name in self.pinned or name == newest:
+                continue
+            entry = self.entries.pop(name)
+            self._evicted.add(name)
+            self.counters["evictions"] += 1
+            logger.info(f"Evicted {name} ({entry.bytes / 2**20:.1f} MB)")
+
+    def _over_budget(self) -> bool:
+        if len(self.entries) > self.max_stores:
+            return True
+        return self.max_bytes is not None and self.total_bytes() > self.max_bytes
+
+    def total_bytes(self) -> int:
+        return sum(e.bytes for e in self.entries.values())
+
+    def pin(self, province: str) -> None:
+        with self.lock:
+            self.pinned.add(province)
+
+    def unpin(self, province: str) -> None:
+        with self.lock:
+            self.pinned.discard(province)
+            if self.entries:
+                self._evict()
+
+    def evict(self, province: str) -> bool:
+        with self.lock:
+            if self.entries.pop(province, None) is None:
+                return False
+            self._evicted.add(province)
+            self.counters["evictions"] += 1
+            return True
+
+    def stats(self) -> Dict:
+        with self.lock:
+            return {
+                **self.counters,
+                "stores": len(self.entries),
+                "max_stores": self.max_stores,
+                "max_bytes": self.max_bytes,
+                "total_mb": round(self.total_bytes() / 2**20, 2),
+                "per_store": {
+                    name: {
+                        "pinned": name in self.pinned,
+                        "hits": e.hits,
+                        "load_s": round(e.load_seconds, 3),
+                        "private_mb": round(e.memory["private"] / 2**20, 2),
+                        "mapped_mb": round(e.memory["mapped"] / 2**20, 2),
+                    }
+                    for name, e in self.entries.items()
+                },
+            }
@@ -0,0 +1,171 @@
+"""
+Quantized vectors for candidate generation, rescored with full precision.
+
+At millions of chunks the all-provinces store no longer fits in RAM as
+float32 (768 dims x 4 bytes = 3 KB per chunk). Next to a flat index
+(rag.flat_index) we keep compact codes instead:
+
+    binary   1 bit per dimension (96 bytes per chunk): signs of the
+             mean-centred vector, Hamming search with faiss IndexBinaryFlat,
+             or IndexBinaryHNSW with --hnsw-m
+    int8     1 byte per dimension: per-dimension 8-bit scalar quantization,
+             faiss IndexScalarQuantizer (QT_8bit)
+
+QuantizedL2.search() takes oversample * k candidates from the codes and
+rescores them exactly against vectors.f32, which stays memory-mapped, so only
+the candidates' rows are read. It returns squared L2 distances and ids like
+IndexFlatL2, so a HybridRetriever uses it unchanged.
+
+Usage:
+    python -m rag.quantized build .cache/index/all --kind binary [--hnsw-m 32]
+    RAG_QUANTIZATION=binary streamlit run OneShot_and_CoT_without_select.py
+"""
+
+import argparse
+import os
+import sys
+import time
+from pathlib import Path
+from typing import Dict
+
+import numpy as np
+
+from rag.flat_index import _map, read_manifest, resolve
+
+KINDS = ("binary", "int8")
+CONFIG = {
+    'quantization': os.getenv("RAG_QUANTIZATION") or None,  # None, "binary" or "int8"
+    'hnsw_m': int(os.getenv("RAG_QUANT_HNSW_M", "0")),       # binary only; 0 = exhaustive Hamming
+    'oversample': int(os.getenv("RAG_QUANT_OVERSAMPLE", "10")),
+}
+BATCH = 65536
+TRAIN_SAMPLE = 100_000
+
+
+def code_path(root: Path, kind: str, hnsw_m: int = 0) -> Path:
+    suffix = f"_hnsw{hnsw_m}" if kind == "binary" and hnsw_m else ""
+    return root / f"{kind}{suffix}.faiss"
+
+
+def binarize(vectors: np.ndarray, mean: np.ndarray) -> np.ndarray:
+    return np.packbits(np.asarray(vectors, dtype=np.float32) - mean > 0, axis=1)
+
+
+def is_fresh(path: Path, root: Path) -> bool:
+    """Codes are current if written after the index manifest."""
+    try:
+        return path.stat().st_mtime >= (root / "manifest.json").stat().st_mtime
+    except OSError:
+        return False
+
+
+def build_codes(path, kind: str, hnsw_m: int = 0) -> Dict:
+    """Quantize the vectors of the flat index at `path`; returns sizes and timings."""
+    import faiss
+
+    if kind not in KINDS:
+        raise ValueError(f"unknown quantization {kind!r}, expected one of {KINDS}")
+    root = resolve(path)
+    manifest = read_manifest(root)
+    if manifest is None:
+        raise FileNotFoundError(f"no flat index at {root}")
+    n, d = manifest["chunks"], manifest["dim"]
+    vectors = _map(root / "vectors.f32", np.float32, (n, d))
+    start = time.perf_counter()
+
+    if kind == "binary":
+        if d % 8:
+            raise ValueError(f"binary codes need a dimension divisible by 8, got {d}")
+        mean = np.zeros(d, dtype=np.float64)
+        for lo in range(0, n, BATCH):
+            mean += vectors[lo:lo + BATCH].sum(axis=0, dtype=np.float64)
+        mean = (mean / max(n, 1)).astype(np.float32)
+        tmp = root / f"binary.mean.f32.{os.getpid()}.tmp"  # workers may build at once
+        mean.tofile(tmp)
+        os.replace(tmp, root / "binary.mean.f32")
+        index = faiss.IndexBinaryHNSW(d, hnsw_m) if hnsw_m else faiss.IndexBinaryFlat(d)
+        for lo in range(0, n, BATCH):
+            index.add(binarize(vectors[lo:lo + BATCH], mean))
+        write = faiss.write_index_binary
+    else:
+        index = faiss.IndexScalarQuantizer(d, faiss.ScalarQuantizer.QT_8bit, faiss.METRIC_L2)
+        sample = np.sort(np.random.default_rng(0).choice(n, min(n, TRAIN_SAMPLE), replace=False))
+        index.train(np.ascontiguousarray(vectors[sample]))
+        for lo in range(0, n, BATCH):
+            index.add(np.ascontiguousarray(vectors[lo:lo + BATCH]))
+        write = faiss.write_index
+
+    out = code_path(root, kind, hnsw_m)
+    tmp = out.with_name(f"{out.name}.{os.getpid()}.tmp")
+    write(index, str(tmp))
+    os.replace(tmp, out)
+    return {"kind": kind, "hnsw_m": hnsw_m, "chunks": n, "bytes": out.stat().st_size,
+            "float32_bytes": n * d * 4, "seconds": round(time.perf_counter() - start, 3)}
+
+
+class QuantizedL2:
+    """Candidates from quantized codes, exact squared L2 over the mapped vectors."""
+
+    def __init__(self, root: Path, manifest: Dict, kind: str, hnsw_m: int = CONFIG['hnsw_m'],
+                 oversample: int = CONFIG['oversample']):
+        import faiss
+
+        self.kind = kind
+        self.oversample = oversample
+        self.d = manifest["dim"]
+        self.ntotal = manifest["chunks"]
+        self.vectors = _map(root / "vectors.f32", np.float32, (self.ntotal, self.d))
+        self.norms = _map(root / "norms.f32", np.float32)
+
+        path = code_path(root, kind, hnsw_m)
+        if not is_fresh(path, root):
+            build_codes(root, kind, hnsw_m)
+        if kind == "binary":
+            self.codes = faiss.read_index_binary(str(path))
+            self.mean = np.fromfile(root / "binary.mean.f32", dtype=np.float32)
+        else:
+            self.codes = faiss.read_index(str(path))
+        self.code_bytes = path.stat().st_size  # resident in this process, unlike the mapped vectors
+
+    def candidates(self, queries: np.ndarray, depth: int) -> np.ndarray:
+        if self.kind == "binary":
+            _, labels = self.codes.search(binarize(queries, self.mean), depth)
+        else:
+            _, labels = self.codes.search(queries, depth)
+        return labels
+
+    def search(self, queries: np.ndarray, k: int):
+        queries = np.ascontiguousarray(queries, dtype=np.float32)
+        k = min(k, self.ntotal)
+        distances = np.full((len(queries), k), np.inf, dtype=np.float32)
+        labels = np.full((len(queries), k), -1, dtype=np.int64)
+        if k <= 0:
+            return distances, labels
+        candidates = self.candidates(queries, min(self.ntotal, k * self.oversample))
+        for row, q in enumerate(queries):
+            ids = np.sort(candidates[row][candidates[row] >= 0])  # ascending: sequential page reads
+            dist = self.norms[ids] - 2 * (self.vectors[ids] @ q) + float(q @ q)
+            top = np.argsort(dist)[:k]
+            distances[row, :len(top)], labels[row, :len(top)] = dist[top], ids[top]
+        return distances, labels
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = parser.add_subparsers(dest="command", required=True)
+    build = sub.add_parser("build", help="quantize the vectors of a flat index directory")
+    build.add_argument("path")
+    build.add_argument("--kind", choices=KINDS, default="binary")
+    build.add_argument("--hnsw-m", type=int, default=0, help="IndexBinaryHNSW neighbours (binary only)")
+    args = parser.parse_args()
+
+    if read_manifest(args.path) is None:
+        print(f"No flat index at {args.path}")
+        sys.exit(1)
+    info = build_codes(args.path, args.kind, args.hnsw_m)
+    print(f"Wrote {info['kind']} codes for {info['chunks']} chunks: {info['bytes'] / 2**20:.2f} MB "
+          f"(float32: {info['float32_bytes'] / 2**20:.2f} MB) in {info['seconds']:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,306 @@
+"""
+Real-time ("true RAG") retrieval: live web results fused with the static index.
+
+Live search used to exist only in the offline crawler, which sleeps 2-5 s
+before every request. Here one question fans out under a hard budget:
+
+    1. search (DuckDuckGo, or any HTTP endpoint returning DDGS-style JSON)
+    2. every result page fetched concurrently; pages already in the page
+       cache (.cache/pages, CONFIG['page_ttl_s']) cost nothing
+    3. when the budget runs out, pending fetches are cancelled and their
+       search snippets stand in for them
+    4. whatever arrived is extracted (search-engine/extractor.py), chunked
+       and embedded (through the embedding cache), then ranked together with
+       the static index's candidates by the cross-encoder
+
+Only steps 1-3 are bounded by the budget; step 4 is bounded by
+CONFIG['max_live_chunks'].
+
+    live = RealtimeRetriever(static_retriever, embedder, HttpSearch("http://127.0.0.1:8809/search"))
+    contexts = live.retrieve("Lễ hội pháo hoa Đà Nẵng năm nay diễn ra khi nào?", topk=5)
+
+RAG_SEARCH_URL switches the default provider from DuckDuckGo to such an
+endpoint, e.g. search-engine/mock_search_server.py.
+
+Usage (against the mock server, no models needed):
+    python -m rag.realtime "phở Hà Nội" --search-url http://127.0.0.1:8809/search --no-models
+"""
+
+import argparse
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence
+
+import aiohttp
+import numpy as np
+
+from rag.corpus import SEARCH_ENGINE_DIR, Chunk, split_texts
+from rag.retrieval import get_reranker
+from rag.tracing import current_trace
+
+logger = logging.getLogger(__name__)
+
+CONFIG = {
+    'budget_s': float(os.getenv("RAG_REALTIME_BUDGET_S", "3.0")),
+    'search_results': 5,
+    'max_concurrency': 8,
+    'max_page_bytes': 2 * 1024 * 1024,
+    'max_live_chunks': 64,
+    'page_cache_dir': os.getenv("RAG_PAGE_CACHE_DIR", ".cache/pages"),
+    'page_ttl_s': 24 * 3600,
+    'chunk_size': 1000,
+    'chunk_overlap': 200,
+    'headers': {
+        "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/114.0.0.0 Safari/537.36",
+        "Accept-Language": "vi-VN,vi;q=0.9,en-US;q=0.8,en;q=0.7",
+        "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8",
+    },
+}
+
+
+def extract_page(html: str, url: str) -> Dict:
+    if str(SEARCH_ENGINE_DIR) not in sys.path:
+        sys.path.insert(0, str(SEARCH_ENGINE_DIR))
+    from extractor import extract
+
+    extracted = extract(html, url)
+    return {"url": url, "title": extracted.title, "text": extracted.content}
+
+
+class PageCache:
+    """Extracted pages on disk, one JSON file per URL, valid for ttl seconds."""
+
+    def __init__(self, root: str = CONFIG['page_cache_dir'], ttl: float = CONFIG['page_ttl_s']):
+        self.root = Path(root)
+        self.ttl = ttl
+        self.stats = {"hits": 0, "misses": 0}
+
+    def _path(self, url: str) -> Path:
+        digest = hashlib.sha1(url.encode("utf-8")).hexdigest()
+        return self.root / digest[:2] / f"{digest}.json"
+
+    def get(self, url: str) -> Optional[Dict]:
+        path = self._path(url)
+        try:
+            if time.time() - path.stat().st_mtime <= self.ttl:
+                with open(path, "r", encoding="utf-8") as f:
+                    page = json.load(f)
+                self.stats["hits"] += 1
+                return page
+        except (OSError, json.JSONDecodeError):
+            pass
+        self.stats["misses"] += 1
+        return None
+
+    def put(self, page: Dict) -> None:
+        path = self._path(page["url"])
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_suffix(f".{os.getpid()}.tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(page, f, ensure_ascii=False)
+        os.replace(tmp, path)
+
+
+# Blocking search calls and page extraction run here rather than in the event
+# loop's default executor: asyncio.run() joins that one before returning, so a
+# slow DDGS call or extraction would hold retrieve() past the budget. Work
+# still running when the budget ends finishes in the background.
+_blocking = ThreadPoolExecutor(max_workers=CONFIG['max_concurrency'], thread_name_prefix="realtime")
+
+
+class DDGSSearch:
+    """DuckDuckGo text search (the crawler's source), run in a worker thread."""
+
+    async def search(self, session: aiohttp.ClientSession, query: str, max_results: int) -> List[Dict]:
+        from duckduckgo_search import DDGS
+
+        def run():
+            with DDGS() as ddgs:
+                return list(ddgs.text(query, max_results=max_results))
+
+        return await asyncio.get_running_loop().run_in_executor(_blocking, run)
+
+
+class HttpSearch:
+    """GET <url>?q=...&max_results=N returning {"results": [{"title", "href", "body"}]}."""
+
+    def __init__(self, url: str):
+        self.url = url
+
+    async def search(self, session: aiohttp.ClientSession, query: str, max_results: int) -> List[Dict]:
+        async with session.get(self.url, params={"q": query, "max_results": str(max_results)}) as resp:
+            resp.raise_for_status()
+            return (await resp.json())["results"]
+
+
+def default_search():
+    url = os.getenv("RAG_SEARCH_URL")
+    return HttpSearch(url) if url else DDGSSearch()
+
+
+class RealtimeRetriever:
+    def __init__(self, static=None, embedder=None, search=None, budget: float = CONFIG['budget_s'],
+                 cache: Optional[PageCache] = None, reranker_id: Optional[str] = None):
+        self.static = static
+        self.embedder = embedder if embedder is not None else getattr(static, "embedder", None)
+        self.search = search or default_search()
+        self.budget = budget
+        self.cache = cache or PageCache()
+        self.reranker_id = reranker_id or getattr(static, "reranker_id", None)
+        self.stats = {"searches": 0, "search_failures": 0, "fetched": 0, "cached": 0,
+                      "timed_out": 0, "failed": 0, "snippets": 0}
+
+    async def fetch(self, session: aiohttp.ClientSession, semaphore: asyncio.Semaphore, url: str) -> Optional[Dict]:
+        page = self.cache.get(url)
+        if page is not None:
+            self.stats["cached"] += 1
+            return page
+        async with semaphore:
+            async with session.get(url, headers=CONFIG['headers'], allow_redirects=True) as resp:
+                if resp.status != 200 or "html" not in resp.headers.get("Content-Type", "text/html"):
+                    return None
+                body = await resp.content.read(CONFIG['max_page_bytes'])
+                html = body.decode(resp.charset or "utf-8", errors="ignore")
+        # extraction is CPU work; keep it off the event loop
+        page = await asyncio.get_running_loop().run_in_executor(_blocking, extract_page, html, url)
+        if page["text"]:
+            self.cache.put(page)
+            self.stats["fetched"] += 1
+        return page
+
+    async def live_pages(self, question: str) -> List[Dict]:
+        """Search and fetch within the budget; never raises, returns what arrived in time."""
+        trace = current_trace()
+        deadline = time.monotonic() + self.budget
+        timeout = aiohttp.ClientTimeout(total=self.budget)
+        async with aiohttp.ClientSession(timeout=timeout, headers=CONFIG['headers']) as session:
+            self.stats["searches"] += 1
+            try:
+                with trace.stage("live_search"):
+                    results = await asyncio.wait_for(
+                        self.search.search(session, question, CONFIG['search_results']),
+                        max(0.0, deadline - time.monotonic()))
+            except Exception as e:  # timeouts, HTTP errors, DDGS rate limits: answer from the static index
+                self.stats["search_failures"] += 1
+                logger.warning(f"Live search failed for {question!r}: {type(e).__name__}: {e}")
+                return []
+
+            results = [r for r in results if r.get("href")]
+            semaphore = asyncio.Semaphore(CONFIG['max_concurrency'])
+            tasks = [asyncio.create_task(self.fetch(session, semaphore, r["href"])) for r in results]
+            with trace.stage("live_fetch"):
+                done, pending = await asyncio.wait(tasks, timeout=max(0.0, deadline - time.monotonic())) \
+                    if tasks else (set(), set())
+            for task in pending:
+                task.cancel()
+
+        pages = []
+        for result, task in zip(results, tasks):
+            page = None
+            if task in done:
+                if task.exception() is not None:
+                    self.stats["failed"] += 1
+                    logger.info(f"Fetch failed for {result['href']}: {task.exception()!r}")
+                else:
+                    page = task.result()
+            else:
+                self.stats["timed_out"] += 1
+            if page and page["text"]:
+                pages.append(page)
+            elif result.get("body"):
+                self.stats["snippets"] += 1
+                pages.append({"url": result["href"], "title": result.get("title", ""), "text": result["body"]})
+        trace.count("live_pages", len(pages))
+        trace.count("live_timed_out", len(pending))
+        return pages
+
+    def live_chunks(self, pages: Sequence[Dict]) -> List[Chunk]:
+        chunks = split_texts([f"{p['title']}\n{p['text']}" for p in pages],
+                             [{"url": p["url"], "title": p["title"], "source": "live"} for p in pages],
+                             chunk_size=CONFIG['chunk_size'], chunk_overlap=CONFIG['chunk_overlap'])
+        return chunks[:CONFIG['max_live_chunks']]
+
+    def fuse(self, question: str, pages: Sequence[Dict], topk: int) -> List[Chunk]:
+        """Static candidates plus the best live chunks, reranked together."""
+        trace = current_trace()
+        live = self.live_chunks(pages)
+        query_vector = None
+        if self.embedder is not None and (live or self.static is not None):
+            query_vector = (self.static.embed_query(question) if self.static is not None
+                            else np.asarray([self.embedder.embed_query(question)], dtype=np.float32))
+        if live and query_vector is not None:
+            with trace.stage("live_embed"):
+                vectors = self.embedder.encode([c.page_content for c in live])
+            q = query_vector[0]
+            distances = np.einsum("ij,ij->i", vectors, vectors) - 2 * (vectors @ q)
+            live = [live[i] for i in np.argsort(distances)[:topk]]
+        static = []
+        if self.static is not None:
+            static = [self.static.chunks[i] for i in self.static.candidates(question, topk, query_vector)]
+        candidates = live + static
+        trace.count("live_chunks", len(live))
+        if not candidates or not self.reranker_id:
+            return candidates[:topk]
+        with trace.stage("rerank_load"):
+            reranker = get_reranker(self.reranker_id)
+        with trace.stage("rerank"):
+            scores = reranker.predict([(question, c.page_content) for c in candidates])
+        trace.count("rerank_candidates", len(candidates))
+        return [candidates[j] for j in np.argsort(-np.asarray(scores))[:topk]]
+
+    async def aretrieve(self, question: str, topk: int = 5) -> List[Chunk]:
+        pages = await self.live_pages(question)
+        return await asyncio.get_running_loop().run_in_executor(None, self.fuse, question, pages, topk)
+
+    def retrieve(self, question: str, topk: int = 5) -> List[Chunk]:
+        """Blocking version for Streamlit (which has no running event loop)."""
+        pages = asyncio.run(self.live_pages(question))
+        return self.fuse(question, pages, topk)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("question")
+    parser.add_argument("--search-url", default=None, help="DDGS-style JSON search endpoint (default: RAG_SEARCH_URL or DuckDuckGo)")
+    parser.add_argument("--budget", type=float, default=CONFIG['budget_s'], help="seconds for search + fetch")
+    parser.add_argument("--index", default=None, help="flat index directory to fuse with (rag.flat_index)")
+    parser.add_argument("--topk", type=int, default=5)
+    parser.add_argument("--no-models", action="store_true", help="only search and fetch, print the live pages")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    search = HttpSearch(args.search_url) if args.search_url else default_search()
+    if args.no_models:
+        live = RealtimeRetriever(search=search, budget=args.budget)
+        start = time.perf_counter()
+        pages = asyncio.run(live.live_pages(args.question))
+        print(f"{len(pages)} pages in {time.perf_counter() - start:.2f}s (budget {args.budget}s): {live.stats}")
+        for page in pages:
+            print(f"  {page['url']}  {page['title'][:60]!r}  {len(page['text'])} chars")
+        return
+
+    from rag.embeddings import EmbeddingService
+    from rag.flat_index import open_retriever
+    from rag.retrieval import RERANKER_ID
+
+    embedder = EmbeddingService()
+    static = open_retriever(args.index, embedder) if args.index else None
+    live = RealtimeRetriever(static, embedder, search, args.budget, reranker_id=RERANKER_ID)
+    start = time.perf_counter()
+    contexts = live.retrieve(args.question, args.topk)
+    print(f"{len(contexts)} contexts in {time.perf_counter() - start:.2f}s: {live.stats}")
+    for chunk in contexts:
+        kind = "live" if chunk.metadata.get("source") == "live" else "static"
+        origin = chunk.metadata.get("url") or chunk.metadata.get("source")
+        print(f"  [{kind}] {origin}: {chunk.page_content[:80]!r}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,129 @@
+"""
+Hybrid retrieval: BM25 + dense (FAISS) candidates, cross-encoder reranking.
+
+HybridRetriever.retrieve() keeps the apps' behaviour (top-k from BM25 plus
+top-k from FAISS, reranked, top-k returned) with two fixes: a chunk found by
+both retrievers is scored once, and the cross-encoder is loaded once per
+process and scores all candidates in one batched predict call.
+
+The individual stages are exposed too (bm25_search, dense_search,
+hybrid_search, rerank) so benchmarks can compare configurations.
+"""
+
+from functools import lru_cache
+from typing import Callable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from rag.tracing import current_trace
+
+RERANKER_ID = "cross-encoder/ms-marco-MiniLM-L-6-v2"
+RRF_K = 60
+
+
+def whitespace_analyzer(text: str) -> List[str]:
+    """The BM25 tokenization the apps have always used."""
+    return text.split()
+
+
+@lru_cache(maxsize=4)
+def get_reranker(model_id: str = RERANKER_ID):
+    from sentence_transformers import CrossEncoder
+
+    return CrossEncoder(model_id)
+
+
+class HybridRetriever:
+    def __init__(self, chunks: Sequence, embedder, reranker_id: Optional[str] = RERANKER_ID,
+                 analyzer: Callable[[str], List[str]] = whitespace_analyzer,
+                 vectors: Optional[np.ndarray] = None,
+                 query_analyzer: Optional[Callable[[str], List[str]]] = None):
+        import faiss
+        from rank_bm25 import BM25Okapi
+
+        self.chunks = list(chunks)
+        self.embedder = embedder
+        self.reranker_id = reranker_id
+        self.analyzer = analyzer
+        self.query_analyzer = query_analyzer or analyzer
+        self.bm25 = BM25Okapi([analyzer(c.page_content) for c in self.chunks])
+        if vectors is None:
+            vectors = embedder.encode([c.page_content for c in self.chunks])
+        self.index = faiss.IndexFlatL2(embedder.dimension)
+        self.index.add(np.ascontiguousarray(vectors, dtype=np.float32))
+
+    @classmethod
+    def from_parts(cls, chunks: Sequence, embedder, bm25, index, analyzer: Callable[[str], List[str]] = whitespace_analyzer,
+                   reranker_id: Optional[str] = RERANKER_ID,
+                   query_analyzer: Optional[Callable[[str], List[str]]] = None) -> "HybridRetriever":
+        """
+        Assemble a retriever from prebuilt parts (e.g. rag.flat_index's
+        memory-mapped ones); bm25 needs get_scores(), index needs search().
+        """
+        retriever = cls.__new__(cls)
+        retriever.chunks = chunks
+        retriever.embedder = embedder
+        retriever.reranker_id = reranker_id
+        retriever.analyzer = analyzer
+        retriever.query_analyzer = query_analyzer or analyzer
+        retriever.bm25 = bm25
+        retriever.index = index
+        return retriever
+
+    def __len__(self) -> int:
+        return len(self.chunks)
+
+    def bm25_search(self, question: str, k: int) -> List[Tuple[int, float]]:
+        with current_trace().stage("bm25"):
+            scores = self.bm25.get_scores(self.query_analyzer(question))
+            k = min(k, len(scores))
+            top = np.argpartition(-scores, k - 1)[:k] if k else np.array([], dtype=int)
+            top = top[np.argsort(-scores[top])]
+        return [(int(i), float(scores[i])) for i in top]
+
+    def embed_query(self, question: str) -> np.ndarray:
+        with current_trace().stage("embed_query"):
+            return np.asarray([self.embedder.embed_query(question)], dtype=np.float32)
+
+    def dense_search(self, question: str, k: int, query_vector: Optional[np.ndarray] = None) -> List[Tuple[int, float]]:
+        if query_vector is None:
+            query_vector = self.embed_query(question)
+        with current_trace().stage("dense"):
+            distances, indices = self.index.search(query_vector, min(k, len(self.chunks)))
+        return [(int(i), float(d)) for i, d in zip(indices[0], distances[0]) if i >= 0]
+
+    def hybrid_search(self, question: str, k: int, candidates: Optional[int] = None) -> List[Tuple[int, float]]:
+        """Reciprocal rank fusion of the BM25 and dense rankings."""
+        candidates = candidates or k
+        fused = {}
+        for ranking in (self.bm25_search(question, candidates), self.dense_search(question, candidates)):
+            for rank, (i, _) in enumerate(ranking):
+                fused[i] = fused.get(i, 0.0) + 1.0 / (RRF_K + rank + 1)
+        return sorted(fused.items(), key=lambda item: item[1], reverse=True)[:k]
+
+    def candidates(self, question: str, k: int, query_vector: Optional[np.ndarray] = None) -> List[int]:
+        """BM25 top-k followed by dense top-k, without duplicates."""
+        seen = {}
+        for i, _ in self.bm25_search(question, k) + self.dense_search(question, k, query_vector):
+            seen.setdefault(i, None)
+        return list(seen)
+
+    def rerank(self, question: str, indices: Sequence[int]) -> List[Tuple[int, float]]:
+        trace = current_trace()
+        if not indices:
+            return []
+        with trace.stage("rerank_load"):
+            reranker = get_reranker(self.reranker_id)
+        with trace.stage("rerank"):
+            scores = reranker.predict([(question, self.chunks[i].page_content) for i in indices])
+        trace.count("rerank_candidates", len(indices))
+        order = np.argsort(-np.asarray(scores))
+        return [(int(indices[j]), float(scores[j])) for j in order]
+
+    def retrieve(self, question: str, topk: int = 5, rerank: bool = True) -> List:
+        indices = self.candidates(question, topk)
+        if rerank and self.reranker_id:
+            ranked = [i for i, _ in self.rerank(question, indices)]
+        else:
+            ranked = indices
+        return [self.chunks[i] for i in ranked[:topk]]
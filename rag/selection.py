@@ -0,0 +1,196 @@
+"""
+Context selection: diverse, non-overlapping evidence within a token budget.
+
+Chunks are cut with a 200-character overlap and the crawl holds several
+copies of popular articles, so the top-5 passed to the prompt often repeat
+the same paragraphs: prefill tokens are spent twice and other attractions
+are crowded out. select_contexts() replaces "the first k reranked chunks":
+
+    collapse   candidates from the same source page whose texts overlap
+               (neighbouring chunks of one split) become one passage, the
+               overlap kept once
+    MMR        Maximal Marginal Relevance over the candidates' embedding
+               matrix: one n x n cosine matrix, then each step picks
+               argmax(lambda * relevance - (1 - lambda) * max similarity to
+               the picked ones), updating the max-similarity vector in place
+    dedupe     a candidate at cosine >= CONFIG['duplicate_similarity'] to a
+               picked one is dropped outright (a re-posted article)
+    budget     passages are added while they fit CONFIG['budget_tokens']; one
+               that does not fit is skipped for a shorter one, and no more
+               than top-k are picked
+
+Relevance is the reranker score (min-max scaled) when there is one, else
+cosine similarity to the query. The vectors come from the index the
+candidates were found in (mmap'd flat index, quantized index or FAISS), so
+nothing is re-embedded. RAG_CONTEXT_SELECT=0 restores the plain top-k.
+
+    results = select_retrieve(retriever, question, topk=5)   # [(chunk, score)]
+"""
+
+import os
+from typing import Callable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from rag.corpus import CHUNK_OVERLAP, Chunk
+from rag.tracing import current_trace
+
+CONFIG = {
+    'enabled': os.getenv("RAG_CONTEXT_SELECT", "1") == "1",
+    'budget_tokens': int(os.getenv("RAG_CONTEXT_TOKENS", "1500")),
+    'mmr_lambda': float(os.getenv("RAG_MMR_LAMBDA", "0.7")),
+    'duplicate_similarity': 0.95,
+    'chars_per_token': 3.0,   # llama tokenizer on Vietnamese text, roughly
+}
+
+
+def estimate_tokens(text: str) -> int:
+    return int(len(text) / CONFIG['chars_per_token']) + 1
+
+
+def overlap(a: str, b: str, max_chars: int = CHUNK_OVERLAP) -> int:
+    """Length of the longest suffix of a that b starts with (within max_chars), 0 if none."""
+    probe = b[:min(48, len(b))]
+    if not probe:
+        return 0
+    start = a.find(probe, max(0, len(a) - max_chars))
+    while start >= 0:
+        if b.startswith(a[start:]):
+            return len(a) - start
+        start = a.find(probe, start + 1)
+    return 0
+
+
+def candidate_vectors(retriever, indices: Sequence[int]) -> np.ndarray:
+    """Stored embeddings of the candidates: mapped vectors, FAISS reconstruct, or (last resort) the embedder."""
+    ids = np.asarray(indices, dtype=np.int64)
+    index = getattr(retriever, "index", None)
+    vectors = getattr(index, "vectors", None)  # MmapFlatL2, QuantizedL2
+    if vectors is not None:
+        return np.asarray(vectors[ids], dtype=np.float32)
+    if hasattr(index, "reconstruct_batch"):
+        return np.asarray(index.reconstruct_batch(ids), dtype=np.float32)
+    return np.asarray(retriever.embedder.encode([retriever.chunks[i].page_content for i in indices]),
+                      dtype=np.float32)
+
+
+def collapse(chunks: Sequence[Chunk], vectors: np.ndarray, relevance: np.ndarray
+             ) -> Tuple[List[Chunk], np.ndarray, np.ndarray]:
+    """Merge overlapping chunks of the same source page; vectors are averaged, relevance is the max."""
+    order = sorted(range(len(chunks)), key=lambda i: (str(chunks[i].metadata.get("source")),
+                                                     str(chunks[i].metadata.get("page")),
+                                                     chunks[i].metadata.get("chunk", 0)))
+    groups: List[List[int]] = []
+    texts: List[str] = []
+    for i in order:
+        meta = chunks[i].metadata
+        if groups:
+            last = chunks[groups[-1][-1]].metadata
+            same_page = (meta.get("source") is not None and meta.get("source") == last.get("source")
+                         and meta.get("page") == last.get("page"))
+            shared = overlap(texts[-1], chunks[i].page_content) if same_page else 0
+            if shared:
+                groups[-1].append(i)
+                texts[-1] += chunks[i].page_content[shared:]
+                continue
+        groups.append([i])
+        texts.append(chunks[i].page_content)
+    # keep the best-ranked member's position so the caller's order survives
+    ranked = sorted(range(len(groups)), key=lambda g: min(groups[g]))
+    merged, merged_vectors, merged_relevance = [], [], []
+    for g in ranked:
+        members = groups[g]
+        first = chunks[members[0]]
+        metadata = first.metadata if len(members) == 1 else {
+            **first.metadata, "chunks": [chunks[i].metadata.get("chunk") for i in members]}
+        merged.append(Chunk(page_content=texts[g], metadata=metadata))
+        merged_vectors.append(vectors[members].mean(axis=0))
+        merged_relevance.append(relevance[members].max())
+    return merged, np.asarray(merged_vectors, dtype=np.float32), np.asarray(merged_relevance, dtype=np.float32)
+
+
+def mmr(vectors: np.ndarray, relevance: np.ndarray, costs: Sequence[int], budget: int,
+        mmr_lambda: float = CONFIG['mmr_lambda'],
+        duplicate_similarity: float = CONFIG['duplicate_similarity'], limit: Optional[int] = None) -> List[int]:
+    """Greedy MMR order of at most limit rows that fit the budget; vectors need not be normalized."""
+    n = len(vectors)
+    if n == 0:
+        return []
+    unit = vectors / np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+    similarity = unit @ unit.T
+    span = float(relevance.max() - relevance.min())
+    scaled = (relevance - relevance.min()) / span if span > 0 else np.ones(n, dtype=np.float32)
+    costs = np.asarray(costs)
+    closest = np.full(n, -np.inf, dtype=np.float32)  # max similarity to anything picked so far
+    available = np.ones(n, dtype=bool)
+    picked: List[int] = []
+    remaining = budget
+    while limit is None or len(picked) < limit:
+        available &= costs <= remaining
+        if not available.any():
+            break
+        penalty = np.where(np.isfinite(closest), closest, 0.0)
+        score = np.where(available, mmr_lambda * scaled - (1 - mmr_lambda) * penalty, -np.inf)
+        best = int(np.argmax(score))
+        picked.append(best)
+        remaining -= int(costs[best])
+        available[best] = False
+        np.maximum(closest, similarity[best], out=closest)
+        available &= closest < duplicate_similarity
+    return picked
+
+
+def select_contexts(chunks: Sequence[Chunk], vectors: np.ndarray, scores: Optional[Sequence[float]] = None,
+                    query_vector: Optional[np.ndarray] = None, budget: int = CONFIG['budget_tokens'],
+                    count_tokens: Callable[[str], int] = estimate_tokens, topk: Optional[int] = None
+                    ) -> List[Tuple[Chunk, Optional[float]]]:
+    """
+    At most topk diverse [(passage, score)] from ranked candidates; scores are
+    the reranker's (None without a reranker, then query_vector is required).
+    """
+    trace = current_trace()
+    if not chunks:
+        return []
+    with trace.stage("select"):
+        vectors = np.asarray(vectors, dtype=np.float32)
+        if scores is not None and all(s is not None for s in scores):
+            relevance = np.asarray(scores, dtype=np.float32)
+        else:
+            query = np.asarray(query_vector, dtype=np.float32).reshape(-1)
+            relevance = (vectors @ query) / np.maximum(np.linalg.norm(vectors, axis=1) * np.linalg.norm(query), 1e-12)
+            scores = None
+        passages, passage_vectors, passage_relevance = collapse(chunks, vectors, relevance)
+        costs = [count_tokens(p.page_content) for p in passages]
+        picked = mmr(passage_vectors, passage_relevance, costs, budget, limit=topk)
+        if not picked:  # nothing fits: the best passage alone, as the plain top-k would have given
+            picked = [int(np.argmax(passage_relevance))]
+    trace.count("collapsed_chunks", len(chunks) - len(passages))
+    trace.count("context_tokens", sum(costs[i] for i in picked))
+    return [(passages[i], float(passage_relevance[i]) if scores is not None else None) for i in picked]
+
+
+def select_retrieve(retriever, question: str, topk: int = 5, indices: Optional[Sequence[int]] = None
+                    ) -> List[Tuple[Chunk, Optional[float]]]:
+    """
+    rag.decision.scored_retrieve with the context selection stage in place of
+    the top-k cut; indices skips the candidate search (a conversation reusing
+    the previous turn's candidates, see rag.conversation).
+    """
+    from rag.decision import scored_retrieve
+
+    if not hasattr(retriever, "candidates") or not hasattr(retriever, "index"):
+        return scored_retrieve(retriever, question, topk)
+    query_vector = None
+    if indices is None:
+        query_vector = retriever.embed_query(question)
+        indices = retriever.candidates(question, topk, query_vector)
+    scores = None
+    if retriever.reranker_id:
+        ranked = retriever.rerank(question, indices)
+        indices, scores = [i for i, _ in ranked], [s for _, s in ranked]
+    if not CONFIG['enabled']:
+        return [(retriever.chunks[i], scores[j] if scores else None) for j, i in enumerate(indices[:topk])]
+    if scores is None and query_vector is None:
+        query_vector = retriever.embed_query(question)
+    return select_contexts([retriever.chunks[i] for i in indices], candidate_vectors(retriever, indices),
+                           scores, query_vector, topk=topk)
@@ -0,0 +1,510 @@
+"""
+Async HTTP RAG service.
+
+One process holds the embedding model, the cross-encoder and the LLM, and
+serves any number of Streamlit (or other) clients:
+
+    POST /retrieve       {"question": ..., "province": "HaNoi", "topk": 5, "rerank": true, "timeout_ms": 30000}
+                         -> {"contexts": [{"text", "metadata", "score"}]}
+    POST /answer         same fields + "max_new_tokens", "template" (oneshot_cot | fewshot_tot)
+                         -> {"answer", "contexts", "decision", "tier"}
+    POST /answer/stream  same as /answer, as Server-Sent Events:
+                         "contexts" event, then "token" events, then "done" (or "error");
+                         an answer made without the LLM is a single "answer" event
+    GET  /provinces      province names accepted by "province" (omit it to search all PDFs)
+    GET  /health         readiness, queue depths and batching stats
+
+With tracing on (RAG_TRACE / RAG_METRICS_PORT), /retrieve and /answer also
+return "trace_id" and "stages_ms" so load tests can break latency down.
+
+Query embedding, reranking and generation each go through a MicroBatcher,
+so concurrent requests share one forward pass. Streamed answers queue
+separately and run one at a time on the generation thread, between batches,
+so a long stream never holds back /answer results. Full queues answer 429 with
+Retry-After, and every request carries a deadline (timeout_ms, capped by
+CONFIG['max_timeout_ms']) after which it gets a 504 instead of occupying
+the model.
+
+List questions (a province's dishes, attractions, best season) are
+answered from rag.knowledge's tables before retrieval. Before generation,
+with RAG_DECISION=1, rag.decision looks at the reranker scores: a factoid
+question whose answer is one sentence of the top chunk gets that sentence
+(with its source span), and a question nothing relevant was retrieved for
+gets a fixed "not in the documents" reply. Neither reaches the LLM, so
+they are also answered with --no-llm; /health counts the calls avoided.
+With RAG_CASCADE=1 the remaining questions go through rag.cascade: easy
+ones are answered by the small model, the rest by the 7B batcher.
+
+Usage:
+    python -m rag.server [--host 0.0.0.0] [--port 8900] [--no-llm]
+"""
+
+import argparse
+import asyncio
+import contextvars
+import json
+import logging
+import os
+import threading
+import time
+from typing import Dict, List, Optional
+
+from aiohttp import web
+
+from rag.batching import DeadlineExceeded, MicroBatcher, QueueFull
+from rag.bilingual import CONFIG as LANG_CONFIG
+from rag.cascade import ModelCascade
+from rag.corpus import PDF_DIR, load_pdf_chunks, pdf_files
+from rag.decision import Decision, DecisionStage
+from rag.flat_index import INDEX_DIR, open_or_build
+from rag.knowledge import lookup as knowledge_lookup
+from rag.prompts import TEMPLATES, build_prompt
+from rag.province_stores import CONFIG as STORES_CONFIG, PINNED, ProvinceStores
+from rag.quantized import CONFIG as QUANT_CONFIG
+from rag.retrieval import HybridRetriever, get_reranker
+from rag.selection import CONFIG as SELECT_CONFIG, candidate_vectors, select_contexts
+from rag.tracing import tracer
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+CONFIG = {
+    'host': os.getenv("RAG_HOST", "127.0.0.1"),
+    'port': int(os.getenv("RAG_PORT", "8900")),
+    'embed_model': LANG_CONFIG['embed_model'],   # RAG_LANGUAGE_MODE, see rag.bilingual
+    'reranker': LANG_CONFIG['reranker'],
+    'analyzer': LANG_CONFIG['analyzer'],
+    'llm': "llm4fun/vietrag-7b-v1.0",
+    'pdf_dir': str(PDF_DIR),
+    'index_dir': INDEX_DIR,         # flat mmap'd indexes, see rag.flat_index
+    'max_stores': STORES_CONFIG['max_stores'],  # open indexes; least recently used are closed first
+    'quantization': QUANT_CONFIG['quantization'],  # all-provinces store only, see rag.quantized
+    'max_queue': 64,                # per batcher; beyond this requests get 429
+    'embed_batch': 32,
+    'rerank_batch': 16,             # requests, each with up to 2 * topk candidates
+    'generate_batch': 4,
+    'embed_wait_ms': 5,
+    'rerank_wait_ms': 5,
+    'generate_wait_ms': 20,
+    'default_timeout_ms': 120_000,
+    'max_timeout_ms': 600_000,
+    'max_topk': 20,
+    'max_new_tokens': 1024,
+}
+
+ALL_PROVINCES = "all"
+
+
+class BadRequest(Exception):
+    pass
+
+
+class RagService:
+    def __init__(self, config: Dict = CONFIG, load_llm: bool = True):
+        self.config = config
+        self.load_llm = load_llm
+        self.embedder = None
+        self.generator = None
+        self.decider = DecisionStage(config['reranker'])
+        self.cascade = ModelCascade()
+        self.stores = ProvinceStores(self._build, config['max_stores'], pinned=PINNED + [ALL_PROVINCES])
+        self.ready = False
+        self.provinces = sorted(
+            os.path.splitext(os.path.basename(p))[0] for p in pdf_files(config['pdf_dir'])
+        )
+        self.embed_batcher = MicroBatcher("embed", self._embed_batch, config['embed_batch'],
+                                          config['embed_wait_ms'] / 1000, config['max_queue'])
+        self.rerank_batcher = MicroBatcher("rerank", self._rerank_batch, config['rerank_batch'],
+                                           config['rerank_wait_ms'] / 1000, config['max_queue'])
+        self.generate_batcher = MicroBatcher("generate", self._generate_batch, config['generate_batch'],
+                                             config['generate_wait_ms'] / 1000, config['max_queue'])
+        # streams take turns with the batches on the one LLM thread
+        self.stream_batcher = MicroBatcher("stream", self._stream_batch, 1, 0, config['max_queue'],
+                                           executor=self.generate_batcher.executor)
+
+    # --- lifecycle ---
+
+    @property
+    def batchers(self) -> tuple:
+        return self.embed_batcher, self.rerank_batcher, self.generate_batcher, self.stream_batcher
+
+    async def start(self, app: web.Application) -> None:
+        for batcher in self.batchers:
+            await batcher.start()
+        asyncio.create_task(self._load_models())
+
+    async def stop(self, app: web.Application) -> None:
+        for batcher in self.batchers:
+            await batcher.stop()
+
+    async def _load_models(self) -> None:
+        from rag.embeddings import EmbeddingService
+
+        loop = asyncio.get_running_loop()
+        start = time.perf_counter()
+        self.embedder = await loop.run_in_executor(None, EmbeddingService, self.config['embed_model'])
+        await loop.run_in_executor(None, get_reranker, self.config['reranker'])
+        if self.load_llm:
+            from rag.generation import Generator
+            self.generator = await loop.run_in_executor(None, Generator, self.config['llm'])
+            if self.cascade.enabled:
+                await loop.run_in_executor(None, self.cascade.load)
+        self.ready = True
+        logger.info(f"Models loaded in {time.perf_counter() - start:.1f}s")
+
+    async def get_retriever(self, province: Optional[str]) -> HybridRetriever:
+        key = province or ALL_PROVINCES
+        if key != ALL_PROVINCES and key not in self.provinces:
+            raise web.HTTPNotFound(text=json.dumps({"error": f"unknown province {province!r}"}),
+                                   content_type="application/json")
+        # ProvinceStores loads each key once, even with concurrent misses
+        return await asyncio.get_running_loop().run_in_executor(None, self.stores.get, key)
+
+    def _build(self, key: str) -> HybridRetriever:
+        start = time.perf_counter()
+        if key == ALL_PROVINCES:
+            paths = pdf_files(self.config['pdf_dir'])
+        else:
+            paths = [os.path.join(self.config['pdf_dir'], f"{key}.pdf")]
+        # shared with other workers (and the Streamlit apps) through the page cache
+        retriever = open_or_build(os.path.join(self.config['index_dir'], key), lambda: load_pdf_chunks(paths),
+                                  self.embedder, sources=paths, reranker_id=self.config['reranker'],
+                                  quantization=self.config['quantization'] if key == ALL_PROVINCES else None,
+                                  analyzer=self.config['analyzer'])
+        tracer.event("index_build", time.perf_counter() - start, source=key, chunks=len(retriever))
+        logger.info(f"Opened {key}: {len(retriever)} chunks in {time.perf_counter() - start:.1f}s")
+        return retriever
+
+    # --- batch functions (run in the batchers' executor threads) ---
+
+    def _embed_batch(self, questions: List[str]):
+        return list(self.embedder.embed_queries(questions))
+
+    def _rerank_batch(self, items: List[tuple]) -> List[List[float]]:
+        pairs = [(question, text) for question, texts in items for text in texts]
+        if not pairs:
+            return [[] for _ in items]
+        scores = get_reranker(self.config['reranker']).predict(pairs, batch_size=64)
+        out, offset = [], 0
+        for _, texts in items:
+            out.append([float(s) for s in scores[offset:offset + len(texts)]])
+            offset += len(texts)
+        return out
+
+    def _generate_batch(self, items: List[dict]) -> List[str]:
+        results: List[Optional[str]] = [None] * len(items)
+        # one generate() per max_new_tokens, so no request decodes past its own limit
+        by_limit: Dict[int, List[int]] = {}
+        for i, item in enumerate(items):
+            by_limit.setdefault(item["max_new_tokens"], []).append(i)
+        for max_new_tokens, group in by_limit.items():
+            answers = self.generator.generate([items[i]["prompt"] for i in group], max_new_tokens)
+            for i, answer in zip(group, answers):
+                results[i] = answer
+        return results
+
+    def _stream_batch(self, items: List[dict]) -> List[None]:
+        """Push each item's tokens to its sink, then an exception if generation failed, then None."""
+        for item in items:
+            try:
+                for piece in self.generator.stream(item["prompt"], item["max_new_tokens"], item["stop"]):
+                    item["sink"](piece)
+            except Exception as e:
+                logger.exception("Streamed generation failed")
+                item["sink"](e)
+            finally:
+                item["sink"](None)
+        return [None] * len(items)
+
+    # --- request handling ---
+
+    def parse(self, payload: Dict) -> Dict:
+        question = (payload.get("question") or "").strip()
+        if not question:
+            raise BadRequest("question is required")
+        try:
+            topk = int(payload.get("topk", 5))
+            timeout_ms = int(payload.get("timeout_ms", self.config['default_timeout_ms']))
+            max_new_tokens = int(payload.get("max_new_tokens", self.config['max_new_tokens']))
+        except (TypeError, ValueError):
+            raise BadRequest("topk, timeout_ms and max_new_tokens must be integers")
+        template = payload.get("template", "oneshot_cot")
+        if template not in TEMPLATES:
+            raise BadRequest(f"template must be one of {sorted(TEMPLATES)}")
+        timeout_ms = max(1, min(timeout_ms, self.config['max_timeout_ms']))
+        return {
+            "question": question,
+            "province": payload.get("province") or None,
+            "topk": max(1, min(topk, self.config['max_topk'])),
+            "rerank": bool(payload.get("rerank", True)),
+            "template": TEMPLATES[template],
+            "max_new_tokens": max(1, min(max_new_tokens, self.config['max_new_tokens'])),
+            "deadline": time.monotonic() + timeout_ms / 1000,
+        }
+
+    async def retrieve(self, req: Dict, trace) -> List[tuple]:
+        """[(passage, score)] for one request; score is the reranker's (or None). See rag.selection."""
+        retriever = await self.get_retriever(req["province"])
+        with trace.stage("embed_query"):
+            query_vector = await self.embed_batcher.submit(req["question"], req["deadline"])
+        ctx = contextvars.copy_context()
+        indices = await asyncio.get_running_loop().run_in_executor(
+            None, ctx.run, retriever.candidates, req["question"], req["topk"], query_vector.reshape(1, -1),
+        )
+        scores = None
+        if req["rerank"]:
+            with trace.stage("rerank"):
+                scores = await self.rerank_batcher.submit(
+                    (req["question"], [retriever.chunks[i].page_content for i in indices]), req["deadline"],
+                )
+            trace.count("rerank_candidates", len(indices))
+            ranked = sorted(zip(indices, scores), key=lambda pair: pair[1], reverse=True)
+            indices, scores = [i for i, _ in ranked], [score for _, score in ranked]
+        if SELECT_CONFIG['enabled'] and indices:
+            # MMR + overlap collapse over every candidate, within the context token budget and topk
+            ctx = contextvars.copy_context()
+            return await asyncio.get_running_loop().run_in_executor(
+                None, ctx.run, lambda: select_contexts([retriever.chunks[i] for i in indices],
+                                                       candidate_vectors(retriever, indices), scores, query_vector,
+                                                       topk=req["topk"]),
+            )
+        scores = scores or [None] * len(indices)
+        return [(retriever.chunks[i], score) for i, score in zip(indices, scores)][:req["topk"]]
+
+    async def decide(self, req: Dict, results: List[tuple], trace) -> Decision:
+        """rag.decision on the reranked results; sentence scoring shares the rerank batcher."""
+        loop = asyncio.get_running_loop()
+
+        def score_sentences(question: str, sentences) -> List[float]:
+            return asyncio.run_coroutine_threadsafe(
+                self.rerank_batcher.submit((question, list(sentences)), req["deadline"]), loop,
+            ).result()
+
+        with trace.stage("decision"):
+            ctx = contextvars.copy_context()
+            return await loop.run_in_executor(None, ctx.run, self.decider.decide, req["question"], results,
+                                              score_sentences)
+
+    async def answer_small(self, req: Dict, results: List[tuple]) -> tuple:
+        """(answer, reason) from rag.cascade's small tier; answer is None when the 7B model should answer."""
+        if not self.cascade.enabled:
+            return None, "cascade off"
+        self.cascade.stats["questions"] += 1
+        ctx = contextvars.copy_context()
+        answer, reason = await asyncio.get_running_loop().run_in_executor(
+            None, ctx.run, self.cascade.try_small, req["question"], [chunk for chunk, _ in results],
+        )
+        self.cascade.stats["small" if answer is not None else "large"] += 1
+        return answer, reason
+
+    @staticmethod
+    def decision_json(decision: Decision) -> Dict:
+        return {"action": decision.action, "top_score": decision.top_score, "span": decision.span,
+                "reason": decision.reason}
+
+    @staticmethod
+    def contexts_json(results: List[tuple]) -> List[Dict]:
+        return [{"text": chunk.page_content, "metadata": chunk.metadata, "score": score} for chunk, score in results]
+
+
+def error(status: int, message: str, **headers) -> web.Response:
+    return web.json_response({"error": message}, status=status, headers=headers or None)
+
+
+def trace_fields(trace) -> Dict:
+    """Trace id and per-stage timings for the response body (empty when tracing is off)."""
+    if not trace.enabled:
+        return {}
+    return {"trace_id": trace.id, "stages_ms": {k: round(v * 1000, 3) for k, v in trace.stages.items()}}
+
+
+def make_app(service: RagService) -> web.Application:
+    async def read_request(request: web.Request) -> Dict:
+        try:
+            payload = await request.json()
+        except (json.JSONDecodeError, UnicodeDecodeError):
+            raise BadRequest("body must be JSON")
+        if not isinstance(payload, dict):
+            raise BadRequest("body must be a JSON object")
+        return service.parse(payload)
+
+    def guarded(handler):
+        async def wrapper(request: web.Request):
+            if not service.ready:
+                return error(503, "models are loading", **{"Retry-After": "5"})
+            try:
+                return await handler(request)
+            except BadRequest as e:
+                return error(400, str(e))
+            except QueueFull as e:
+                return error(429, str(e), **{"Retry-After": "1"})
+            except DeadlineExceeded as e:
+                return error(504, str(e))
+        return wrapper
+
+    @guarded
+    async def retrieve(request: web.Request) -> web.Response:
+        req = await read_request(request)
+        with tracer.request(question=req["question"], topk=req["topk"], province=req["province"],
+                            endpoint="retrieve") as trace:
+            results = await service.retrieve(req, trace)
+        return web.json_response({"contexts": service.contexts_json(results), **trace_fields(trace)})
+
+    @guarded
+    async def answer(request: web.Request) -> web.Response:
+        req = await read_request(request)
+        with tracer.request(question=req["question"], topk=req["topk"], province=req["province"],
+                            endpoint="answer") as trace:
+            structured = knowledge_lookup(req["question"], req["province"])
+            if structured:
+                service.decider.record(structured)
+                return web.json_response({"answer": structured.answer, "contexts": [],
+                                          "decision": service.decision_json(structured), **trace_fields(trace)})
+            results = await service.retrieve(req, trace)
+            trace.count("context_chunks", len(results))
+            decision = await service.decide(req, results, trace)
+            if decision.action != "generate":
+                return web.json_response({"answer": decision.answer, "contexts": service.contexts_json(results),
+                                          "decision": service.decision_json(decision), **trace_fields(trace)})
+            if service.generator is None:
+                return error(501, "the service was started without an LLM")
+            generated, reason = await service.answer_small(req, results)
+            tier = "small" if generated is not None else "large"
+            if generated is None:
+                prompt = build_prompt(req["question"], [chunk for chunk, _ in results], req["template"])
+                start = time.perf_counter()
+                with trace.stage("generate"):
+                    generated = await service.generate_batcher.submit(
+                        {"prompt": prompt, "max_new_tokens": req["max_new_tokens"]},
+                        req["deadline"],
+                    )
+                if service.cascade.enabled:
+                    service.cascade.record("large", time.perf_counter() - start, reason=reason)
+        return web.json_response({"answer": generated, "contexts": service.contexts_json(results),
+                                  "decision": service.decision_json(decision), "tier": tier, **trace_fields(trace)})
+
+    @guarded
+    async def answer_stream(request: web.Request) -> web.StreamResponse:
+        req = await read_request(request)
+        loop = asyncio.get_running_loop()
+        pieces: asyncio.Queue = asyncio.Queue()
+        stop = threading.Event()
+
+        def sink(piece: Optional[str]) -> None:
+            loop.call_soon_threadsafe(pieces.put_nowait, piece)
+
+        with tracer.request(question=req["question"], topk=req["topk"], province=req["province"],
+                            endpoint="answer/stream") as trace:
+            structured = knowledge_lookup(req["question"], req["province"])
+            if structured:
+                service.decider.record(structured)
+                results, decision = [], structured
+            else:
+                results = await service.retrieve(req, trace)
+                decision = await service.decide(req, results, trace)
+            if decision.action == "generate" and service.generator is None:
+                return error(501, "the service was started without an LLM")
+
+            response = web.StreamResponse(headers={"Content-Type": "text/event-stream", "Cache-Control": "no-cache"})
+            await response.prepare(request)
+
+            async def send(event: str, data) -> None:
+                await response.write(f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n".encode("utf-8"))
+
+            if decision.action != "generate":
+                await send("contexts", service.contexts_json(results))
+                await send("answer", {"answer": decision.answer, "decision": service.decision_json(decision)})
+                await send("done", {"pieces": 0})
+                return response
+            small_answer, reason = await service.answer_small(req, results)
+            if small_answer is not None:
+                await send("contexts", service.contexts_json(results))
+                await send("answer", {"answer": small_answer, "decision": service.decision_json(decision),
+                                      "tier": "small"})
+                await send("done", {"pieces": 0})
+                return response
+            generate_start = time.perf_counter()
+
+            prompt = build_prompt(req["question"], [chunk for chunk, _ in results], req["template"])
+            submitted = asyncio.ensure_future(service.stream_batcher.submit(
+                {"prompt": prompt, "max_new_tokens": req["max_new_tokens"], "sink": sink, "stop": stop},
+                req["deadline"],
+            ))
+            await send("contexts", service.contexts_json(results))
+            generated = 0
+            piece = None
+            try:
+                while True:
+                    get = asyncio.ensure_future(pieces.get())
+                    # the batcher future fails on deadline/queue errors; once it succeeded, only tokens matter
+                    waiters = {get} if submitted.done() else {get, submitted}
+                    done, _ = await asyncio.wait(waiters, timeout=max(0.0, req["deadline"] - time.monotonic()),
+                                                 return_when=asyncio.FIRST_COMPLETED)
+                    if get not in done:
+                        get.cancel()
+                        if not done:
+                            raise DeadlineExceeded("deadline passed while generating")
+                        if submitted.exception() is not None:
+                            raise submitted.exception()
+                        continue
+                    piece = get.result()
+                    if piece is None or isinstance(piece, Exception):
+                        break
+                    generated += 1
+                    await send("token", piece)
+                if isinstance(piece, Exception):  # raised by the model thread, see _stream_batch
+                    await send("error", {"error": f"generation failed: {type(piece).__name__}: {piece}"})
+                else:
+                    await send("done", {"pieces": generated})
+            except (DeadlineExceeded, QueueFull) as e:
+                stop.set()
+                await send("error", {"error": str(e)})
+            except (ConnectionResetError, asyncio.CancelledError):
+                stop.set()  # client went away; free the model
+                raise
+            trace.count("streamed_pieces", generated)
+            if service.cascade.enabled:
+                service.cascade.record("large", time.perf_counter() - generate_start, reason=reason)
+        return response
+
+    async def provinces(request: web.Request) -> web.Response:
+        return web.json_response({"provinces": service.provinces})
+
+    async def health(request: web.Request) -> web.Response:
+        return web.json_response({
+            "ready": service.ready,
+            "llm": service.generator is not None,
+            "indexed": service.stores.stats(),
+            "queues": {b.name: {"depth": b.depth, **b.stats} for b in service.batchers},
+            "decisions": service.decider.stats,
+            "cascade": service.cascade.stats if service.cascade.enabled else None,
+        }, status=200 if service.ready else 503)
+
+    app = web.Application()
+    app.router.add_post("/retrieve", retrieve)
+    app.router.add_post("/answer", answer)
+    app.router.add_post("/answer/stream", answer_stream)
+    app.router.add_get("/provinces", provinces)
+    app.router.add_get("/health", health)
+    app.on_startup.append(service.start)
+    app.on_cleanup.append(service.stop)
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default=CONFIG['host'])
+    parser.add_argument("--port", type=int, default=CONFIG['port'])
+    parser.add_argument("--no-llm", action="store_true", help="retrieval only (/answer returns 501)")
+    parser.add_argument("--max-queue", type=int, default=CONFIG['max_queue'])
+    parser.add_argument("--generate-batch", type=int, default=CONFIG['generate_batch'])
+    args = parser.parse_args()
+
+    CONFIG['max_queue'] = args.max_queue
+    CONFIG['generate_batch'] = args.generate_batch
+    service = RagService(CONFIG, load_llm=not args.no_llm)
+    web.run_app(make_app(service), host=args.host, port=args.port)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,207 @@
+"""
+Small-to-big retrieval: match sentences, return the section they belong to.
+
+A 1000-character chunk is both what we match and what the LLM reads, so it
+is too big to match precisely and too small (and, with the 200-character
+overlap, partly duplicated) as context. Here the two are separated:
+
+    parents  one section each: a \\section{...} block of a tex guide (one
+             attraction or dish) or an H2/H3 section of a crawled *_tag.txt
+             page, as split by search-engine/tag_sections.py
+    units    the sentences of each parent, prefixed with the parent's title,
+             indexed by an ordinary HybridRetriever
+
+retrieve() ranks units, groups them by parent in rank order and returns each
+parent once. A parent longer than max_parent_chars is cut down to its matched
+sentences plus their neighbours, adjacent runs merged, so siblings from the
+same parent never reach the prompt twice.
+
+    retriever = SmallToBigRetriever(load_tex_sections([tex_for_province("HaNoi")]), embedder)
+    contexts = retriever.retrieve("Chợ Bến Thành mở cửa lúc mấy giờ?", topk=5)
+"""
+
+import os
+import re
+import sys
+from collections import OrderedDict
+from pathlib import Path
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from rag.corpus import CRAWL_DATA_DIR, SEARCH_ENGINE_DIR, TEX_DIR, Chunk, iter_crawled_pages
+from rag.retrieval import RERANKER_ID, HybridRetriever, whitespace_analyzer
+from rag.tracing import current_trace
+
+MIN_UNIT_CHARS = 40       # shorter sentences are joined to the previous one
+MAX_UNIT_CHARS = 400
+MAX_PARENT_CHARS = 2000   # longer parents are returned as matched windows
+UNITS_PER_PARENT = 4      # units ranked per requested parent
+NEIGHBOURS = 1            # sentences kept on each side of a match in a window
+
+SECTION_RE = re.compile(r"^\\section(\*?)\{+(.*?)\}+\s*$")
+ITEM_RE = re.compile(r"^\\item\s*\{?\\textbf\{(.*?)\}\}?\s*(.*)$")
+COMMAND_RE = re.compile(r"\\(?:textbf|textit|emph)\{([^{}]*)\}")
+SKIP_RE = re.compile(r"^\\(begin|end|newpage|documentclass|usepackage|title|fontsize|maketitle)")
+SENTENCE_RE = re.compile(r"(?<=[.!?])\s+|\n+")
+
+
+def _clean_tex(line: str) -> str:
+    line = COMMAND_RE.sub(r"\1", line)
+    return line.replace("\\item", "").replace("{", "").replace("}", "").strip()
+
+
+def parse_tex_sections(path) -> List[Chunk]:
+    """One parent per numbered \\section; starred sections are the groups they belong to."""
+    parents, group, title, body = [], None, None, []
+
+    def flush():
+        if title and body:
+            parents.append(Chunk(page_content="\n".join([title] + body),
+                                 metadata={"source": os.fspath(path), "group": group, "section": title}))
+
+    with open(path, "r", encoding="utf-8", errors="ignore") as f:
+        in_document = False
+        for line in f:
+            line = line.strip()
+            if not in_document:
+                in_document = line.startswith("\\begin{document}")
+                continue
+            section = SECTION_RE.match(line)
+            if section:
+                flush()
+                starred, name = section.groups()
+                if starred:
+                    group, title = name, name  # text directly under a group is a parent of its own
+                else:
+                    title = name
+                body = []
+                continue
+            item = ITEM_RE.match(line)
+            if item:
+                label, rest = item.group(1).strip().rstrip(":"), _clean_tex(item.group(2))
+                if rest:
+                    body.append(f"{label}: {rest}")
+            elif line and not SKIP_RE.match(line) and not line.startswith("%"):
+                text = _clean_tex(line)
+                if text:
+                    body.append(text)
+        flush()
+    return parents
+
+
+def parse_tag_sections(path, metadata: Optional[Dict] = None) -> List[Chunk]:
+    """One parent per H2/H3 section of a crawled *_tag.txt page."""
+    if str(SEARCH_ENGINE_DIR) not in sys.path:
+        sys.path.insert(0, str(SEARCH_ENGINE_DIR))
+    from tag_sections import read_tag_file, split_sections
+
+    metadata = metadata or {"source": os.fspath(path)}
+    return [
+        Chunk(page_content=f"{s.heading}\n{s.text}", metadata={**metadata, "section": s.heading})
+        for s in split_sections(read_tag_file(path)) if s.lines
+    ]
+
+
+def load_tex_sections(paths: Iterable) -> List[Chunk]:
+    return [parent for path in paths for parent in parse_tex_sections(path)]
+
+
+def load_crawled_sections(data_dir=CRAWL_DATA_DIR, metadata_path=None) -> List[Chunk]:
+    return [parent for meta in iter_crawled_pages(data_dir, metadata_path)
+            for parent in parse_tag_sections(meta["source"], meta)]
+
+
+def tex_for_province(stem: str, tex_dir=TEX_DIR) -> Optional[str]:
+    """tex guide for a PDF stem ("HaNoi" -> tex/thanh_pho_ha_noi.tex), if there is one."""
+    for path in sorted(Path(tex_dir).glob("*.tex")):
+        slug = path.stem
+        for prefix in ("thanh_pho_", "tinh_"):
+            if slug.startswith(prefix):
+                slug = slug[len(prefix):]
+        compact = "".join(part.title() for part in slug.split("_"))
+        if compact == stem or (stem.startswith(compact) and compact):  # "thua_thien" -> ThuaThienHue
+            return str(path)
+    return None
+
+
+def split_sentences(text: str) -> List[str]:
+    units = []
+    for piece in SENTENCE_RE.split(text):
+        piece = piece.strip()
+        if not piece:
+            continue
+        while len(piece) > MAX_UNIT_CHARS:
+            cut = piece.rfind(" ", 0, MAX_UNIT_CHARS)
+            cut = cut if cut > MIN_UNIT_CHARS else MAX_UNIT_CHARS
+            units.append(piece[:cut].strip())
+            piece = piece[cut:].strip()
+        if units and len(piece) < MIN_UNIT_CHARS and len(units[-1]) + len(piece) < MAX_UNIT_CHARS:
+            units[-1] = f"{units[-1]} {piece}"
+        elif piece:
+            units.append(piece)
+    return units
+
+
+class SmallToBigRetriever:
+    def __init__(self, parents: Sequence[Chunk], embedder, reranker_id: Optional[str] = RERANKER_ID,
+                 analyzer: Callable[[str], List[str]] = whitespace_analyzer,
+                 max_parent_chars: int = MAX_PARENT_CHARS,
+                 query_analyzer: Optional[Callable[[str], List[str]]] = None):
+        self.chunks = list(parents)  # what retrieve() returns, as in HybridRetriever
+        self.max_parent_chars = max_parent_chars
+        self.sentences: List[List[str]] = []
+        units = []
+        for p, parent in enumerate(self.chunks):
+            title, _, body = parent.page_content.partition("\n")
+            sentences = split_sentences(body)
+            self.sentences.append(sentences)
+            for position, sentence in enumerate(sentences):
+                units.append(Chunk(page_content=f"{title}: {sentence}",
+                                   metadata={"parent": p, "position": position}))
+        self.units = HybridRetriever(units, embedder, reranker_id, analyzer, query_analyzer=query_analyzer)
+
+    def __len__(self) -> int:
+        return len(self.units)
+
+    def rank_units(self, question: str, candidates: int, rerank: bool = True) -> List[int]:
+        indices = self.units.candidates(question, candidates)
+        if rerank and self.units.reranker_id:
+            return [i for i, _ in self.units.rerank(question, indices)]
+        return indices
+
+    def rank_parents(self, question: str, k: int, candidates: Optional[int] = None,
+                     rerank: bool = True) -> List[Tuple[int, List[int]]]:
+        """Parents in the rank order of their best unit, with their matched sentence positions."""
+        groups: "OrderedDict[int, List[int]]" = OrderedDict()
+        ranked = self.rank_units(question, candidates or k * UNITS_PER_PARENT, rerank)
+        for i in ranked:
+            meta = self.units.chunks[i].metadata
+            if meta["parent"] not in groups and len(groups) == k:
+                continue
+            groups.setdefault(meta["parent"], []).append(meta["position"])
+        trace = current_trace()
+        trace.count("matched_units", len(ranked))
+        trace.count("parents", len(groups))
+        return list(groups.items())
+
+    def context(self, parent: int, positions: Sequence[int]) -> Chunk:
+        chunk = self.chunks[parent]
+        metadata = {**chunk.metadata, "matched_sentences": sorted(positions)}
+        if len(chunk.page_content) <= self.max_parent_chars:
+            return Chunk(page_content=chunk.page_content, metadata=metadata)
+
+        sentences = self.sentences[parent]
+        keep = sorted({j for pos in positions
+                       for j in range(max(0, pos - NEIGHBOURS), min(len(sentences), pos + NEIGHBOURS + 1))})
+        runs, previous = [], None
+        for j in keep:
+            if previous is not None and j == previous + 1:
+                runs[-1].append(sentences[j])
+            else:
+                runs.append([sentences[j]])
+            previous = j
+        title = chunk.page_content.partition("\n")[0]
+        text = "\n…\n".join(" ".join(run) for run in runs)
+        return Chunk(page_content=f"{title}\n{text}", metadata=metadata)
+
+    def retrieve(self, question: str, topk: int = 5, rerank: bool = True) -> List[Chunk]:
+        return [self.context(p, positions) for p, positions in self.rank_parents(question, topk, rerank=rerank)]
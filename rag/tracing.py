@@ -0,0 +1,309 @@
+"""
+Per-stage latency tracing for rag_pipeline.
+
+    from rag.tracing import tracer, current_trace
+
+    with tracer.request(question=q) as trace:      # one record per request
+        with current_trace().stage("bm25"):         # anywhere below, no plumbing
+            ...
+        current_trace().count("context_chunks", 5)
+
+Each finished request is appended as one JSON line to the trace file, and
+stage timings, token counts and cache hits are aggregated for a
+Prometheus-style text endpoint (GET /metrics).
+
+Tracing is off unless RAG_TRACE names a JSONL file (or RAG_METRICS_PORT is
+set). When off, tracer.request() and trace.stage() return shared no-op
+objects, so the instrumented code costs a few attribute lookups.
+"""
+
+import contextvars
+import json
+import os
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Optional
+
+# seconds; covers BM25 on a small province (~1ms) up to CPU decoding (~minutes)
+BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+
+class _NullContext:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_CONTEXT = _NullContext()
+
+
+class NullTrace:
+    """Stand-in used when tracing is disabled; every method is a no-op."""
+
+    enabled = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def stage(self, name: str):
+        return _NULL_CONTEXT
+
+    def count(self, name: str, value: int = 1) -> None:
+        pass
+
+    def cache(self, name: str, hit: bool) -> None:
+        pass
+
+    def set(self, key: str, value) -> None:
+        pass
+
+    def generation_streamer(self):
+        return None
+
+
+NULL_TRACE = NullTrace()
+_current: contextvars.ContextVar = contextvars.ContextVar("rag_trace", default=NULL_TRACE)
+
+
+def current_trace():
+    """The trace of the request being served (NULL_TRACE outside a request)."""
+    return _current.get()
+
+
+class _Stage:
+    __slots__ = ("trace", "name", "start")
+
+    def __init__(self, trace: "Trace", name: str):
+        self.trace = trace
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.trace.add_stage(self.name, time.perf_counter() - self.start)
+        return False
+
+
+class Trace:
+    enabled = True
+
+    def __init__(self, tracer: "Tracer", attrs: Dict):
+        self.tracer = tracer
+        self.id = uuid.uuid4().hex[:16]
+        self.attrs = dict(attrs)
+        self.stages: Dict[str, float] = {}
+        self.counts: Dict[str, int] = {}
+        self.caches: Dict[str, Dict[str, int]] = {}
+        self.error: Optional[str] = None
+        self._token = None
+
+    def __enter__(self):
+        self.start_wall = time.time()
+        self.start = time.perf_counter()
+        self._token = _current.set(self)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.total = time.perf_counter() - self.start
+        _current.reset(self._token)
+        if exc_type is not None:
+            self.error = f"{exc_type.__name__}: {exc}"
+        self.tracer.finish(self)
+        return False
+
+    def stage(self, name: str) -> _Stage:
+        return _Stage(self, name)
+
+    def add_stage(self, name: str, seconds: float) -> None:
+        # a stage entered twice (e.g. per candidate) accumulates
+        self.stages[name] = self.stages.get(name, 0.0) + seconds
+
+    def count(self, name: str, value: int = 1) -> None:
+        self.counts[name] = self.counts.get(name, 0) + int(value)
+
+    def cache(self, name: str, hit: bool) -> None:
+        entry = self.caches.setdefault(name, {"hits": 0, "misses": 0})
+        entry["hits" if hit else "misses"] += 1
+
+    def set(self, key: str, value) -> None:
+        self.attrs[key] = value
+
+    def generation_streamer(self):
+        """A transformers streamer that splits model.generate into prefill and decode."""
+        from transformers.generation.streamers import BaseStreamer
+
+        trace = self
+
+        class _StageStreamer(BaseStreamer):
+            def __init__(self):
+                self.calls = 0
+                self.start = time.perf_counter()
+                self.first_token = None
+
+            def put(self, value):
+                self.calls += 1
+                if self.calls == 1:
+                    return  # generate() first pushes the prompt
+                if self.first_token is None:
+                    self.first_token = time.perf_counter()
+                    trace.add_stage("prefill", self.first_token - self.start)
+
+            def end(self):
+                if self.first_token is not None:
+                    trace.add_stage("decode", time.perf_counter() - self.first_token)
+
+        return _StageStreamer()
+
+    def to_dict(self) -> Dict:
+        return {
+            "id": self.id,
+            "ts": self.start_wall,
+            "total_s": round(self.total, 6),
+            "stages_s": {k: round(v, 6) for k, v in self.stages.items()},
+            "counts": self.counts,
+            "caches": self.caches,
+            "error": self.error,
+            **self.attrs,
+        }
+
+
+class Tracer:
+    def __init__(self, path: Optional[str] = None, metrics_port: Optional[int] = None,
+                 enabled: Optional[bool] = None):
+        self.path = path
+        # enabled=True without a path keeps traces in memory only (benchmarks read them back)
+        self.enabled = bool(path or metrics_port) if enabled is None else enabled
+        self.lock = threading.Lock()
+        self._file = None
+        self._server = None
+        self.requests = 0
+        self.errors = 0
+        self.histograms: Dict[str, list] = {}  # stage -> [bucket counts..., sum, count]
+        self.counters: Dict[str, int] = {}
+        self.cache_counters: Dict[tuple, int] = {}
+        if metrics_port:
+            self.serve_metrics(metrics_port)
+
+    @classmethod
+    def from_env(cls) -> "Tracer":
+        port = os.getenv("RAG_METRICS_PORT")
+        return cls(os.getenv("RAG_TRACE") or None, int(port) if port else None)
+
+    def request(self, **attrs):
+        if not self.enabled:
+            return NULL_TRACE
+        return Trace(self, attrs)
+
+    def event(self, name: str, seconds: float, **attrs) -> None:
+        """Record something that happens outside a request (index builds, warm-up)."""
+        if not self.enabled:
+            return
+        with self.lock:
+            self._observe(name, seconds)
+            self._write({"event": name, "ts": time.time(), "seconds": round(seconds, 6), **attrs})
+
+    def cache(self, name: str, hits: int = 0, misses: int = 0) -> None:
+        """Aggregate cache hits/misses observed outside a request."""
+        if not self.enabled:
+            return
+        with self.lock:
+            self.cache_counters[(name, "hits")] = self.cache_counters.get((name, "hits"), 0) + hits
+            self.cache_counters[(name, "misses")] = self.cache_counters.get((name, "misses"), 0) + misses
+
+    def _observe(self, stage: str, seconds: float) -> None:
+        hist = self.histograms.setdefault(stage, [0] * (len(BUCKETS) + 2))
+        for i, bound in enumerate(BUCKETS):
+            if seconds <= bound:
+                hist[i] += 1
+        hist[-2] += seconds
+        hist[-1] += 1
+
+    def _write(self, record: Dict) -> None:
+        if not self.path:
+            return
+        if self._file is None:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            self._file = open(self.path, "a", encoding="utf-8")
+        self._file.write(json.dumps(record, ensure_ascii=False, default=str) + "\n")
+        self._file.flush()
+
+    def finish(self, trace: Trace) -> None:
+        with self.lock:
+            self.requests += 1
+            if trace.error:
+                self.errors += 1
+            self._observe("total", trace.total)
+            for stage, seconds in trace.stages.items():
+                self._observe(stage, seconds)
+            for name, value in trace.counts.items():
+                self.counters[name] = self.counters.get(name, 0) + value
+            for name, entry in trace.caches.items():
+                for kind, value in entry.items():
+                    self.cache_counters[(name, kind)] = self.cache_counters.get((name, kind), 0) + value
+            self._write(trace.to_dict())
+
+    def prometheus_text(self) -> str:
+        lines = [
+            "# TYPE rag_requests_total counter",
+            f"rag_requests_total {self.requests}",
+            "# TYPE rag_request_errors_total counter",
+            f"rag_request_errors_total {self.errors}",
+            "# TYPE rag_stage_seconds histogram",
+        ]
+        with self.lock:
+            for stage, hist in sorted(self.histograms.items()):
+                for bound, value in zip(BUCKETS, hist):
+                    lines.append(f'rag_stage_seconds_bucket{{stage="{stage}",le="{bound}"}} {value}')
+                lines.append(f'rag_stage_seconds_bucket{{stage="{stage}",le="+Inf"}} {hist[-1]}')
+                lines.append(f'rag_stage_seconds_sum{{stage="{stage}"}} {hist[-2]:.6f}')
+                lines.append(f'rag_stage_seconds_count{{stage="{stage}"}} {hist[-1]}')
+            lines.append("# TYPE rag_count_total counter")
+            for name, value in sorted(self.counters.items()):
+                lines.append(f'rag_count_total{{name="{name}"}} {value}')
+            lines.append("# TYPE rag_cache_total counter")
+            for (name, kind), value in sorted(self.cache_counters.items()):
+                lines.append(f'rag_cache_total{{cache="{name}",result="{kind}"}} {value}')
+        return "\n".join(lines) + "\n"
+
+    def serve_metrics(self, port: int, host: str = "0.0.0.0") -> None:
+        """Serve /metrics from a daemon thread; safe to call more than once."""
+        if self._server is not None:
+            return
+        self.enabled = True
+        tracer = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?")[0] != "/metrics":
+                    self.send_error(404)
+                    return
+                body = tracer.prometheus_text().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        try:
+            self._server = ThreadingHTTPServer((host, port), Handler)
+        except OSError:
+            # another worker on this host already serves the port
+            return
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+
+
+tracer = Tracer.from_env()
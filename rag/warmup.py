@@ -0,0 +1,141 @@
+"""
+Background loading of heavy resources, with readiness reporting.
+
+The Streamlit apps used to load the LLM and build the index before the page
+rendered anything. Instead, they hand the loaders to a Warmup (cached once per
+process with st.cache_resource) and render immediately:
+
+    warmup = Warmup()
+    warmup.submit("llm", load_llm_and_tokenizer)
+    warmup.submit("embedder", EmbeddingService, "all-mpnet-base-v2")
+    ...
+    model, tokenizer, device = warmup.result("llm")   # blocks only when needed
+
+submit() is idempotent per name, so every Streamlit rerun can call it.
+Tasks run in daemon threads; their durations go to the tracer as
+"warmup_<name>" events.
+"""
+
+import threading
+import time
+from typing import Any, Callable, Dict, Optional
+
+from rag.tracing import tracer
+
+PENDING, LOADING, READY, FAILED = "pending", "loading", "ready", "failed"
+
+
+class _Task:
+    def __init__(self, name: str, fn: Callable, args: tuple, kwargs: dict):
+        self.name = name
+        self.fn = fn
+        self.args = args
+        self.kwargs = kwargs
+        self.state = PENDING
+        self.result: Any = None
+        self.error: Optional[BaseException] = None
+        self.started: Optional[float] = None
+        self.finished: Optional[float] = None
+        self.done = threading.Event()
+
+    def run(self) -> None:
+        self.state = LOADING
+        self.started = time.perf_counter()
+        try:
+            self.result = self.fn(*self.args, **self.kwargs)
+            self.state = READY
+        except BaseException as e:  # reported to the page, never lost in the thread
+            self.error = e
+            self.state = FAILED
+        finally:
+            self.finished = time.perf_counter()
+            tracer.event(f"warmup_{self.name}", self.finished - self.started, state=self.state)
+            self.done.set()
+
+    @property
+    def seconds(self) -> Optional[float]:
+        if self.started is None:
+            return None
+        return (self.finished or time.perf_counter()) - self.started
+
+
+class Warmup:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.tasks: Dict[str, _Task] = {}
+
+    def submit(self, name: str, fn: Callable, *args, after: Optional[str] = None, **kwargs) -> None:
+        """
+        Start loading `name` in the background unless it is already known.
+        With after=<other task>, wait for that task first (e.g. an index
+        needs the embedder).
+        """
+        with self.lock:
+            if name in self.tasks:
+                return
+            task = _Task(name, fn, args, kwargs)
+            self.tasks[name] = task
+
+        def target():
+            if after is not None:
+                try:
+                    self.result(after)
+                except BaseException as e:
+                    task.error, task.state = e, FAILED
+                    task.done.set()
+                    return
+            task.run()
+
+        threading.Thread(target=target, name=f"warmup-{name}", daemon=True).start()
+
+    def state(self, name: str) -> str:
+        task = self.tasks.get(name)
+        return task.state if task else PENDING
+
+    def ready(self, *names: str) -> bool:
+        return all(self.state(name) == READY for name in names)
+
+    def loading(self, *names: str) -> bool:
+        return any(self.state(name) in (PENDING, LOADING) for name in names)
+
+    def result(self, name: str, timeout: Optional[float] = None) -> Any:
+        """Wait for a task and return its value; re-raises the loader's exception."""
+        task = self.tasks[name]
+        if not task.done.wait(timeout):
+            raise TimeoutError(f"{name} is still loading")
+        if task.error is not None:
+            raise task.error
+        return task.result
+
+    def status(self) -> Dict[str, Dict]:
+        return {
+            name: {"state": task.state, "seconds": task.seconds,
+                   "error": f"{type(task.error).__name__}: {task.error}" if task.error else None}
+            for name, task in self.tasks.items()
+        }
+
+
+def render_status(st, warmup: Warmup, labels: Dict[str, str], refresh_seconds: float = 2.0) -> None:
+    """Sidebar readiness indicator; refreshes itself while something is loading."""
+    icons = {PENDING: "⏳", LOADING: "⏳", READY: "✅", FAILED: "❌"}
+
+    fragment = getattr(st, "fragment", None)
+    live = fragment is not None and warmup.loading(*labels)
+
+    def draw():
+        if live and not warmup.loading(*labels):
+            st.rerun()  # everything settled: redraw the page once and stop polling
+        st.markdown("**Trạng thái mô hình**")
+        status = warmup.status()
+        for name, label in labels.items():
+            info = status.get(name, {"state": PENDING, "seconds": None, "error": None})
+            seconds = f" ({info['seconds']:.1f}s)" if info["seconds"] is not None else ""
+            st.write(f"{icons[info['state']]} {label}{seconds}")
+            if info["error"]:
+                st.caption(info["error"])
+
+    with st.sidebar:
+        if live:
+            fragment(run_every=refresh_seconds)(draw)()
+        else:
+            draw()
@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+"""
+Benchmark the lxml main-content extractor against the old BeautifulSoup parser.
+
+Runs both parsers over saved pages (*.html, e.g. written by the crawler with
+CONFIG['save_html'] = True) and reports CPU time per page and output size.
+
+Usage:
+    python bench_extractor.py <html_dir> [--repeat N]
+
+Example:
+    python bench_extractor.py data --repeat 3
+"""
+
+import argparse
+import statistics
+import sys
+import time
+from pathlib import Path
+from typing import Callable, Dict, List, Tuple
+
+from bs4 import BeautifulSoup
+
+from extractor import extract
+
+
+def legacy_parse(html: str, url: str) -> Tuple[str, str]:
+    """The parser WebCrawler.parse_page used before extractor.py."""
+    soup = BeautifulSoup(html, "html.parser")
+    for unwanted in soup(["script", "style", "nav", "footer", "header"]):
+        unwanted.decompose()
+    elements = []
+    for tag in soup.find_all(["h1", "h2", "h3", "h4", "p", "li"]):
+        if tag.text.strip():
+            elements.append(f"[{tag.name.upper()}] {tag.get_text(strip=True)}")
+    return " ".join(soup.stripped_strings), "\n".join(elements)
+
+
+def lxml_parse(html: str, url: str) -> Tuple[str, str]:
+    result = extract(html, url)
+    return result.content, result.tag_content
+
+
+def run(parser: Callable[[str, str], Tuple[str, str]], pages: List[Tuple[str, str]], repeat: int) -> Dict[str, float]:
+    """Return per-page CPU time and output sizes for one parser."""
+    cpu_ms = []
+    content_chars = 0
+    tag_lines = 0
+    for url, html in pages:
+        best = float("inf")
+        for _ in range(repeat):
+            start = time.process_time()
+            content, tag_content = parser(html, url)
+            best = min(best, time.process_time() - start)
+        cpu_ms.append(best * 1000)
+        content_chars += len(content)
+        tag_lines += tag_content.count("\n") + 1 if tag_content else 0
+    return {
+        "cpu_ms_mean": statistics.mean(cpu_ms),
+        "cpu_ms_p95": sorted(cpu_ms)[int(0.95 * (len(cpu_ms) - 1))],
+        "cpu_s_total": sum(cpu_ms) / 1000,
+        "content_chars_mean": content_chars / len(pages),
+        "tag_lines_mean": tag_lines / len(pages),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("html_dir", type=Path)
+    parser.add_argument("--repeat", type=int, default=3, help="runs per page, best one is kept")
+    args = parser.parse_args()
+
+    files = sorted(args.html_dir.glob("**/*.html"))
+    if not files:
+        print(f"No .html files under {args.html_dir}")
+        sys.exit(1)
+    pages = [(str(f), f.read_text(encoding="utf-8", errors="ignore")) for f in files]
+    print(f"Benchmarking {len(pages)} pages ({sum(len(h) for _, h in pages) / 1e6:.1f} MB of HTML)\n")
+
+    results = {
+        "bs4/html.parser": run(legacy_parse, pages, args.repeat),
+        "lxml/readability": run(lxml_parse, pages, args.repeat),
+    }
+    print(f"{'parser':<18} {'cpu ms/page':>12} {'p95 ms':>8} {'total s':>8} {'chars/page':>11} {'lines/page':>11}")
+    for name, r in results.items():
+        print(f"{name:<18} {r['cpu_ms_mean']:>12.2f} {r['cpu_ms_p95']:>8.2f} {r['cpu_s_total']:>8.2f} "
+              f"{r['content_chars_mean']:>11.0f} {r['tag_lines_mean']:>11.1f}")
+
+    old, new = results["bs4/html.parser"], results["lxml/readability"]
+    print(f"\nCPU speed-up: {old['cpu_ms_mean'] / max(new['cpu_ms_mean'], 1e-9):.1f}x, "
+          f"content size: {100 * new['content_chars_mean'] / max(old['content_chars_mean'], 1):.0f}% of before")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,374 @@
+#!/usr/bin/env python3
+"""
+Corpus catalog: one SQLite row per document.
+
+data/metadata.json nests provinces -> content -> items and is rewritten
+whole at the end of a crawl, so every consumer loads and walks all of it,
+and the raw page dumps in travel/{odd,even} are described only by their
+filenames. The catalog (data/catalog.sqlite) holds both:
+
+    path           text file, relative to the repo root (unique)
+    tag_path       *_tag.txt next to it (crawled pages only)
+    source         "crawl" (metadata.json) or "travel" (travel/{odd,even})
+    province_id    as in provinces.province_dict
+    category       travel | food
+    idx            item idx (crawl) or travel_df row (travel filenames)
+    url, title
+    content_hash   sha1 of the normalized body (NFC, lowercase, single spaces)
+    fetched_at     crawl time when the crawler recorded it, else file mtime
+    language       vi | en | und (text_norm.detect_language)
+    length         characters of the body
+    dedup_cluster  id of the first document of its near-duplicate cluster
+
+indexed on province_id, category, content_hash and url. Near-duplicates are
+64-bit simhashes of word 3-shingles within --max-distance bits, found
+through 4 x 16-bit bands, so clustering never compares all pairs.
+
+Imports are incremental: a file whose mtime and size are unchanged is not
+re-read, rows whose file disappeared are dropped, and the crawler adds each
+page as it saves it (Catalog.add). Filtering is a query:
+
+    with Catalog() as catalog:
+        rows = catalog.documents(province_id=1, category="food", unique=True)
+
+Usage:
+    python catalog.py build [--metadata data/metadata.json] [--travel-dir ../travel] [--catalog data/catalog.sqlite]
+    python catalog.py stats
+    python catalog.py query [--province 1] [--category food] [--language vi] [--unique]
+"""
+
+import argparse
+import hashlib
+import json
+import logging
+import os
+import re
+import sqlite3
+import sys
+import time
+import unicodedata
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional
+
+from text_norm import detect_language
+
+logger = logging.getLogger(__name__)
+
+SEARCH_ENGINE_DIR = Path(__file__).resolve().parent
+ROOT = SEARCH_ENGINE_DIR.parent
+CATALOG_PATH = SEARCH_ENGINE_DIR / "data" / "catalog.sqlite"
+METADATA_PATH = SEARCH_ENGINE_DIR / "data" / "metadata.json"
+TRAVEL_DIR = ROOT / "travel"
+
+# <province id>_<province slug>_<travel_df row>.txt, see crawl_content.ipynb
+TRAVEL_FILE_RE = re.compile(r"^(\d+)_(.+)_(\d+)\.txt$")
+SHINGLE_RE = re.compile(r"\w+", re.UNICODE)
+BIT_TABLES = [bytes(byte >> bit & 1 for byte in range(256)) for bit in range(8)]
+
+CONFIG = {
+    'max_distance': 3,   # simhash bits two near-duplicates may differ in
+    'bands': 4,          # 64 bits = 4 bands of 16; near-duplicates share at least one
+    'shingle': 3,        # words per shingle
+}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS documents (
+    id INTEGER PRIMARY KEY,
+    path TEXT NOT NULL UNIQUE,
+    tag_path TEXT,
+    source TEXT NOT NULL,
+    province_id INTEGER,
+    category TEXT,
+    idx INTEGER,
+    url TEXT,
+    title TEXT,
+    content_hash TEXT,
+    simhash INTEGER,
+    fetched_at REAL,
+    language TEXT,
+    length INTEGER,
+    dedup_cluster INTEGER,
+    mtime_ns INTEGER,
+    size INTEGER
+);
+CREATE INDEX IF NOT EXISTS documents_province ON documents (province_id, category);
+CREATE INDEX IF NOT EXISTS documents_category ON documents (category);
+CREATE INDEX IF NOT EXISTS documents_hash ON documents (content_hash);
+CREATE INDEX IF NOT EXISTS documents_url ON documents (url);
+"""
+COLUMNS = ("path", "tag_path", "source", "province_id", "category", "idx", "url", "title",
+           "content_hash", "simhash", "fetched_at", "language", "length", "mtime_ns", "size")
+
+
+def relative(path) -> str:
+    """Repo-relative POSIX path; paths outside the repo stay absolute."""
+    path = Path(path).resolve()
+    try:
+        return path.relative_to(ROOT).as_posix()
+    except ValueError:
+        return path.as_posix()
+
+
+def read_body(path: Path) -> str:
+    """Page text without the crawler's Title/URL header (travel dumps have none)."""
+    text = path.read_text(encoding="utf-8", errors="ignore")
+    head, marker, body = text.partition("\nContent:\n")
+    return body if marker and head.startswith("Title:") else text
+
+
+def normalize(text: str) -> str:
+    return " ".join(unicodedata.normalize("NFC", text).lower().split())
+
+
+def simhash(text: str, width: int = CONFIG['shingle']) -> int:
+    words = SHINGLE_RE.findall(text)
+    shingles = {" ".join(words[i:i + width]) for i in range(max(len(words) - width + 1, 1))}
+    digests = b"".join(hashlib.blake2b(s.encode("utf-8"), digest_size=8).digest() for s in shingles)
+    value = 0
+    # count each bit over all shingles at once: one byte column, mapped to 0/1 by translate()
+    for pos in range(8):
+        column = digests[pos::8]
+        for bit in range(8):
+            if 2 * column.translate(BIT_TABLES[bit]).count(1) > len(shingles):
+                value |= 1 << ((7 - pos) * 8 + bit)
+    return value - (1 << 64) if value >= 1 << 63 else value  # SQLite integers are signed
+
+
+def describe(path: Path) -> Dict:
+    """The columns that need the file's content."""
+    text = normalize(read_body(path))
+    return {
+        "content_hash": hashlib.sha1(text.encode("utf-8")).hexdigest(),
+        "simhash": simhash(text),
+        "language": detect_language(text[:5000]),
+        "length": len(text),
+    }
+
+
+class Catalog:
+    def __init__(self, path=CATALOG_PATH):
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self.path = path
+        self.conn = sqlite3.connect(str(path))
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.executescript(SCHEMA)
+        self.conn.commit()
+
+    def __enter__(self) -> "Catalog":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def close(self) -> None:
+        self.conn.close()
+
+    def upsert(self, row: Dict) -> str:
+        """Insert or update one document; returns "added", "updated", "touched" or "missing"."""
+        file_path = ROOT / row["path"]
+        try:
+            stat = file_path.stat()
+        except OSError:
+            return "missing"
+        existing = self.conn.execute(
+            "SELECT mtime_ns, size FROM documents WHERE path = ?", (row["path"],)
+        ).fetchone()
+        row = {**row, "mtime_ns": stat.st_mtime_ns, "size": stat.st_size}
+        row.setdefault("fetched_at", None)
+        if existing and existing["mtime_ns"] == stat.st_mtime_ns and existing["size"] == stat.st_size:
+            # same file: refresh what metadata.json says about it, keep the content columns
+            self.conn.execute(
+                "UPDATE documents SET tag_path = ?, source = ?, province_id = ?, category = ?, idx = ?, url = ?,"
+                " title = ?, fetched_at = COALESCE(?, fetched_at) WHERE path = ?",
+                (row.get("tag_path"), row["source"], row.get("province_id"), row.get("category"), row.get("idx"),
+                 row.get("url"), row.get("title"), row["fetched_at"], row["path"]),
+            )
+            return "touched"
+        row.update(describe(file_path))
+        if row["fetched_at"] is None:
+            row["fetched_at"] = stat.st_mtime
+        values = [row.get(c) for c in COLUMNS]
+        self.conn.execute(
+            f"INSERT INTO documents ({', '.join(COLUMNS)}) VALUES ({', '.join('?' * len(COLUMNS))})"
+            f" ON CONFLICT (path) DO UPDATE SET {', '.join(f'{c} = excluded.{c}' for c in COLUMNS[1:])}",
+            values,
+        )
+        return "updated" if existing else "added"
+
+    def add(self, province_id: int, category: str, idx: int, url: str, title: str, paths: Dict[str, str],
+            fetched_at: Optional[float] = None, base=None) -> str:
+        """One page just saved by the crawler; `paths` as returned by WebCrawler.save_result."""
+        base = Path(base or os.getcwd())
+        status = self.upsert({
+            "path": relative(base / paths["txt_path"]),
+            "tag_path": relative(base / paths["tag_txt_path"]),
+            "source": "crawl", "province_id": province_id, "category": category, "idx": idx,
+            "url": url, "title": title, "fetched_at": fetched_at,
+        })
+        self.conn.commit()
+        return status
+
+    def sync(self, source: str, rows: Iterable[Dict]) -> Dict[str, int]:
+        """Upsert `rows` and drop the documents of `source` that are no longer listed."""
+        counts = {"added": 0, "updated": 0, "touched": 0, "missing": 0, "removed": 0}
+        seen = set()
+        for row in rows:
+            status = self.upsert({**row, "source": source})
+            counts[status] += 1
+            if status != "missing":
+                seen.add(row["path"])
+        stale = [r["path"] for r in self.conn.execute("SELECT path FROM documents WHERE source = ?", (source,))
+                 if r["path"] not in seen]
+        self.conn.executemany("DELETE FROM documents WHERE path = ?", [(p,) for p in stale])
+        counts["removed"] = len(stale)
+        self.conn.commit()
+        return counts
+
+    def recluster(self, max_distance: int = CONFIG['max_distance']) -> int:
+        """Assign dedup_cluster from content hashes and simhash bands; returns the cluster count."""
+        rows = self.conn.execute("SELECT id, content_hash, simhash FROM documents ORDER BY id").fetchall()
+        parent = {r["id"]: r["id"] for r in rows}
+
+        def find(i):
+            while parent[i] != i:
+                parent[i] = parent[parent[i]]
+                i = parent[i]
+            return i
+
+        def union(a, b):
+            a, b = find(a), find(b)
+            if a != b:
+                parent[max(a, b)] = min(a, b)
+
+        by_hash: Dict[str, int] = {}
+        buckets: Dict[tuple, List[int]] = {}
+        signatures = {}
+        band_bits = 64 // CONFIG['bands']
+        for r in rows:
+            union(r["id"], by_hash.setdefault(r["content_hash"], r["id"]))
+            signatures[r["id"]] = r["simhash"] & ((1 << 64) - 1)
+            for band in range(CONFIG['bands']):
+                key = (band, signatures[r["id"]] >> (band * band_bits) & ((1 << band_bits) - 1))
+                for other in buckets.setdefault(key, []):
+                    if bin(signatures[r["id"]] ^ signatures[other]).count("1") <= max_distance:
+                        union(r["id"], other)
+                buckets[key].append(r["id"])
+        self.conn.executemany("UPDATE documents SET dedup_cluster = ? WHERE id = ?",
+                              [(find(i), i) for i in parent])
+        self.conn.commit()
+        return len({find(i) for i in parent})
+
+    def documents(self, province_id: Optional[int] = None, category: Optional[str] = None,
+                  source: Optional[str] = None, language: Optional[str] = None,
+                  unique: bool = False) -> List[Dict]:
+        """Rows matching every given filter; unique keeps one document per dedup cluster."""
+        clauses, params = [], []
+        for column, value in (("province_id", province_id), ("category", category),
+                              ("source", source), ("language", language)):
+            if value is not None:
+                clauses.append(f"{column} = ?")
+                params.append(value)
+        where = f" WHERE {' AND '.join(clauses)}" if clauses else ""
+        if unique:
+            # the representative is the lowest id among the matching rows of each cluster,
+            # so a cluster whose overall lowest id lies outside the filters still shows up
+            sql = (f"SELECT * FROM documents WHERE id IN (SELECT MIN(id) FROM documents{where} "
+                   f"GROUP BY COALESCE(dedup_cluster, -id)) ORDER BY id")
+        else:
+            sql = f"SELECT * FROM documents{where} ORDER BY id"
+        return [dict(r) for r in self.conn.execute(sql, params)]
+
+    def stats(self) -> Dict:
+        def grouped(column):
+            return {r[0]: r[1] for r in self.conn.execute(
+                f"SELECT {column}, COUNT(*) FROM documents GROUP BY {column} ORDER BY {column}")}
+
+        total, clusters = self.conn.execute(
+            "SELECT COUNT(*), COUNT(DISTINCT dedup_cluster) FROM documents").fetchone()
+        return {"documents": total, "clusters": clusters, "by_source": grouped("source"),
+                "by_category": grouped("category"), "by_language": grouped("language"),
+                "provinces": self.conn.execute("SELECT COUNT(DISTINCT province_id) FROM documents").fetchone()[0]}
+
+
+def metadata_rows(metadata_path=METADATA_PATH) -> Iterable[Dict]:
+    """One row per item of metadata.json (paths in it are relative to search-engine/)."""
+    with open(metadata_path, "r", encoding="utf-8") as f:
+        metadata = json.load(f)
+    base = Path(metadata_path).resolve().parent.parent
+    for province in metadata["provinces"]:
+        for category in province["content"]:
+            for item in category["items"]:
+                yield {
+                    "path": relative(base / item["txt_path"]),
+                    "tag_path": relative(base / item["tag_txt_path"]),
+                    "province_id": province["id"],
+                    "category": category["category"],
+                    "idx": item["idx"],
+                    "url": item["url"],
+                    "title": item["title"],
+                }
+
+
+def travel_rows(travel_dir=TRAVEL_DIR) -> Iterable[Dict]:
+    """travel/{odd,even}/<province id>_<slug>_<row>.txt; the first line is the page title."""
+    for path in sorted(Path(travel_dir).glob("*/*.txt")):
+        match = TRAVEL_FILE_RE.match(path.name)
+        if not match:
+            continue
+        with open(path, "r", encoding="utf-8", errors="ignore") as f:
+            title = f.readline().strip()
+        yield {
+            "path": relative(path),
+            "province_id": int(match.group(1)),
+            "category": "travel",
+            "idx": int(match.group(3)),
+            "title": title,
+        }
+
+
+def build(catalog: Catalog, metadata_path=METADATA_PATH, travel_dir=TRAVEL_DIR) -> Dict:
+    report = {}
+    if Path(metadata_path).exists():
+        report["crawl"] = catalog.sync("crawl", metadata_rows(metadata_path))
+    if Path(travel_dir).is_dir():
+        report["travel"] = catalog.sync("travel", travel_rows(travel_dir))
+    report["clusters"] = catalog.recluster()
+    return report
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("command", choices=["build", "stats", "query"])
+    parser.add_argument("--catalog", default=str(CATALOG_PATH))
+    parser.add_argument("--metadata", default=str(METADATA_PATH))
+    parser.add_argument("--travel-dir", default=str(TRAVEL_DIR))
+    parser.add_argument("--province", type=int, default=None)
+    parser.add_argument("--category", default=None)
+    parser.add_argument("--source", default=None, choices=["crawl", "travel"])
+    parser.add_argument("--language", default=None)
+    parser.add_argument("--unique", action="store_true", help="one document per dedup cluster")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    if args.command != "build" and not Path(args.catalog).exists():
+        print(f"No catalog at {args.catalog}; run `python catalog.py build` first")
+        sys.exit(1)
+
+    with Catalog(args.catalog) as catalog:
+        if args.command == "build":
+            started = time.perf_counter()
+            report = build(catalog, args.metadata, args.travel_dir)
+            logger.info(f"Catalog built in {time.perf_counter() - started:.1f}s: {report}")
+            print(json.dumps(catalog.stats(), ensure_ascii=False, indent=2))
+        elif args.command == "stats":
+            print(json.dumps(catalog.stats(), ensure_ascii=False, indent=2))
+        else:
+            for row in catalog.documents(args.province, args.category, args.source, args.language, args.unique):
+                print(f"{row['id']:>6}  {row['province_id']:>3}  {row['category']:<7}{row['language']:<4}"
+                      f"{row['length']:>8}  {row['dedup_cluster']:>6}  {row['url'] or row['path']}")
+
+
+if __name__ == "__main__":
+    main()
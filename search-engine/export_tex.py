@@ -0,0 +1,297 @@
+#!/usr/bin/env python3
+"""
+Export the crawled corpus to one LaTeX guide (and PDF) per province.
+
+For every province in provinces.province_dict, the travel and food pages
+under <data_dir>/<id>/{travel,food}/*_tag.txt are split into heading
+sections (tag_sections.py) and rendered into tex/<slug>.tex with the same
+layout crawl_content.ipynb's generate_latex_file produced. Crawled text is
+LaTeX-escaped, so %, &, _, #, $ and friends no longer break the build.
+
+Provinces are rendered and compiled concurrently in a process pool. A
+manifest keeps the hash of each province's sources; provinces whose sources
+(and template) have not changed since the last successful build are skipped.
+
+Hand-edited .tex files (ones with real \\section{} content that this script
+did not generate, e.g. thanh_pho_ho_chi_minh.tex) are left alone unless
+--force is given.
+
+Usage:
+    python export_tex.py [--data-dir data] [--tex-dir ../tex] [--workers N] [--no-pdf] [--force]
+
+Example:
+    python export_tex.py --data-dir data_norm --province "TỈNH HÀ GIANG"
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import re
+import shutil
+import subprocess
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from provinces import category_dict, fold, province_dict, province_slug, province_title
+from tag_sections import Section, iter_sections
+
+TEMPLATE_VERSION = 1
+GENERATED_MARKER = "% Generated by search-engine/export_tex.py -- edits will be overwritten"
+MANIFEST_NAME = ".export_manifest.json"
+
+CONFIG = {
+    'engine': "pdflatex",
+    'compile_timeout': 180,       # seconds per province
+    'min_section_chars': 40,
+    'max_sections': 40,           # per category
+    'aux_suffixes': (".aux", ".log", ".out", ".toc"),
+}
+# Headings that are site chrome rather than an attraction or a dish.
+SKIP_HEADING_RE = re.compile(
+    r"ý kiến|bình luận|comment|tải ứng dụng|click|đăng ký|newsletter|liên hệ|"
+    r"cùng chuyên mục|tin liên quan|bài viết liên quan|related|gợi ý|có gì hot|deal",
+    re.IGNORECASE,
+)
+
+LATEX_SPECIALS = {
+    "\\": r"\textbackslash{}",
+    "&": r"\&",
+    "%": r"\%",
+    "$": r"\$",
+    "#": r"\#",
+    "_": r"\_",
+    "{": r"\{",
+    "}": r"\}",
+    "~": r"\textasciitilde{}",
+    "^": r"\textasciicircum{}",
+    "<": r"\textless{}",
+    ">": r"\textgreater{}",
+    "|": r"\textbar{}",
+}
+LATEX_SPECIALS_RE = re.compile("|".join(re.escape(c) for c in LATEX_SPECIALS))
+# characters pdflatex + T5 cannot typeset (emoji, box drawing, control chars)
+UNTYPESETTABLE_RE = re.compile("[\x00-\x08\x0b-\x1f\x7f\u2500-\u27bf\U0001F000-\U0001FAFF\ufe0f]")
+
+
+def escape_latex(text: str) -> str:
+    text = UNTYPESETTABLE_RE.sub("", text)
+    return LATEX_SPECIALS_RE.sub(lambda m: LATEX_SPECIALS[m.group(0)], text)
+
+
+def escape_url(url: str) -> str:
+    """\\url{} takes most characters verbatim, but not unbalanced braces, % or #."""
+    return url.replace("\\", "/").replace("%", r"\%").replace("#", r"\#").replace("{", "%7B").replace("}", "%7D")
+
+
+def collect_sections(paths: List[Path]) -> List[Section]:
+    seen = set()
+    sections = []
+    for section in iter_sections(paths, min_chars=CONFIG['min_section_chars']):
+        key = fold(section.heading).lower()
+        if key in seen or SKIP_HEADING_RE.search(section.heading):
+            continue
+        seen.add(key)
+        sections.append(section)
+        if len(sections) >= CONFIG['max_sections']:
+            break
+    return sections
+
+
+def render_sections(sections: List[Section]) -> str:
+    parts = []
+    for section in sections:
+        body = "\n\n".join(escape_latex(line) for line in section.lines)
+        source = f"\n\n\\textit{{Nguồn:}} \\url{{{escape_url(section.url)}}}" if section.url else ""
+        parts.append(f"\\section{{{escape_latex(section.heading)}}}\n{body}{source}\n\n")
+    return "".join(parts)
+
+
+def render_document(title: str, abstract: str, place_sections: List[Section], food_sections: List[Section]) -> str:
+    title = escape_latex(title)
+    return (
+        f"{GENERATED_MARKER}\n"
+        "\\documentclass{article}\n"
+        "\\usepackage[vietnamese]{babel}\n"
+        "\\usepackage[letterpaper,top=1cm,bottom=1cm,left=1.5cm,right=1.5cm,marginparwidth=1.75cm]{geometry}\n"
+        "\\usepackage{amsmath}\n"
+        "\\usepackage{graphicx}\n"
+        "\\usepackage[colorlinks=true, allcolors=blue]{hyperref}\n"
+        f"\\title{{{title}}}\n"
+        "\n"
+        "\\begin{document}\n"
+        "\\begin{center}\n"
+        f"    \\fontsize{{18}}{{20}}\\textbf{{{title}}}\n"
+        "\\end{center}\n"
+        "\\begin{abstract}\n"
+        f"    {escape_latex(abstract)}\n"
+        "\\end{abstract}\n"
+        "\\section*{Điểm du lịch}\n"
+        f"{render_sections(place_sections)}"
+        "\\newpage\n"
+        "\\section*{Ẩm thực}\n"
+        "\\setcounter{section}{0}\n"
+        f"{render_sections(food_sections)}"
+        "\n\\end{document}\n"
+    )
+
+
+def source_files(data_dir: Path, province_id: int) -> Dict[str, List[Path]]:
+    return {
+        category: sorted((data_dir / str(province_id) / category).glob("*_tag.txt"))
+        for category in category_dict
+    }
+
+
+def source_hash(files: Dict[str, List[Path]]) -> str:
+    h = hashlib.sha256(f"template-v{TEMPLATE_VERSION}".encode())
+    for category in sorted(files):
+        for path in files[category]:
+            h.update(f"\x00{category}/{path.name}\x00".encode("utf-8"))
+            h.update(path.read_bytes())
+    return h.hexdigest()
+
+
+def is_hand_edited(tex_path: Path) -> bool:
+    if not tex_path.exists():
+        return False
+    text = tex_path.read_text(encoding="utf-8", errors="ignore")
+    return not text.startswith(GENERATED_MARKER) and "\\section{" in text
+
+
+def compile_pdf(tex_path: Path, engine_name: str) -> Tuple[bool, str]:
+    engine = shutil.which(engine_name)
+    if engine is None:
+        return False, f"{engine_name} not found on PATH"
+    try:
+        proc = subprocess.run(
+            [engine, "-interaction=nonstopmode", "-halt-on-error", tex_path.name],
+            cwd=tex_path.parent, capture_output=True, text=True, errors="ignore",
+            timeout=CONFIG['compile_timeout'],
+        )
+    except subprocess.TimeoutExpired:
+        return False, f"timed out after {CONFIG['compile_timeout']}s"
+    finally:
+        for suffix in CONFIG['aux_suffixes']:
+            aux = tex_path.with_suffix(suffix)
+            if aux.exists() and (suffix != ".log" or tex_path.with_suffix(".pdf").exists()):
+                aux.unlink()
+    if proc.returncode != 0:
+        errors = [line for line in proc.stdout.splitlines() if line.startswith("!")]
+        return False, (errors[0] if errors else proc.stdout[-300:]).strip()
+    return True, ""
+
+
+def export_province(task: Tuple[str, int, str, str, Optional[str]]) -> Dict:
+    """Worker: render one province and compile it (engine None = tex only). Runs in a child process."""
+    name, province_id, data_dir, tex_dir, engine = task
+    build_pdf = engine is not None
+    started = time.perf_counter()
+    files = source_files(Path(data_dir), province_id)
+    tex_path = Path(tex_dir) / f"{province_slug(name)}.tex"
+
+    document = render_document(
+        title=f"Cẩm nang du lịch {province_title(name)}",
+        abstract="(Giới thiệu)",
+        place_sections=collect_sections(files.get("travel", [])),
+        food_sections=collect_sections(files.get("food", [])),
+    )
+    tmp = tex_path.with_suffix(".tex.tmp")
+    tmp.write_text(document, encoding="utf-8")
+    os.replace(tmp, tex_path)
+
+    ok, error = compile_pdf(tex_path, engine) if build_pdf else (True, "")
+    return {"name": name, "tex": str(tex_path), "ok": ok, "error": error, "pdf": build_pdf and ok,
+            "seconds": time.perf_counter() - started}
+
+
+def load_manifest(tex_dir: Path) -> Dict[str, Dict]:
+    try:
+        return json.loads((tex_dir / MANIFEST_NAME).read_text(encoding="utf-8"))
+    except (OSError, json.JSONDecodeError):
+        return {}
+
+
+def save_manifest(tex_dir: Path, manifest: Dict[str, Dict]) -> None:
+    path = tex_dir / MANIFEST_NAME
+    tmp = path.with_suffix(".tmp")
+    tmp.write_text(json.dumps(manifest, ensure_ascii=False, indent=1, sort_keys=True), encoding="utf-8")
+    os.replace(tmp, path)
+
+
+def run(data_dir: Path, tex_dir: Path, provinces: List[str], build_pdf: bool, force: bool,
+        workers: Optional[int]) -> Dict[str, int]:
+    tex_dir.mkdir(parents=True, exist_ok=True)
+    manifest = load_manifest(tex_dir)
+    tasks, hashes = [], {}
+    stats = {"built": 0, "skipped": 0, "protected": 0, "failed": 0}
+    for name in provinces:
+        slug = province_slug(name)
+        tex_path = tex_dir / f"{slug}.tex"
+        if not force and is_hand_edited(tex_path):
+            print(f"Keeping hand-edited {tex_path.name} (use --force to overwrite)")
+            stats["protected"] += 1
+            continue
+        digest = source_hash(source_files(data_dir, province_dict[name]))
+        entry = manifest.get(slug, {})
+        up_to_date = (
+            entry.get("source_hash") == digest and tex_path.exists()
+            and (not build_pdf or (entry.get("pdf") and tex_path.with_suffix(".pdf").exists()))
+        )
+        if up_to_date and not force:
+            stats["skipped"] += 1
+            continue
+        hashes[slug] = digest
+        tasks.append((name, province_dict[name], str(data_dir), str(tex_dir),
+                      CONFIG['engine'] if build_pdf else None))
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(export_province, task) for task in tasks]
+        for future in as_completed(futures):
+            result = future.result()
+            slug = province_slug(result["name"])
+            if result["ok"]:
+                stats["built"] += 1
+                manifest[slug] = {"source_hash": hashes[slug], "pdf": result["pdf"], "built": time.time()}
+                print(f"Built {Path(result['tex']).name} in {result['seconds']:.1f}s")
+            else:
+                stats["failed"] += 1
+                # keep the tex, but forget the hash so the next run retries the compile
+                manifest.pop(slug, None)
+                print(f"FAILED {Path(result['tex']).name}: {result['error']}")
+            save_manifest(tex_dir, manifest)
+    return stats
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--data-dir", type=Path, default=Path("data"))
+    parser.add_argument("--tex-dir", type=Path, default=Path("../tex"))
+    parser.add_argument("--province", action="append", help="only these provinces (repeatable)")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--engine", default=CONFIG['engine'])
+    parser.add_argument("--no-pdf", action="store_true", help="render .tex only")
+    parser.add_argument("--force", action="store_true", help="rebuild everything, overwrite hand-edited files")
+    args = parser.parse_args()
+
+    CONFIG['engine'] = args.engine
+    provinces = args.province or list(province_dict)
+    unknown = [p for p in provinces if p not in province_dict]
+    if unknown:
+        print(f"Error: unknown province(s): {', '.join(unknown)}")
+        sys.exit(1)
+
+    started = time.perf_counter()
+    stats = run(args.data_dir, args.tex_dir, provinces, not args.no_pdf, args.force, args.workers)
+    print(
+        f"\nBuilt {stats['built']}, skipped {stats['skipped']} unchanged, kept {stats['protected']} "
+        f"hand-edited, {stats['failed']} failed in {time.perf_counter() - started:.1f}s"
+    )
+    sys.exit(1 if stats["failed"] else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,205 @@
+"""
+Main-content extraction for crawled pages.
+
+Parses the HTML once with lxml, walks the tree a single time to collect
+text blocks and score their containers (readability style), then keeps only
+the blocks that live under the best scoring container(s). Navigation,
+sidebars, comment sections and ads are dropped before they are ever scored.
+
+Returns the same two views the crawler already saves:
+    content     -- plain text, blocks joined with spaces
+    tag_content -- "[TAG] text" lines (H1-H4, P, LI)
+"""
+
+import re
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+
+import lxml.html
+from lxml import etree
+
+# Elements that never carry main content; removed with their subtree.
+DROP_TAGS = {
+    "script", "style", "noscript", "template", "iframe", "svg", "canvas",
+    "nav", "footer", "header", "aside", "form", "button", "select", "input",
+}
+# Elements whose text we emit (same set the crawler used before).
+BLOCK_TAGS = {"h1", "h2", "h3", "h4", "p", "li"}
+HEADING_TAGS = {"h1", "h2", "h3", "h4"}
+
+# class/id hints, compiled once
+NEGATIVE_RE = re.compile(
+    r"comment|sidebar|widget|footer|header|menu|nav|breadcrumb|share|social|"
+    r"related|recommend|advert|\bads?\b|banner|sponsor|promo|popup|modal|cookie|"
+    r"subscribe|newsletter|login|signup|author-box|tags?\b|pagination|hotline",
+    re.IGNORECASE,
+)
+POSITIVE_RE = re.compile(
+    r"article|content|entry|main|post|story|body|text|detail|blog|news",
+    re.IGNORECASE,
+)
+# Hard drop: containers that are almost certainly not content even if scored.
+UNLIKELY_RE = re.compile(
+    r"comment|sidebar|advert|\bads?\b|banner|sponsor|popup|cookie|social|share",
+    re.IGNORECASE,
+)
+WHITESPACE_RE = re.compile(r"\s+")
+# Vietnamese and English text both separate clauses with commas.
+COMMA_RE = re.compile(r"[,،、，]")
+
+CONFIG = {
+    "min_block_chars": 25,       # blocks shorter than this don't vote for a container
+    "sibling_ratio": 0.2,        # siblings scoring >= ratio * best are kept too
+    "max_link_density": 0.5,     # link-heavy blocks are treated as navigation
+    "min_content_chars": 250,    # below this, fall back to every block on the page
+}
+
+
+@dataclass
+class Extraction:
+    title: str
+    content: str
+    tag_content: str
+    blocks: int = 0
+
+
+def _clean(text: str) -> str:
+    return WHITESPACE_RE.sub(" ", text).strip()
+
+
+def _class_weight(el) -> int:
+    """Readability class/id weight: +25 for content hints, -25 for boilerplate."""
+    hint = f"{el.get('class', '')} {el.get('id', '')}"
+    if not hint.strip():
+        return 0
+    weight = 0
+    if NEGATIVE_RE.search(hint):
+        weight -= 25
+    if POSITIVE_RE.search(hint):
+        weight += 25
+    return weight
+
+
+def _is_unlikely(el) -> bool:
+    if el.tag in ("body", "html", "article", "main"):
+        return False
+    hint = f"{el.get('class', '')} {el.get('id', '')} {el.get('role', '')}"
+    return bool(hint.strip()) and UNLIKELY_RE.search(hint) is not None \
+        and POSITIVE_RE.search(hint) is None
+
+
+def _prune(root) -> None:
+    """Remove non-content subtrees in place before the scoring pass."""
+    doomed = []
+    for el in root.iter():
+        if not isinstance(el.tag, str):
+            # comments and processing instructions
+            doomed.append(el)
+        elif el.tag in DROP_TAGS or _is_unlikely(el):
+            doomed.append(el)
+    for el in doomed:
+        parent = el.getparent()
+        if parent is None:
+            continue
+        # keep the tail text, it belongs to the parent
+        if el.tail:
+            prev = el.getprevious()
+            if prev is not None:
+                prev.tail = (prev.tail or "") + el.tail
+            else:
+                parent.text = (parent.text or "") + el.tail
+        parent.remove(el)
+
+
+def _score_blocks(root):
+    """
+    Single walk over the pruned tree.
+
+    Returns the ordered list of (element, tag, text) blocks and a score per
+    candidate container (parent and grandparent of every paragraph).
+    """
+    blocks = []
+    scores: Dict = {}
+    for el in root.iter(*BLOCK_TAGS):
+        # nested blocks (p inside li) are emitted once, by the outer block
+        if any(a.tag in BLOCK_TAGS for a in el.iterancestors()):
+            continue
+        text = _clean(el.text_content())
+        if not text:
+            continue
+        blocks.append((el, el.tag, text))
+        if el.tag in HEADING_TAGS or len(text) < CONFIG["min_block_chars"]:
+            continue
+
+        link_chars = sum(len(a.text_content()) for a in el.iter("a"))
+        link_density = link_chars / max(len(text), 1)
+        if link_density > CONFIG["max_link_density"]:
+            continue
+
+        score = 1 + len(COMMA_RE.findall(text)) + min(len(text) // 100, 3)
+        score *= 1 - link_density
+        parent = el.getparent()
+        grand = parent.getparent() if parent is not None else None
+        for node, share in ((parent, 1.0), (grand, 0.5)):
+            if node is None:
+                continue
+            if node not in scores:
+                scores[node] = float(_class_weight(node))
+            scores[node] += score * share
+    return blocks, scores
+
+
+def _select(blocks, scores) -> List:
+    """Pick the best container plus strong siblings; return the kept blocks."""
+    if not scores:
+        return blocks
+    best = max(scores, key=scores.get)
+    keep = {best}
+    threshold = max(10.0, scores[best] * CONFIG["sibling_ratio"])
+    parent = best.getparent()
+    if parent is not None:
+        for sibling in parent:
+            if sibling is not best and scores.get(sibling, 0.0) >= threshold:
+                keep.add(sibling)
+
+    kept = []
+    for block in blocks:
+        el = block[0]
+        if el in keep or any(a in keep for a in el.iterancestors()):
+            kept.append(block)
+
+    # A heading that introduces the article usually sits just outside the
+    # content container (e.g. <h1> above <div class="entry">); keep the H1.
+    if not any(tag == "h1" for _, tag, _ in kept):
+        h1 = next((b for b in blocks if b[1] == "h1"), None)
+        if h1 is not None:
+            kept.insert(0, h1)
+
+    if sum(len(text) for _, _, text in kept) < CONFIG["min_content_chars"]:
+        return blocks
+    return kept
+
+
+def extract(html: str, url: str = "") -> Extraction:
+    """Extract title, plain content and tagged content from an HTML page."""
+    if not html or not html.strip():
+        return Extraction(title=url, content="", tag_content="")
+    try:
+        root = lxml.html.document_fromstring(html)
+    except (etree.ParserError, ValueError):
+        # ValueError: unicode strings with an XML encoding declaration
+        root = lxml.html.document_fromstring(html.encode("utf-8", "ignore"))
+
+    title_el: Optional[etree._Element] = root.find(".//title")
+    title = _clean(title_el.text_content()) if title_el is not None else ""
+
+    _prune(root)
+    blocks, scores = _score_blocks(root)
+    kept = _select(blocks, scores)
+
+    return Extraction(
+        title=title or url,
+        content=" ".join(text for _, _, text in kept),
+        tag_content="\n".join(f"[{tag.upper()}] {text}" for _, tag, text in kept),
+        blocks=len(kept),
+    )
@@ -0,0 +1,619 @@
+#!/usr/bin/env python3
+"""
+Province knowledge tables: attractions, dishes and best seasons, with sources.
+
+Questions like "món ăn đặc sản Cần Thơ", "địa điểm du lịch Hà Giang" or
+"Hà Nội mùa nào đẹp nhất" are list lookups; the corpus already holds the
+lists, so they need neither retrieval nor the LLM. This job extracts them
+once into data/knowledge.sqlite:
+
+    attraction  H2/H3 headings of the crawled travel pages (tag_sections.py),
+                and the \\section{} entries under "Điểm du lịch" of the
+                hand-written tex guides (with address, hours and price)
+    dish        the same for food pages and the tex "Ẩm thực" sections
+                (crawled food pages list dishes and places to eat)
+    season      sentences of travel pages that say when to go ("thời điểm lý
+                tưởng ... tháng 10 đến tháng 12", "best time to visit ...
+                November to April"), labelled with their month range
+
+Site chrome is dropped: the export_tex.py heading filter, menu and widget
+headings, bare categories ("Ẩm thực", "Khám phá Quảng Trị"), everything
+after a "related articles" heading, and at load time any heading one site
+repeats on the pages of CONFIG['chrome_provinces'] provinces. Names are
+deduplicated per province on their folded form, and the number of documents
+naming an entry is its support, which orders the lists.
+
+lookup() answers explicit list questions only ("Đà Nẵng có món gì ngon",
+"what to eat in Danang"); it returns None for a named dish or place ("món
+bánh xèo ...", "Chợ Bến Thành ..."), a comparison, what to avoid, or a
+place that is not a province, instead of falling back to the caller's one.
+Provinces are matched spaced, compact or by alias ("Hà Nội", "Hanoi",
+"Sài Gòn").
+
+Sources are the catalog's documents (catalog.py: crawled tag pages and the
+travel/ dumps) and ../tex/*.tex; `build` syncs the catalog first. Rebuilds
+are incremental like the catalog: only files whose mtime or size changed
+are re-read, entries of files that disappeared are dropped, and
+new_crawler.py rebuilds after each crawl.
+
+    with KnowledgeBase() as kb:
+        answer = kb.lookup("món ăn đặc sản Cần Thơ")   # ~µs, tables are in memory
+        print(answer.text)
+
+Usage:
+    python knowledge.py build [--catalog data/catalog.sqlite] [--tex-dir ../tex] [--knowledge data/knowledge.sqlite]
+                              [--skip-catalog]
+    python knowledge.py stats
+    python knowledge.py lookup "món ăn đặc sản Cần Thơ" [--province 55] [--limit 10]
+"""
+
+import argparse
+import json
+import logging
+import re
+import sqlite3
+import sys
+import time
+from collections import Counter
+from dataclasses import dataclass, field
+from functools import lru_cache
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import urlparse
+
+from catalog import CATALOG_PATH, ROOT, SEARCH_ENGINE_DIR, Catalog, read_body, relative
+from catalog import build as build_catalog
+from export_tex import SKIP_HEADING_RE
+from provinces import fold, province_dict, province_slug, province_title
+from tag_sections import clean_heading, read_tag_file, split_sections
+
+logger = logging.getLogger(__name__)
+
+KNOWLEDGE_PATH = SEARCH_ENGINE_DIR / "data" / "knowledge.sqlite"
+TEX_DIR = ROOT / "tex"
+
+CONFIG = {
+    'min_section_chars': 40,   # a heading with less text under it is navigation
+    'max_name_chars': 60,
+    'max_name_words': 10,
+    'min_season_chars': 30,
+    'max_season_chars': 300,
+    'limit': 10,               # entries per answer
+    'chrome_provinces': 3,     # a heading one site repeats on pages of this many provinces is navigation
+    'season_window': 100,      # characters after a "best time" cue searched for the months
+}
+# bump when the extraction rules change: unchanged files are re-read on the next build
+EXTRACT_VERSION = 2
+
+# a heading like this ends the article: what follows is a sidebar of other articles
+STOP_HEADING_RE = re.compile(
+    r"có thể bạn quan tâm|bạn có thể quan tâm|bài viết liên quan|tin liên quan|xem thêm|đọc thêm|"
+    r"bài viết mới|tin mới|related|you may also like|kết luận|tổng kết",
+    re.IGNORECASE,
+)
+# headings that are not a place or a dish
+NOT_ENTRY_RE = re.compile(
+    r"\?|https?://|\b\d{3,}[ .]?\d{3,}|gọi ngay|hotline|kinh nghiệm|lưu ý|những thông tin|"
+    r"du lịch vùng miền|du lịch địa phương|cẩm nang|tổng quan|giới thiệu|overview|tips?\b|"
+    # site chrome: tables of contents, menus, account and booking widgets, sidebars
+    r"n[ôộo]i dung|mục lục|di chuyển|lưu trú|tiện ích|\btour\b|khách sạn|đặt phòng|dịch vụ|sản phẩm|"
+    r"đăng nhập|đăng ký|theo dõi|liên kết|từ khóa|bài viết|trả lời|bình luận|lựa chọn hàng đầu|"
+    r"danh sách|\bvề (?:chúng tôi|traveloka|klook)|login|sign up|about us|follow us|recent posts?|other posts?|"
+    r"reply|best time to visit|travelers talk|tìm chỗ ở|bạn đang tìm|mùa nào|khai mạc|festival|"
+    r"weather|forecast|air quality|transports?\b|accommodation|notes when|travel guide|how to get|getting there",
+    re.IGNORECASE,
+)
+# a heading that is only a category ("Ẩm thực", "Địa điểm tham quan") heads a list, it is not an entry
+GENERIC_HEADING_RE = re.compile(
+    r"^(?:ẩm thực|món ăn|món ngon|đặc sản|ăn gì|ăn uống|ăn ở đâu|quán ăn|tham quan|địa điểm(?: tham quan| du lịch)?|"
+    r"điểm đến|điểm tham quan|chơi đâu|chơi gì|khám phá|khác|hoạt động|trải nghiệm|mua gì làm quà|mua sắm|"
+    r"thời tiết|food|attractions?|things to do|where to eat|what to eat|shopping)$",
+    re.IGNORECASE,
+)
+# "Bến Ninh Kiều – Linh hồn của Cần Thơ" -> "Bến Ninh Kiều"
+TAGLINE_RE = re.compile(r"\s+[–—-]\s+|:\s+")
+SENTENCE_RE = re.compile(r"(?<=[.!?])\s+|\n+")
+# "the best time to go is ...": the months are looked for right after the cue
+SEASON_CUE_RE = re.compile(
+    r"(?:thời điểm|thời gian|mùa|dịp)\s+(?:\w+\s+)?(?:lý tưởng|đẹp nhất|thích hợp|phù hợp|tốt nhất)|"
+    r"(?:nên|lý tưởng để|thích hợp để|phù hợp để)\s+(?:đi|đến|ghé|du lịch|tham quan)|"
+    r"best (?:time|season|months?)|ideal time|good time to|time to visit",
+    re.IGNORECASE,
+)
+HOURS_RE = re.compile(r"\b\d{1,2}\s*(?:h|giờ|:\d{2})\b|\bsáng\b|\bchiều\b|\bam\b|\bpm\b", re.IGNORECASE)
+ENGLISH_MONTHS = ["january", "february", "march", "april", "may", "june", "july", "august",
+                  "september", "october", "november", "december"]
+MONTH_RANGE_RE = re.compile(
+    r"tháng\s*(\d{1,2})(?:\s*(?:đến|tới|-|–|—)\s*(?:tháng\s*)?(\d{1,2}))?|"
+    r"\b(" + "|".join(ENGLISH_MONTHS) + r")\b(?:\s*(?:to|through|until|-|–)\s*(" + "|".join(ENGLISH_MONTHS) + r")\b)?",
+    re.IGNORECASE,
+)
+SEASON_NAMES = {"mùa xuân": "mùa xuân", "mùa hè": "mùa hè", "mùa hạ": "mùa hè", "mùa thu": "mùa thu",
+                "mùa đông": "mùa đông", "mùa khô": "mùa khô", "mùa mưa": "mùa mưa",
+                "spring": "mùa xuân", "summer": "mùa hè", "autumn": "mùa thu", "fall": "mùa thu",
+                "winter": "mùa đông", "dry season": "mùa khô", "rainy season": "mùa mưa"}
+SEASON_NAME_RE = re.compile(r"\b(" + "|".join(sorted(SEASON_NAMES, key=len, reverse=True)) + r")\b", re.IGNORECASE)
+
+TEX_GROUPS = {"điểm du lịch": "attraction", "ẩm thực": "dish"}
+TEX_SECTION_RE = re.compile(r"^\\section(\*?)\{+(.*?)\}+\s*$")
+TEX_ITEM_RE = re.compile(r"^\\item\s*\{?\\textbf\{(.*?)\}\s*\}?\s*(.*)$")
+TEX_FIELDS = {"địa chỉ": "Địa chỉ", "giờ mở cửa": "Giờ mở cửa", "giá vé/ chi phí": "Giá vé"}
+
+# explicit list questions only ("có món gì ngon", "những địa điểm tham quan nào", "what to eat");
+# the order matters ("thời điểm nào" is a season question)
+KIND_PATTERNS = [
+    ("season", re.compile(r"mùa nào|tháng (?:mấy|nào)|thời điểm (?:nào|đẹp nhất|lý tưởng)|khi nào nên|lúc nào nên|"
+                          r"nên đi vào|best time|which month|what season|when (?:should|to) (?:i )?(?:go|visit)",
+                          re.IGNORECASE)),
+    ("dish", re.compile(r"(?:món|món ăn|đặc sản|quán ăn|quán ngon)\s+(?:gì|nào|ngon|nổi tiếng|nên thử)|"
+                        r"(?:những|các) (?:món|đặc sản|quán)|món ăn đặc sản|ăn gì|"
+                        r"what (?:to|should i) eat|(?:what|which) (?:food|dishes|specialties)|"
+                        r"(?:local|must[- ]try|best) (?:food|dishes|specialties)", re.IGNORECASE)),
+    ("attraction", re.compile(r"(?:địa điểm|điểm|nơi|chỗ)(?: du lịch| tham quan| vui chơi)?\s+(?:nào|đẹp|nổi tiếng)|"
+                              r"(?:những|các) (?:địa điểm|điểm|nơi|chỗ)|địa điểm du lịch|điểm du lịch|đi đâu|chơi gì|"
+                              r"có gì (?:đẹp|hay|chơi)|danh lam thắng cảnh|(?:what|which) (?:places|attractions|sights)|"
+                              r"places to (?:visit|see|go)|things to do|where to go|(?:top|best) attractions",
+                              re.IGNORECASE)),
+]
+# not list lookups: one place's details, comparisons, what to avoid, "which region is X from"
+SPECIFIC_RE = re.compile(
+    r"mở cửa|giá vé|bao nhiêu|địa chỉ|ở đâu|đường nào|opening hours|how much|address|"
+    r"so sánh|khác nhau|compare|versus|\bvs\b|tránh|không nên|kiêng|avoid|should not|shouldn't|don't|"
+    r"\blà (?:món|đặc sản|điểm|địa điểm)|(?:của|ở|thuộc) (?:vùng|tỉnh|miền|nơi) nào|which (?:province|region|city)|"
+    r"where (?:is|are|does) .* from",
+    re.IGNORECASE,
+)
+# "Khám phá Quảng Trị", "Ăn vặt Cần Thơ": a category of one province is a section title too
+CATEGORY_PREFIX_RE = re.compile(
+    r"^(?:[IVX]+\.\s*)?(?:khám phá|thưởng thức|trải nghiệm|du lịch|ẩm thực|ăn vặt|ăn gì|văn hoá|văn hóa|đặc sản|"
+    r"địa điểm|điểm du lịch|những|các|quán ăn ngon|food|things to do|top)\b", re.IGNORECASE)
+# "món bánh xèo ...": a question about one named dish
+NAMED_DISH_RE = re.compile(r"\bmón\s+(?!ăn\b|ngon\b|gì\b|nào\b|đặc\b|chính\b|nổi\b|này\b|đó\b|nên\b)[^\W\d_]",
+                           re.IGNORECASE)
+KIND_TITLES = {"attraction": "Địa điểm du lịch", "dish": "Món ăn và quán ngon", "season": "Thời điểm nên đi"}
+PROVINCE_ALIASES = {"sai gon": "THÀNH PHỐ HỒ CHÍ MINH", "saigon": "THÀNH PHỐ HỒ CHÍ MINH",
+                    "tphcm": "THÀNH PHỐ HỒ CHÍ MINH", "hcm": "THÀNH PHỐ HỒ CHÍ MINH",
+                    "hue": "TỈNH THỪA THIÊN", "vung tau": "TỈNH BÀ RỊA", "phu quoc": "TỈNH KIÊN GIANG",
+                    "da lat": "TỈNH LÂM ĐỒNG", "nha trang": "TỈNH KHÁNH HÒA", "ha long": "TỈNH QUẢNG NINH",
+                    "hoi an": "TỈNH QUẢNG NAM", "sa pa": "TỈNH LÀO CAI", "hcmc": "THÀNH PHỐ HỒ CHÍ MINH",
+                    "saigon city": "THÀNH PHỐ HỒ CHÍ MINH", "ho chi minh city": "THÀNH PHỐ HỒ CHÍ MINH"}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS sources (
+    path TEXT PRIMARY KEY,
+    province_id INTEGER,
+    mtime_ns INTEGER,
+    size INTEGER
+);
+CREATE TABLE IF NOT EXISTS entries (
+    id INTEGER PRIMARY KEY,
+    province_id INTEGER NOT NULL,
+    kind TEXT NOT NULL,
+    name TEXT NOT NULL,
+    key TEXT NOT NULL,
+    detail TEXT,
+    url TEXT,
+    path TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS entries_lookup ON entries (province_id, kind, key);
+CREATE INDEX IF NOT EXISTS entries_path ON entries (path);
+"""
+
+
+def _folded(text: str) -> str:
+    return " ".join(fold(text).lower().split())
+
+
+def short_province(name: str) -> str:
+    """Folded province name without its prefix ("TỈNH HÀ GIANG" -> "ha giang")."""
+    return re.sub(r"^(thanh pho|tinh)\s+", "", _folded(name))
+
+
+def _province_keys() -> List[Tuple[str, int]]:
+    """Folded names and aliases, spaced and compact ("ha noi", "hanoi", "da nang", "danang")."""
+    keys = {}
+    for key, province_id in ([(short_province(name), province_id) for name, province_id in province_dict.items()]
+                             + [(alias, province_dict[name]) for alias, name in PROVINCE_ALIASES.items()]):
+        keys.setdefault(key, province_id)
+        keys.setdefault(key.replace(" ", ""), province_id)
+    return sorted(keys.items(), key=lambda item: len(item[0]), reverse=True)
+
+
+PROVINCE_KEYS = _province_keys()
+PROVINCE_NAMES = {province_id: province_title(name) for name, province_id in province_dict.items()}
+NAME_TOKEN_RE = re.compile(r"[^\W\d_]+")
+PLACE_PREFIXES = {"tp", "thanh", "pho", "tinh", "city", "province"}
+
+
+def find_provinces(text: str) -> List[int]:
+    """Province ids named in a text, in order of appearance; longest name first ("Hà Nam" is not "Hà Nội")."""
+    folded = f" {' '.join(NAME_TOKEN_RE.findall(_folded(text)))} "
+    found = []
+    for key, province_id in PROVINCE_KEYS:
+        position = folded.find(f" {key} ")
+        if position >= 0:
+            found.append((position, province_id))
+            folded = folded.replace(f" {key} ", " " + "_" * len(key) + " ")
+    return list(dict.fromkeys(province_id for _, province_id in sorted(found)))
+
+
+def find_province(question: str) -> Optional[int]:
+    """The first province id named in a question."""
+    provinces = find_provinces(question)
+    return provinces[0] if provinces else None
+
+
+def _capitalized_runs(text: str) -> List[Tuple[List[str], bool]]:
+    """Runs of adjacent capitalized words, each with whether it starts the sentence."""
+    runs: List[Tuple[List[str], bool]] = []
+    current: List[str] = []
+    at_start, end = False, 0
+    for match in NAME_TOKEN_RE.finditer(text):
+        word = match.group()
+        capitalized = len(word) > 1 and word[0].isupper()
+        if current and (not capitalized or text[end:match.start()].strip()):
+            runs.append((current, at_start))
+            current = []
+        if capitalized:
+            if not current:
+                before = text[:match.start()].rstrip(" \"'«“(-")
+                at_start = not before or before[-1] in ".?!:"
+            current.append(word)
+        end = match.end()
+    if current:
+        runs.append((current, at_start))
+    return runs
+
+
+def _without_provinces(words: List[str]) -> str:
+    rest = f" {_folded(' '.join(words))} "
+    for key, _ in PROVINCE_KEYS:
+        while f" {key} " in rest:
+            rest = rest.replace(f" {key} ", " ")
+    return " ".join(w for w in rest.split() if w not in PLACE_PREFIXES)
+
+
+def unresolved_places(text: str) -> List[str]:
+    """
+    Capitalized names in a text that are not a province ("Phan Thiết", "Chợ
+    Bến Thành"): a specific place, or one the tables do not know. The first
+    word of a sentence may be capitalized only because it starts it.
+    """
+    places = []
+    for words, at_start in _capitalized_runs(text):
+        if _without_provinces(words) and not (at_start and not _without_provinces(words[1:])):
+            places.append(" ".join(words[1:] if at_start else words))
+    return places
+
+
+@lru_cache(maxsize=256)
+def province_for_stem(stem: str) -> Optional[int]:
+    """Province id for a PDF stem of data/ ("CanTho" -> 55, "ThuaThienHue" -> 33)."""
+    for name, province_id in province_dict.items():
+        compact = "".join(part.title() for part in short_province(name).split())
+        if compact and (compact == stem or stem.startswith(compact)):
+            return province_id
+    return None
+
+
+def question_kind(question: str) -> Optional[str]:
+    """attraction / dish / season for an explicit list question, else None."""
+    if SPECIFIC_RE.search(question) or NAMED_DISH_RE.search(question):
+        return None
+    for kind, pattern in KIND_PATTERNS:
+        if pattern.search(question):
+            return kind
+    return None
+
+
+def entry_name(heading: str) -> Optional[str]:
+    """A heading cleaned into an entry name, or None when it is not one."""
+    name = TAGLINE_RE.split(clean_heading(heading), 1)[0].strip(" .:;,")
+    if (not name or len(name) > CONFIG['max_name_chars'] or len(name.split()) > CONFIG['max_name_words']
+            or SKIP_HEADING_RE.search(name) or NOT_ENTRY_RE.search(name) or GENERIC_HEADING_RE.match(name)
+            or (CATEGORY_PREFIX_RE.match(name) and find_province(name) is not None)
+            or not re.search(r"[^\W\d_]", name)):
+        return None
+    return name
+
+
+def heading_entries(tag_path: Path, kind: str) -> List[Dict]:
+    page = read_tag_file(tag_path)
+    entries = []
+    for section in split_sections(page):
+        if STOP_HEADING_RE.search(section.heading):
+            break
+        if len(section.text) < CONFIG['min_section_chars']:
+            continue
+        name = entry_name(section.heading)
+        if name:
+            detail = " ".join(section.lines)[:240]
+            entries.append({"kind": kind, "name": name, "detail": detail, "url": page.url})
+    return entries
+
+
+def month_label(text: str) -> Optional[str]:
+    """
+    The first month range or season named in a text: "tháng 10 đến tháng 12"
+    -> "tháng 10 – 12", "dry season" -> "mùa khô"; None without either.
+    """
+    labels = []
+    for match in MONTH_RANGE_RE.finditer(text):
+        if match.group(1):
+            start, end = int(match.group(1)), int(match.group(2) or 0)
+        else:
+            start = ENGLISH_MONTHS.index(match.group(3).lower()) + 1
+            end = ENGLISH_MONTHS.index(match.group(4).lower()) + 1 if match.group(4) else 0
+        if 1 <= start <= 12 and 0 <= end <= 12:
+            labels.append((match.start(), f"tháng {start} – {end}" if end and end != start else f"tháng {start}"))
+            break
+    season = SEASON_NAME_RE.search(text)
+    if season:
+        labels.append((season.start(), SEASON_NAMES[season.group(1).lower()]))
+    return min(labels)[1] if labels else None
+
+
+def season_entries(text: str, url: Optional[str]) -> List[Dict]:
+    entries, seen = [], set()
+    for sentence in SENTENCE_RE.split(text):
+        sentence = " ".join(sentence.split())
+        if not CONFIG['min_season_chars'] <= len(sentence) <= CONFIG['max_season_chars']:
+            continue
+        cue = SEASON_CUE_RE.search(sentence)
+        if not cue or HOURS_RE.search(sentence):
+            continue
+        # the months the cue recommends, not any month the sentence mentions
+        label = month_label(sentence[cue.start():cue.end() + CONFIG['season_window']])
+        if label and sentence not in seen:
+            seen.add(sentence)
+            entries.append({"kind": "season", "name": label, "detail": sentence, "url": url})
+    return entries
+
+
+def tex_entries(path: Path) -> List[Dict]:
+    """Numbered \\section{} entries of a hand-written guide, with its address/hours/price items."""
+    entries: List[Dict] = []
+    kind = current = None
+    for raw in path.read_text(encoding="utf-8", errors="ignore").splitlines():
+        line = raw.strip()
+        section = TEX_SECTION_RE.match(line)
+        if section:
+            title = section.group(2).replace("\\&", "&").strip()
+            if section.group(1):
+                kind, current = TEX_GROUPS.get(title.lower()), None
+            elif kind:
+                name = TAGLINE_RE.split(title, 1)[0].strip()
+                current = {"kind": kind, "name": name, "detail": [], "url": None}
+                entries.append(current)
+            continue
+        item = TEX_ITEM_RE.match(line)
+        if current is not None and item:
+            label = TEX_FIELDS.get(item.group(1).strip(" :").lower())
+            value = item.group(2).strip()
+            if label and value:
+                current["detail"].append(f"{label}: {value}")
+    for entry in entries:
+        entry["detail"] = "; ".join(entry["detail"]) or None
+    return entries
+
+
+def tex_province(path: Path) -> Optional[int]:
+    slugs = {province_slug(name): province_id for name, province_id in province_dict.items()}
+    return slugs.get(path.stem)
+
+
+class KnowledgeBase:
+    def __init__(self, path=KNOWLEDGE_PATH):
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self.path = path
+        self.conn = sqlite3.connect(str(path), check_same_thread=False)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.executescript(SCHEMA)
+        self.conn.commit()
+        self.tables: Optional[Dict[Tuple[int, str], List[Dict]]] = None
+
+    def __enter__(self) -> "KnowledgeBase":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def close(self) -> None:
+        self.conn.close()
+
+    # --- build ---
+
+    def update(self, path: Path, province_id: int, extract) -> str:
+        """Re-extract one source file if it changed; returns "added", "updated", "unchanged" or "missing"."""
+        key = relative(path)
+        try:
+            stat = path.stat()
+        except OSError:
+            return "missing"
+        existing = self.conn.execute("SELECT mtime_ns, size FROM sources WHERE path = ?", (key,)).fetchone()
+        if existing and existing["mtime_ns"] == stat.st_mtime_ns and existing["size"] == stat.st_size:
+            return "unchanged"
+        self.conn.execute("DELETE FROM entries WHERE path = ?", (key,))
+        self.conn.executemany(
+            "INSERT INTO entries (province_id, kind, name, key, detail, url, path) VALUES (?, ?, ?, ?, ?, ?, ?)",
+            [(province_id, e["kind"], e["name"], _folded(e["name"]), e["detail"], e["url"], key) for e in extract()],
+        )
+        self.conn.execute("INSERT OR REPLACE INTO sources VALUES (?, ?, ?, ?)",
+                          (key, province_id, stat.st_mtime_ns, stat.st_size))
+        self.tables = None
+        return "updated" if existing else "added"
+
+    def build(self, catalog: Catalog, tex_dir=TEX_DIR) -> Dict[str, int]:
+        counts = Counter()
+        seen = set()
+        if self.conn.execute("PRAGMA user_version").fetchone()[0] != EXTRACT_VERSION:
+            # extracted with older rules: re-read every source
+            self.conn.execute("DELETE FROM entries")
+            self.conn.execute("DELETE FROM sources")
+            self.conn.execute(f"PRAGMA user_version = {EXTRACT_VERSION}")
+
+        def visit(path: Path, province_id: int, extract) -> None:
+            status = self.update(path, province_id, extract)
+            counts[status] += 1
+            if status != "missing":
+                seen.add(relative(path))
+
+        for doc in catalog.documents():
+            if doc["province_id"] is None:
+                continue
+            if doc["source"] == "crawl" and doc["tag_path"]:
+                tag_path = ROOT / doc["tag_path"]
+                kind = "attraction" if doc["category"] == "travel" else "dish"
+
+                def extract(tag_path=tag_path, kind=kind, url=doc["url"], category=doc["category"]):
+                    entries = heading_entries(tag_path, kind)
+                    if category == "travel":
+                        entries += season_entries("\n".join(text for _, text in read_tag_file(tag_path).lines), url)
+                    return entries
+
+                visit(tag_path, doc["province_id"], extract)
+            elif doc["source"] == "travel":
+                text_path = ROOT / doc["path"]
+                visit(text_path, doc["province_id"], lambda text_path=text_path: season_entries(read_body(text_path), None))
+        for tex_path in sorted(Path(tex_dir).glob("*.tex")):
+            province_id = tex_province(tex_path)
+            if province_id is not None:
+                visit(tex_path, province_id, lambda tex_path=tex_path: tex_entries(tex_path))
+
+        stale = [r["path"] for r in self.conn.execute("SELECT path FROM sources") if r["path"] not in seen]
+        self.conn.executemany("DELETE FROM entries WHERE path = ?", [(p,) for p in stale])
+        self.conn.executemany("DELETE FROM sources WHERE path = ?", [(p,) for p in stale])
+        counts["removed"] = len(stale)
+        self.conn.commit()
+        self.tables = None
+        return dict(counts)
+
+    # --- lookup ---
+
+    def chrome_keys(self) -> set:
+        """Headings one site repeats on the pages of several provinces: its menus and sidebars, not entries."""
+        provinces: Dict[Tuple[str, str], set] = {}
+        for row in self.conn.execute("SELECT DISTINCT key, url, province_id FROM entries"
+                                     " WHERE kind != 'season' AND url IS NOT NULL"):
+            provinces.setdefault((urlparse(row["url"]).netloc, row["key"]), set()).add(row["province_id"])
+        return {key for (_, key), ids in provinces.items() if len(ids) >= CONFIG['chrome_provinces']}
+
+    def load(self) -> Dict[Tuple[int, str], List[Dict]]:
+        """Every table, ranked by support, in memory (a few thousand rows)."""
+        if self.tables is None:
+            tables: Dict[Tuple[int, str], List[Dict]] = {}
+            chrome = self.chrome_keys()
+            rows = self.conn.execute(
+                "SELECT province_id, kind, key, name, detail, url, path, COUNT(DISTINCT path) AS support,"
+                " MIN(id) AS first FROM entries GROUP BY province_id, kind, key"
+                " ORDER BY province_id, kind, support DESC, (detail IS NULL), first"
+            )
+            for row in rows:
+                if row["key"] in chrome and row["kind"] != "season":
+                    continue
+                tables.setdefault((row["province_id"], row["kind"]), []).append(
+                    {"name": row["name"], "detail": row["detail"], "url": row["url"] or row["path"],
+                     "support": row["support"]})
+            self.tables = tables
+        return self.tables
+
+    def table(self, province_id: int, kind: str, limit: int = CONFIG['limit']) -> List[Dict]:
+        return self.load().get((province_id, kind), [])[:limit]
+
+    def lookup(self, question: str, province_id: Optional[int] = None,
+               limit: int = CONFIG['limit']) -> Optional["Answer"]:
+        """A structured answer for a list question, or None when the tables cannot answer it."""
+        kind = question_kind(question)
+        if kind is None:
+            return None
+        named = find_provinces(question)
+        # two provinces is a comparison; a place the tables do not know must not fall back to province_id
+        if len(named) > 1 or unresolved_places(question):
+            return None
+        province_id = named[0] if named else province_id
+        if province_id is None:
+            return None
+        entries = self.table(province_id, kind, limit)
+        if not entries:
+            return None
+        return Answer(province_id, kind, entries)
+
+    def stats(self) -> Dict:
+        by_kind = {r[0]: r[1] for r in self.conn.execute(
+            "SELECT kind, COUNT(DISTINCT province_id || ':' || key) FROM entries GROUP BY kind")}
+        return {"sources": self.conn.execute("SELECT COUNT(*) FROM sources").fetchone()[0],
+                "entries": by_kind,
+                "provinces": self.conn.execute("SELECT COUNT(DISTINCT province_id) FROM entries").fetchone()[0]}
+
+
+@dataclass
+class Answer:
+    province_id: int
+    kind: str
+    entries: List[Dict] = field(default_factory=list)
+
+    @property
+    def text(self) -> str:
+        lines = [f"{KIND_TITLES[self.kind]} - {PROVINCE_NAMES.get(self.province_id, self.province_id)}:"]
+        for entry in self.entries:
+            if self.kind == "season":
+                lines.append(f"- {entry['name']}: {entry['detail']} (nguồn: {entry['url']})")
+            else:
+                detail = f" ({entry['detail']})" if entry["detail"] and entry["url"].endswith(".tex") else ""
+                lines.append(f"- {entry['name']}{detail} (nguồn: {entry['url']})")
+        return "\n".join(lines)
+
+
+def build(knowledge: KnowledgeBase, catalog_path=CATALOG_PATH, tex_dir=TEX_DIR, sync_catalog: bool = True) -> Dict:
+    report = {}
+    with Catalog(catalog_path) as catalog:
+        if sync_catalog:
+            report["catalog"] = build_catalog(catalog)
+        report["knowledge"] = knowledge.build(catalog, tex_dir)
+    return report
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("command", choices=["build", "stats", "lookup"])
+    parser.add_argument("question", nargs="?", default=None)
+    parser.add_argument("--knowledge", default=str(KNOWLEDGE_PATH))
+    parser.add_argument("--catalog", default=str(CATALOG_PATH))
+    parser.add_argument("--tex-dir", default=str(TEX_DIR))
+    parser.add_argument("--province", type=int, default=None, help="when the question names none")
+    parser.add_argument("--limit", type=int, default=CONFIG['limit'])
+    parser.add_argument("--skip-catalog", action="store_true", help="use the catalog as it is, without syncing it")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    if args.command == "build" and args.skip_catalog and not Path(args.catalog).exists():
+        print(f"No catalog at {args.catalog}; run `python catalog.py build` first")
+        sys.exit(1)
+    if args.command != "build" and not Path(args.knowledge).exists():
+        print(f"No knowledge tables at {args.knowledge}; run `python knowledge.py build` first")
+        sys.exit(1)
+    if args.command == "lookup" and not args.question:
+        print("lookup needs a question")
+        sys.exit(1)
+
+    with KnowledgeBase(args.knowledge) as knowledge:
+        if args.command == "build":
+            started = time.perf_counter()
+            report = build(knowledge, args.catalog, args.tex_dir, sync_catalog=not args.skip_catalog)
+            logger.info(f"Knowledge tables built in {time.perf_counter() - started:.1f}s: {report}")
+            print(json.dumps(knowledge.stats(), ensure_ascii=False, indent=2))
+        elif args.command == "stats":
+            print(json.dumps(knowledge.stats(), ensure_ascii=False, indent=2))
+        else:
+            knowledge.load()
+            started = time.perf_counter()
+            answer = knowledge.lookup(args.question, args.province, args.limit)
+            elapsed = (time.perf_counter() - started) * 1000
+            print(answer.text if answer else "(no structured answer; use retrieval)")
+            logger.info(f"Lookup in {elapsed:.3f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,193 @@
+#!/usr/bin/env python3
+"""
+Concurrent link validation that fetches each URL at most once.
+
+crawl_content.ipynb validated every search hit with a full requests.get()
+run one link at a time, threw the page away, and fetch_and_save() then
+downloaded it again. Here links are checked concurrently over one pooled
+aiohttp session, with a global and a per-host connection limit:
+
+    1. HEAD (redirects followed). 2xx with an HTML content type is valid;
+       404/410 is dead. Nothing is downloaded.
+    2. Anything else (HEAD refused with 403/405/501, errors, timeouts, no
+       content type) falls back to a GET with Range: bytes=0-<max_page_bytes>.
+       Servers that ignore Range answer 200; either way the body is already
+       here, so it goes straight to the extractor and is kept on the result.
+
+With fetch=True the links that passed on HEAD alone are then fetched once
+with a plain GET and extracted as well, so every valid URL comes back with
+its Extraction and no URL is downloaded twice.
+
+    results = check_links(urls, fetch=True)
+    valid = [r for r in results if r.ok]
+    # in a notebook, where a loop is already running:
+    results = await acheck_links(urls, fetch=True)
+
+Usage:
+    python link_check.py urls.txt [--fetch] [--per-host 2] [--limit 32] [--out links.json]
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import sys
+import time
+from dataclasses import asdict, dataclass
+from typing import Dict, Iterable, List, Optional
+from urllib.parse import urlsplit
+
+import aiohttp
+
+from extractor import Extraction, extract
+
+logger = logging.getLogger(__name__)
+
+CONFIG = {
+    'limit': 32,             # connections across all hosts
+    'per_host': 2,           # connections per host
+    'timeout': 10,           # seconds per request
+    'max_page_bytes': 2_000_000,
+    'dead_statuses': (404, 410),
+    'headers': {
+        "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/114.0.0.0 Safari/537.36",
+        "Accept": "text/html,application/xhtml+xml",
+        "Accept-Language": "vi-VN,vi;q=0.9,en;q=0.8",
+    },
+}
+
+
+@dataclass
+class LinkResult:
+    url: str
+    ok: bool = False
+    status: Optional[int] = None
+    method: Optional[str] = None        # request that decided: HEAD or GET
+    final_url: Optional[str] = None     # after redirects
+    content_type: str = ""
+    html: Optional[str] = None
+    extraction: Optional[Extraction] = None
+    error: Optional[str] = None
+
+
+def is_html(content_type: str) -> bool:
+    return "html" in content_type.lower()
+
+
+class LinkChecker:
+    def __init__(self, session: aiohttp.ClientSession, max_page_bytes: int = CONFIG['max_page_bytes']):
+        self.session = session
+        self.max_page_bytes = max_page_bytes
+        self.stats = {"links": 0, "head_ok": 0, "head_dead": 0, "fallback_get": 0, "fetched": 0,
+                      "failed": 0, "bytes": 0}
+
+    async def head(self, result: LinkResult) -> bool:
+        """True when HEAD settled the link either way."""
+        try:
+            async with self.session.head(result.url, allow_redirects=True) as resp:
+                result.status, result.final_url = resp.status, str(resp.url)
+                result.content_type = resp.headers.get("Content-Type", "")
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            result.error = f"HEAD: {e.__class__.__name__}"
+            return False
+        result.method = "HEAD"
+        if result.status in CONFIG['dead_statuses']:
+            self.stats["head_dead"] += 1
+            return True
+        if 200 <= result.status < 300 and result.content_type:
+            result.ok = is_html(result.content_type)
+            self.stats["head_ok"] += 1
+            return True
+        return False
+
+    async def get(self, result: LinkResult, ranged: bool) -> None:
+        headers = {"Range": f"bytes=0-{self.max_page_bytes - 1}"} if ranged else None
+        try:
+            async with self.session.get(result.url, headers=headers, allow_redirects=True) as resp:
+                result.method, result.status, result.final_url = "GET", resp.status, str(resp.url)
+                result.content_type = resp.headers.get("Content-Type", "text/html")
+                if resp.status not in (200, 206) or not is_html(result.content_type):
+                    result.ok = False
+                    self.stats["failed"] += 1
+                    return
+                body = await resp.content.read(self.max_page_bytes)
+                html = body.decode(resp.charset or "utf-8", errors="ignore")
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            result.ok, result.error = False, f"GET: {e.__class__.__name__}"
+            self.stats["failed"] += 1
+            return
+        self.stats["bytes"] += len(body)
+        # extraction is CPU work; keep it off the event loop
+        result.extraction = await asyncio.get_running_loop().run_in_executor(None, extract, html, result.url)
+        result.html, result.ok, result.error = html, True, None
+
+    async def check(self, url: str, fetch: bool) -> LinkResult:
+        self.stats["links"] += 1
+        result = LinkResult(url)
+        if not await self.head(result):
+            self.stats["fallback_get"] += 1
+            await self.get(result, ranged=True)
+        elif fetch and result.ok:
+            self.stats["fetched"] += 1
+            await self.get(result, ranged=False)
+        return result
+
+
+async def acheck_links(urls: Iterable[str], fetch: bool = False, limit: int = CONFIG['limit'],
+                       per_host: int = CONFIG['per_host'], timeout: float = CONFIG['timeout'],
+                       stats: Optional[Dict] = None) -> List[LinkResult]:
+    """Results in input order; duplicate URLs are checked once."""
+    urls = list(urls)
+    unique = list(dict.fromkeys(urls))
+    connector = aiohttp.TCPConnector(limit=limit, limit_per_host=per_host, ssl=False)
+    async with aiohttp.ClientSession(connector=connector, headers=CONFIG['headers'],
+                                     timeout=aiohttp.ClientTimeout(total=timeout)) as session:
+        checker = LinkChecker(session)
+        checked = await asyncio.gather(*(checker.check(url, fetch) for url in unique))
+    by_url = dict(zip(unique, checked))
+    hosts = len({urlsplit(url).netloc for url in unique})
+    logger.info(f"Checked {len(unique)} links on {hosts} hosts: {checker.stats}")
+    if stats is not None:
+        stats.update(checker.stats)
+    return [by_url[url] for url in urls]
+
+
+def check_links(urls: Iterable[str], fetch: bool = False, **kwargs) -> List[LinkResult]:
+    return asyncio.run(acheck_links(urls, fetch, **kwargs))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("urls", help="file with one URL per line")
+    parser.add_argument("--fetch", action="store_true", help="also fetch and extract links valid on HEAD")
+    parser.add_argument("--limit", type=int, default=CONFIG['limit'], help="connections across all hosts")
+    parser.add_argument("--per-host", type=int, default=CONFIG['per_host'], help="connections per host")
+    parser.add_argument("--timeout", type=float, default=CONFIG['timeout'])
+    parser.add_argument("--out", default=None, help="write results (without html) as JSON")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    try:
+        with open(args.urls, "r", encoding="utf-8") as f:
+            urls = [line.strip() for line in f if line.strip()]
+    except OSError as e:
+        print(f"Cannot read {args.urls}: {e}")
+        sys.exit(1)
+
+    started = time.perf_counter()
+    results = check_links(urls, args.fetch, limit=args.limit, per_host=args.per_host, timeout=args.timeout)
+    valid = sum(r.ok for r in results)
+    logger.info(f"{valid}/{len(results)} links valid in {time.perf_counter() - started:.1f}s")
+    if args.out:
+        rows = []
+        for r in results:
+            row = asdict(r)
+            row.pop("html")
+            row["extraction"] = {"title": r.extraction.title, "chars": len(r.extraction.content)} if r.extraction else None
+            rows.append(row)
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(rows, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,355 @@
+#!/usr/bin/env python3
+"""
+Corpus-wide LLM cleanup of crawled pages.
+
+Sends every *_tag.txt page under the data directory to an OpenAI-compatible
+chat endpoint with the same cleanup/translate instruction paraphrase.py uses,
+and writes the cleaned page to a mirrored output tree.
+
+    - async worker pool (CONFIG['workers'] tasks on one aiohttp session) for
+      the provider chosen with --provider
+    - per-provider request rate limit (token bucket) and concurrency cap
+    - retries with exponential backoff on timeouts, 429 and 5xx (honours Retry-After)
+    - results cached in SQLite keyed by sha256(prompt version, model, page text),
+      so a page is never paid for twice and an interrupted run resumes where it stopped
+    - small pages are packed into one request under a token budget
+
+Usage:
+    python llm_cleanup.py <data_dir> <output_dir> [--provider openrouter] [--model MODEL]
+
+Example (against the local mock server, see mock_llm_server.py):
+    python mock_llm_server.py --port 8808 &
+    python llm_cleanup.py data data_clean --provider local
+"""
+
+import argparse
+import asyncio
+import hashlib
+import logging
+import os
+import random
+import re
+import sqlite3
+import sys
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import aiohttp
+from dotenv import load_dotenv
+
+from rate_limit import TokenBucket
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+PROMPT_VERSION = 1
+INSTRUCTION = (
+    "remove useless text, unrelated to the content, remove icons, just preserve readable "
+    "and renderable characters and translate this content to vietnamese"
+)
+PACKED_INSTRUCTION = (
+    INSTRUCTION + ". The input holds several pages, each starting with a line "
+    "<<<PAGE n>>>. Process each page independently and answer with the same "
+    "<<<PAGE n>>> marker line before each cleaned page."
+)
+PAGE_MARKER_RE = re.compile(r"^<<<PAGE (\d+)>>>\s*$", re.MULTILINE)
+
+PROVIDERS = {
+    "openrouter": {
+        "base_url": "https://openrouter.ai/api/v1",
+        "api_key_env": "OPENROUTER_API_KEY",
+        "model": "deepseek/deepseek-chat-v3-0324:free",
+        "requests_per_minute": 20,
+        "max_concurrency": 4,
+    },
+    "local": {
+        "base_url": "http://127.0.0.1:8808/v1",
+        "api_key_env": None,
+        "model": "mock",
+        "requests_per_minute": 600,
+        "max_concurrency": 16,
+    },
+}
+
+CONFIG = {
+    'request_timeout': 120,   # seconds
+    'max_retries': 5,
+    'backoff_base': 2.0,      # seconds, doubled each retry
+    'backoff_max': 60.0,
+    'pack_token_budget': 3000,  # input tokens per request when packing
+    'pack_max_pages': 8,
+    'workers': 8,
+}
+
+
+def estimate_tokens(text: str) -> int:
+    """Cheap token estimate; Vietnamese runs close to 3 characters per token."""
+    return len(text) // 3 + 1
+
+
+@dataclass
+class Page:
+    path: Path
+    rel: str
+    text: str
+    key: str = ""
+
+
+@dataclass
+class Batch:
+    pages: List[Page] = field(default_factory=list)
+    tokens: int = 0
+
+
+class ResultCache:
+    """SQLite cache of cleaned pages keyed by content hash."""
+
+    def __init__(self, path: Path):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self.conn = sqlite3.connect(str(path))
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS results ("
+            " key TEXT PRIMARY KEY, model TEXT, output TEXT,"
+            " prompt_tokens INTEGER, completion_tokens INTEGER, created REAL)"
+        )
+        self.conn.commit()
+
+    def get(self, key: str) -> Optional[str]:
+        row = self.conn.execute("SELECT output FROM results WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def put(self, key: str, model: str, output: str, usage: Dict[str, int]) -> None:
+        self.conn.execute(
+            "INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?, ?, ?)",
+            (key, model, output, usage.get("prompt_tokens", 0), usage.get("completion_tokens", 0), time.time()),
+        )
+        self.conn.commit()
+
+    def close(self) -> None:
+        self.conn.close()
+
+
+def cache_key(model: str, text: str) -> str:
+    return hashlib.sha256(f"v{PROMPT_VERSION}\x00{model}\x00{text}".encode("utf-8")).hexdigest()
+
+
+def pack(pages: List[Page], budget: int, max_pages: int) -> List[Batch]:
+    """Greedy first-fit packing of pages (largest first) into token-budgeted batches."""
+    batches: List[Batch] = []
+    for page in sorted(pages, key=lambda p: estimate_tokens(p.text), reverse=True):
+        tokens = estimate_tokens(page.text)
+        target = None
+        if tokens < budget:
+            target = next(
+                (b for b in batches if b.tokens + tokens <= budget and len(b.pages) < max_pages),
+                None,
+            )
+        if target is None:
+            target = Batch()
+            batches.append(target)
+        target.pages.append(page)
+        target.tokens += tokens
+    return batches
+
+
+def build_messages(batch: Batch) -> List[Dict]:
+    if len(batch.pages) == 1:
+        text = f"{INSTRUCTION}: \n\n{batch.pages[0].text}"
+    else:
+        body = "\n\n".join(f"<<<PAGE {i}>>>\n{p.text}" for i, p in enumerate(batch.pages))
+        text = f"{PACKED_INSTRUCTION}: \n\n{body}"
+    return [{"role": "user", "content": [{"type": "text", "text": text}]}]
+
+
+def split_packed(output: str, n_pages: int) -> Optional[List[str]]:
+    """Split a packed answer back into pages; None if the markers don't line up."""
+    if n_pages == 1:
+        return [output.strip()]
+    parts = PAGE_MARKER_RE.split(output)
+    # parts = [preamble, idx0, text0, idx1, text1, ...]
+    found = {int(parts[i]): parts[i + 1].strip() for i in range(1, len(parts) - 1, 2)}
+    if sorted(found) != list(range(n_pages)):
+        return None
+    return [found[i] for i in range(n_pages)]
+
+
+class RetryableError(Exception):
+    def __init__(self, message: str, retry_after: Optional[float] = None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class CleanupJob:
+    def __init__(self, provider: str, model: Optional[str], output_dir: Path, cache: ResultCache):
+        settings = PROVIDERS[provider]
+        self.provider = provider
+        self.model = model or settings["model"]
+        self.url = settings["base_url"].rstrip("/") + "/chat/completions"
+        self.headers = {"Content-Type": "application/json"}
+        if settings["api_key_env"]:
+            api_key = os.getenv(settings["api_key_env"])
+            if not api_key:
+                print(f"Error: {settings['api_key_env']} not found in .env file")
+                sys.exit(1)
+            self.headers["Authorization"] = f"Bearer {api_key}"
+        self.bucket = TokenBucket(settings["requests_per_minute"])
+        self.semaphore = asyncio.Semaphore(settings["max_concurrency"])
+        self.output_dir = output_dir
+        self.cache = cache
+        self.stats = {"pages": 0, "cached": 0, "requests": 0, "retries": 0, "failed": 0,
+                      "prompt_tokens": 0, "completion_tokens": 0}
+
+    def write_output(self, page: Page, text: str) -> None:
+        dst = self.output_dir / page.rel
+        dst.parent.mkdir(parents=True, exist_ok=True)
+        tmp = dst.with_suffix(dst.suffix + ".tmp")
+        tmp.write_text(text, encoding="utf-8")
+        os.replace(tmp, dst)
+
+    async def complete(self, session: aiohttp.ClientSession, messages: List[Dict]) -> Tuple[str, Dict]:
+        """One chat completion with rate limiting and retries."""
+        payload = {"model": self.model, "messages": messages}
+        for attempt in range(CONFIG['max_retries']):
+            await self.bucket.acquire()
+            try:
+                async with self.semaphore:
+                    self.stats["requests"] += 1
+                    async with session.post(self.url, headers=self.headers, json=payload) as response:
+                        if response.status == 429 or response.status >= 500:
+                            retry_after = response.headers.get("Retry-After")
+                            raise RetryableError(
+                                f"HTTP {response.status}",
+                                float(retry_after) if retry_after and retry_after.isdigit() else None,
+                            )
+                        response.raise_for_status()
+                        try:
+                            data = await response.json()
+                        except ValueError as e:  # a 200 with a truncated or HTML body: retry like a 5xx
+                            raise RetryableError(f"invalid JSON body: {e}")
+                content = data["choices"][0]["message"]["content"]
+                return content, data.get("usage") or {}
+            except (RetryableError, aiohttp.ClientConnectionError, asyncio.TimeoutError) as e:
+                if attempt == CONFIG['max_retries'] - 1:
+                    raise
+                delay = getattr(e, "retry_after", None) or min(
+                    CONFIG['backoff_max'], CONFIG['backoff_base'] * 2 ** attempt
+                )
+                delay *= random.uniform(0.8, 1.2)
+                self.stats["retries"] += 1
+                logger.warning(f"{self.provider}: {e!r}, retrying in {delay:.1f}s")
+                await asyncio.sleep(delay)
+        raise RuntimeError("unreachable")
+
+    async def run_batch(self, session: aiohttp.ClientSession, batch: Batch) -> None:
+        try:
+            output, usage = await self.complete(session, build_messages(batch))
+        except (aiohttp.ClientError, RetryableError, asyncio.TimeoutError, KeyError, IndexError, TypeError) as e:
+            logger.error(f"Batch of {len(batch.pages)} failed: {e!r}")
+            self.stats["failed"] += len(batch.pages)
+            return
+        if not isinstance(output, str) or not output.strip():
+            # null/empty content (refusals, filtered answers): nothing to cache or write
+            logger.error(f"Batch of {len(batch.pages)} failed: empty content")
+            self.stats["failed"] += len(batch.pages)
+            return
+        self.stats["prompt_tokens"] += usage.get("prompt_tokens", 0)
+        self.stats["completion_tokens"] += usage.get("completion_tokens", 0)
+
+        parts = split_packed(output, len(batch.pages))
+        if parts is None:
+            # the model mangled the markers: redo these pages one by one
+            logger.warning(f"Unpackable answer for {len(batch.pages)} pages, retrying individually")
+            for page in batch.pages:
+                await self.run_batch(session, Batch(pages=[page], tokens=estimate_tokens(page.text)))
+            return
+        for page, text in zip(batch.pages, parts):
+            self.cache.put(page.key, self.model, text, usage if len(batch.pages) == 1 else {})
+            self.write_output(page, text)
+            self.stats["pages"] += 1
+
+    async def run(self, pages: List[Page]) -> Dict[str, int]:
+        todo = []
+        for page in pages:
+            page.key = cache_key(self.model, page.text)
+            cached = self.cache.get(page.key)
+            if cached is not None:
+                if not (self.output_dir / page.rel).exists():
+                    self.write_output(page, cached)
+                self.stats["cached"] += 1
+            else:
+                todo.append(page)
+
+        batches = pack(todo, CONFIG['pack_token_budget'], CONFIG['pack_max_pages'])
+        logger.info(f"{len(pages)} pages: {self.stats['cached']} cached, {len(todo)} to clean in {len(batches)} requests")
+
+        queue: asyncio.Queue = asyncio.Queue()
+        for batch in batches:
+            queue.put_nowait(batch)
+
+        timeout = aiohttp.ClientTimeout(total=CONFIG['request_timeout'])
+        async with aiohttp.ClientSession(timeout=timeout) as session:
+            async def worker() -> None:
+                while True:
+                    try:
+                        batch = queue.get_nowait()
+                    except asyncio.QueueEmpty:
+                        return
+                    await self.run_batch(session, batch)
+
+            await asyncio.gather(*(worker() for _ in range(CONFIG['workers'])))
+        return self.stats
+
+
+def load_pages(data_dir: Path, pattern: str) -> List[Page]:
+    pages = []
+    for path in sorted(data_dir.glob(pattern)):
+        text = path.read_text(encoding="utf-8", errors="ignore").strip()
+        if text:
+            pages.append(Page(path=path, rel=path.relative_to(data_dir).as_posix(), text=text))
+    return pages
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("data_dir", type=Path)
+    parser.add_argument("output_dir", type=Path)
+    parser.add_argument("--provider", choices=sorted(PROVIDERS), default="openrouter")
+    parser.add_argument("--model", default=None, help="override the provider's default model")
+    parser.add_argument("--pattern", default="**/*_tag.txt", help="glob of pages to clean")
+    parser.add_argument("--cache", type=Path, default=None, help="cache db (default: <output_dir>/cache.sqlite)")
+    parser.add_argument("--workers", type=int, default=CONFIG['workers'])
+    parser.add_argument("--token-budget", type=int, default=CONFIG['pack_token_budget'])
+    args = parser.parse_args()
+
+    load_dotenv()
+    CONFIG['workers'] = args.workers
+    CONFIG['pack_token_budget'] = args.token_budget
+
+    pages = load_pages(args.data_dir, args.pattern)
+    if not pages:
+        print(f"No pages matching {args.pattern} under {args.data_dir}")
+        sys.exit(1)
+
+    cache = ResultCache(args.cache or args.output_dir / "cache.sqlite")
+    job = CleanupJob(args.provider, args.model, args.output_dir, cache)
+    started = time.perf_counter()
+    try:
+        stats = asyncio.run(job.run(pages))
+    except KeyboardInterrupt:
+        logger.info("Interrupted; finished pages are cached, rerun to resume")
+        sys.exit(1)
+    finally:
+        cache.close()
+    elapsed = time.perf_counter() - started
+    logger.info(
+        f"Done in {elapsed:.1f}s: {stats['pages']} cleaned, {stats['cached']} from cache, "
+        f"{stats['failed']} failed, {stats['requests']} requests ({stats['retries']} retries), "
+        f"{stats['prompt_tokens']} prompt / {stats['completion_tokens']} completion tokens"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+"""
+Local mock of an OpenAI-compatible chat completions endpoint.
+
+Used to exercise llm_cleanup.py without paying for (or waiting on) a real
+provider. The "model" drops tag lines that look like navigation and echoes
+the rest, keeping <<<PAGE n>>> markers so packed requests round-trip. It can
+inject latency, 429s and 500s to test rate limiting and retries.
+
+Usage:
+    python mock_llm_server.py [--port 8808] [--latency 0.2] [--rate-429 0.1] [--rate-500 0.05]
+"""
+
+import argparse
+import asyncio
+import random
+import re
+
+from aiohttp import web
+
+NAV_LINE_RE = re.compile(r"^\[(LI|P)\]\s*.{0,30}$")
+MARKER_RE = re.compile(r"^<<<PAGE \d+>>>$")
+
+
+def fake_cleanup(prompt: str) -> str:
+    # drop the instruction, keep everything after the first blank line
+    _, _, body = prompt.partition(": \n\n")
+    kept = [
+        line for line in body.splitlines()
+        if MARKER_RE.match(line) or not NAV_LINE_RE.match(line)
+    ]
+    return "\n".join(kept)
+
+
+def make_app(latency: float, rate_429: float, rate_500: float) -> web.Application:
+    stats = {"requests": 0}
+
+    async def chat_completions(request: web.Request) -> web.Response:
+        stats["requests"] += 1
+        payload = await request.json()
+        await asyncio.sleep(latency * random.uniform(0.5, 1.5))
+
+        roll = random.random()
+        if roll < rate_429:
+            return web.json_response({"error": {"message": "rate limited"}}, status=429,
+                                     headers={"Retry-After": "1"})
+        if roll < rate_429 + rate_500:
+            return web.json_response({"error": {"message": "upstream error"}}, status=500)
+
+        content = payload["messages"][-1]["content"]
+        if isinstance(content, list):
+            content = "".join(part.get("text", "") for part in content)
+        answer = fake_cleanup(content)
+        return web.json_response({
+            "id": f"mock-{stats['requests']}",
+            "object": "chat.completion",
+            "model": payload.get("model", "mock"),
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": answer},
+                         "finish_reason": "stop"}],
+            "usage": {"prompt_tokens": len(content) // 3, "completion_tokens": len(answer) // 3},
+        })
+
+    async def health(request: web.Request) -> web.Response:
+        return web.json_response({"status": "ok", **stats})
+
+    app = web.Application(client_max_size=32 * 1024 * 1024)
+    app.router.add_post("/v1/chat/completions", chat_completions)
+    app.router.add_get("/health", health)
+    return app
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Mock OpenAI-compatible chat server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8808)
+    parser.add_argument("--latency", type=float, default=0.2, help="mean seconds per request")
+    parser.add_argument("--rate-429", type=float, default=0.0)
+    parser.add_argument("--rate-500", type=float, default=0.0)
+    args = parser.parse_args()
+    web.run_app(make_app(args.latency, args.rate_429, args.rate_500), host=args.host, port=args.port)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+"""
+Local mock of a web search engine and the sites it links to.
+
+Used to exercise rag/realtime.py without touching DuckDuckGo or real sites.
+Pages are rebuilt as HTML from the crawled *_tag.txt files, so the extractor
+sees realistic content. /search ranks them by word overlap with the query and
+returns DDGS-style results pointing back at this server. Page latency, slow
+pages (beyond any sane budget) and errors can be injected.
+
+    GET /search?q=...&max_results=5   {"results": [{"title", "href", "body"}]}
+    GET /page/<n>                     HTML
+    GET /health                       request counters
+
+Usage:
+    python mock_search_server.py [--port 8809] [--latency 0.3] [--slow-rate 0.2] [--slow-seconds 10]
+        [--error-rate 0.05] [--search-latency 0.1]
+"""
+
+import argparse
+import asyncio
+import html
+import random
+import re
+from pathlib import Path
+
+from aiohttp import web
+
+from tag_sections import read_tag_file
+
+DATA_DIR = Path(__file__).resolve().parent / "data"
+WORD_RE = re.compile(r"\w+", re.UNICODE)
+HTML_TAGS = {"H1": "h1", "H2": "h2", "H3": "h3", "H4": "h4", "P": "p", "LI": "li"}
+
+
+def load_pages(data_dir: Path, limit: int):
+    pages = []
+    for path in sorted(data_dir.glob("*/*/*_tag.txt"))[:limit]:
+        page = read_tag_file(path)
+        if page.lines:
+            words = set(WORD_RE.findall(f"{page.title} {' '.join(t for _, t in page.lines)}".lower()))
+            pages.append((page, words))
+    return pages
+
+
+def render_html(page) -> str:
+    body = "\n".join(f"<{HTML_TAGS[tag]}>{html.escape(text)}</{HTML_TAGS[tag]}>" for tag, text in page.lines)
+    return (f"<html><head><meta charset=\"utf-8\"><title>{html.escape(page.title)}</title></head>"
+            f"<body><nav><a href=\"/\">Trang chủ</a></nav><article class=\"post-content\">\n{body}\n"
+            f"</article><footer>mock</footer></body></html>")
+
+
+def make_app(pages, latency: float, slow_rate: float, slow_seconds: float, error_rate: float,
+             search_latency: float) -> web.Application:
+    stats = {"searches": 0, "pages": 0, "slow": 0, "errors": 0}
+
+    async def search(request: web.Request) -> web.Response:
+        stats["searches"] += 1
+        await asyncio.sleep(search_latency)
+        query = set(WORD_RE.findall(request.query.get("q", "").lower()))
+        max_results = int(request.query.get("max_results", "5"))
+        ranked = sorted(range(len(pages)), key=lambda i: len(query & pages[i][1]), reverse=True)[:max_results]
+        base = f"{request.scheme}://{request.host}"
+        results = []
+        for i in ranked:
+            page = pages[i][0]
+            snippet = " ".join(text for tag, text in page.lines if tag == "P")[:300]
+            results.append({"title": page.title, "href": f"{base}/page/{i}", "body": snippet})
+        return web.json_response({"results": results})
+
+    async def page(request: web.Request) -> web.Response:
+        stats["pages"] += 1
+        i = int(request.match_info["n"])
+        if not 0 <= i < len(pages):
+            raise web.HTTPNotFound()
+        roll = random.random()
+        if roll < error_rate:
+            stats["errors"] += 1
+            return web.Response(status=503, text="upstream error")
+        if roll < error_rate + slow_rate:
+            stats["slow"] += 1
+            await asyncio.sleep(slow_seconds)
+        else:
+            await asyncio.sleep(latency * random.uniform(0.5, 1.5))
+        return web.Response(text=render_html(pages[i][0]), content_type="text/html", charset="utf-8")
+
+    async def health(request: web.Request) -> web.Response:
+        return web.json_response({"status": "ok", "pages_available": len(pages), **stats})
+
+    app = web.Application()
+    app.router.add_get("/search", search)
+    app.router.add_get("/page/{n}", page)
+    app.router.add_get("/health", health)
+    return app
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Mock search engine and web pages")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8809)
+    parser.add_argument("--data-dir", default=str(DATA_DIR))
+    parser.add_argument("--limit", type=int, default=1000, help="tag pages to serve")
+    parser.add_argument("--latency", type=float, default=0.3, help="mean seconds per page")
+    parser.add_argument("--slow-rate", type=float, default=0.2, help="share of pages that take --slow-seconds")
+    parser.add_argument("--slow-seconds", type=float, default=10.0)
+    parser.add_argument("--error-rate", type=float, default=0.05)
+    parser.add_argument("--search-latency", type=float, default=0.1)
+    args = parser.parse_args()
+    pages = load_pages(Path(args.data_dir), args.limit)
+    print(f"Serving {len(pages)} pages")
+    web.run_app(make_app(pages, args.latency, args.slow_rate, args.slow_seconds, args.error_rate,
+                         args.search_latency), host=args.host, port=args.port)
+
+
+if __name__ == "__main__":
+    main()
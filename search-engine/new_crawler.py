@@ -4,7 +4,6 @@ import time
 import json
 import os
 import requests
-from bs4 import BeautifulSoup
 import certifi
 import urllib3
 from duckduckgo_search import DDGS
@@ -13,6 +12,12 @@ import logging
 from dataclasses import dataclass
 import backoff
 
+from catalog import Catalog
+from extractor import extract
+from knowledge import KnowledgeBase
+from search_layer import crawl_queries, search_all
+from provinces import province_dict, category_dict
+
 # Configure logging
 logging.basicConfig(
     level=logging.INFO,
@@ -34,6 +39,7 @@ CONFIG = {
     'min_delay': 2,  # Minimum delay between requests
     'max_delay': 5,  # Maximum delay between requests
     'search_results_per_query': 3,
+    'save_html': False,  # keep raw pages next to the txt files (for extractor benchmarks)
     'user_agents': [
         "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/114.0.0.0 Safari/537.36",
         "Mozilla/5.0 (Windows NT 10.0; Win64; x64; rv:109.0) Gecko/20100101 Firefox/115.0",
@@ -41,77 +47,6 @@ CONFIG = {
     ]
 }
 
-province_dict = {
-    "THÀNH PHỐ HÀ NỘI": 1,
-    "THÀNH PHỐ HỒ CHÍ MINH": 2,
-    "THÀNH PHỐ HẢI PHÒNG": 3,
-    "THÀNH PHỐ ĐÀ NẴNG": 4,
-    "TỈNH HÀ GIANG": 5,
-    "TỈNH CAO BẰNG": 6,
-    "TỈNH LAI CHÂU": 7,
-    "TỈNH LÀO CAI": 8,
-    "TỈNH TUYÊN QUANG": 9,
-    "TỈNH LẠNG SƠN": 10,
-    "TỈNH BẮC KẠN": 11,
-    "TỈNH THÁI NGUYÊN": 12,
-    "TỈNH YÊN BÁI": 13,
-    "TỈNH SƠN LA": 14,
-    "TỈNH PHÚ THỌ": 15,
-    "TỈNH VĨNH PHÚC": 16,
-    "TỈNH QUẢNG NINH": 17,
-    "TỈNH BẮC GIANG": 18,
-    "TỈNH BẮC NINH": 19,
-    "TỈNH HẢI DƯƠNG": 21,
-    "TỈNH HƯNG YÊN": 22,
-    "TỈNH HÒA BÌNH": 23,
-    "TỈNH HÀ NAM": 24,
-    "TỈNH NAM ĐỊNH": 25,
-    "TỈNH THÁI BÌNH": 26,
-    "TỈNH NINH BÌNH": 27,
-    "TỈNH THANH HÓA": 28,
-    "TỈNH NGHỆ AN": 29,
-    "TỈNH HÀ TĨNH": 30,
-    "TỈNH QUẢNG BÌNH": 31,
-    "TỈNH QUẢNG TRỊ": 32,
-    "TỈNH THỪA THIÊN": 33,
-    "TỈNH QUẢNG NAM": 34,
-    "TỈNH QUẢNG NGÃI": 35,
-    "TỈNH KON TUM": 36,
-    "TỈNH BÌNH ĐỊNH": 37,
-    "TỈNH GIA LAI": 38,
-    "TỈNH PHÚ YÊN": 39,
-    "TỈNH ĐẮK LẮK": 40,
-    "TỈNH KHÁNH HÒA": 41,
-    "TỈNH LÂM ĐỒNG": 42,
-    "TỈNH BÌNH PHƯỚC": 43,
-    "TỈNH BÌNH DƯƠNG": 44,
-    "TỈNH NINH THUẬN": 45,
-    "TỈNH TÂY NINH": 46,
-    "TỈNH BÌNH THUẬN": 47,
-    "TỈNH ĐỒNG NAI": 48,
-    "TỈNH LONG AN": 49,
-    "TỈNH ĐỒNG THÁP": 50,
-    "TỈNH AN GIANG": 51,
-    "TỈNH BÀ RỊA": 52,
-    "TỈNH TIỀN GIANG": 53,
-    "TỈNH KIÊN GIANG": 54,
-    "THÀNH PHỐ CẦN THƠ": 55,
-    "TỈNH BẾN TRE": 56,
-    "TỈNH VĨNH LONG": 57,
-    "TỈNH TRÀ VINH": 58,
-    "TỈNH SÓC TRĂNG": 59,
-    "TỈNH BẠC LIÊU": 60,
-    "TỈNH CÀ MAU": 61,
-    "TỈNH ĐIỆN BIÊN": 62,
-    "TỈNH ĐĂK NÔNG": 63,
-    "TỈNH HẬU GIANG": 64,
-}
-# category: travel (in general), food with popular keywords to search
-category_dict = {
-    "travel": ["du lịch không thể bỏ qua", "must visit"],
-    "food": ["ăn uống ngon nổi tiếng", "favourite food"],
-}
-
 @dataclass
 class SearchResult:
     title: str
@@ -184,28 +119,14 @@ class WebCrawler:
             raise
 
     def parse_page(self, html: str, url: str) -> SearchResult:
-        """Parse the HTML content of a page"""
+        """Parse the HTML content of a page, keeping only the main content"""
         try:
-            soup = BeautifulSoup(html, "html.parser")
-            title = soup.title.string.strip() if soup.title else url
-            
-            # Get main content (more robust content extraction)
-            for unwanted in soup(["script", "style", "nav", "footer", "header"]):
-                unwanted.decompose()
-                
-            # Extract text from important elements
-            elements = []
-            for tag in soup.find_all(["h1", "h2", "h3", "h4", "p", "li"]):
-                if tag.text.strip():
-                    elements.append(f"[{tag.name.upper()}] {tag.get_text(strip=True)}")
-            
-            tag_content = "\n".join(elements)
-            
+            extracted = extract(html, url)
             return SearchResult(
-                title=title,
+                title=extracted.title,
                 url=url,
-                content=" ".join(soup.stripped_strings),
-                tag_content=tag_content
+                content=extracted.content,
+                tag_content=extracted.tag_content
             )
         except Exception as e:
             logger.error(f"Error parsing {url}: {str(e)}")
@@ -216,9 +137,14 @@ class WebCrawler:
                 tag_content=""
             )
 
-    def save_result(self, result: SearchResult, base_path: str, idx: int) -> Dict[str, str]:
+    def save_result(self, result: SearchResult, base_path: str, idx: int, html: Optional[str] = None) -> Dict[str, str]:
         """Save search result to files"""
         os.makedirs(base_path, exist_ok=True)
+
+        if html is not None and CONFIG['save_html']:
+            html_path = os.path.join(base_path, f"{idx}.html").replace("\\", "/")
+            with open(html_path, "w", encoding="utf-8") as f:
+                f.write(html)
         
         # Save as JSON
         json_path = os.path.join(base_path, f"{idx}.json").replace("\\", "/")
@@ -259,8 +185,12 @@ def main():
     
 
     crawler = WebCrawler()
+    catalog = Catalog()  # updated page by page; metadata.json is still written at the end
     metadata = {"provinces": []}
 
+    # every query up front, concurrently and through the search cache (see search_layer.py)
+    searched = search_all(crawl_queries(), max_results=CONFIG['search_results_per_query'])
+
     for province_name, province_id in province_dict.items():
     
         # expect no website visited more than once
@@ -289,10 +219,12 @@ def main():
                 logger.info(f"Searching for: {query}")
                 
                 try:
-                    search_results = crawler.search_with_retry(
-                        query, 
-                        max_results=CONFIG['search_results_per_query']
-                    )
+                    search_results = searched.get(query)
+                    if search_results is None:  # every provider failed; last resort, the old path
+                        search_results = crawler.search_with_retry(
+                            query, 
+                            max_results=CONFIG['search_results_per_query']
+                        )
 
                     # remove visited urls
                     search_results = [
@@ -310,9 +242,13 @@ def main():
                             file_paths = crawler.save_result(
                                 parsed,
                                 category_dir,
-                                len(category_data["items"]) + 1
+                                len(category_data["items"]) + 1,
+                                html=html
                             )
                             
+                            catalog.add(province_id, category_name, len(category_data["items"]) + 1,
+                                        parsed.url, parsed.title, file_paths, fetched_at=time.time())
+
                             # Update metadata
                             category_data["items"].append({
                                 "idx": len(category_data["items"]) + 1,
@@ -336,6 +272,10 @@ def main():
     # Save metadata
     with open("data/metadata.json", "w", encoding="utf-8") as f:
         json.dump(metadata, f, ensure_ascii=False, indent=2)
+    catalog.recluster()
+    with KnowledgeBase() as knowledge:  # province tables for instant list answers; re-reads new pages only
+        logger.info(f"Knowledge tables: {knowledge.build(catalog)}")
+    catalog.close()
     
     logger.info("Crawling completed successfully!")
 
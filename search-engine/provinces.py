@@ -0,0 +1,92 @@
+"""
+Province and category tables shared by the crawler and the export/index jobs.
+"""
+
+import unicodedata
+
+province_dict = {
+    "THÀNH PHỐ HÀ NỘI": 1,
+    "THÀNH PHỐ HỒ CHÍ MINH": 2,
+    "THÀNH PHỐ HẢI PHÒNG": 3,
+    "THÀNH PHỐ ĐÀ NẴNG": 4,
+    "TỈNH HÀ GIANG": 5,
+    "TỈNH CAO BẰNG": 6,
+    "TỈNH LAI CHÂU": 7,
+    "TỈNH LÀO CAI": 8,
+    "TỈNH TUYÊN QUANG": 9,
+    "TỈNH LẠNG SƠN": 10,
+    "TỈNH BẮC KẠN": 11,
+    "TỈNH THÁI NGUYÊN": 12,
+    "TỈNH YÊN BÁI": 13,
+    "TỈNH SƠN LA": 14,
+    "TỈNH PHÚ THỌ": 15,
+    "TỈNH VĨNH PHÚC": 16,
+    "TỈNH QUẢNG NINH": 17,
+    "TỈNH BẮC GIANG": 18,
+    "TỈNH BẮC NINH": 19,
+    "TỈNH HẢI DƯƠNG": 21,
+    "TỈNH HƯNG YÊN": 22,
+    "TỈNH HÒA BÌNH": 23,
+    "TỈNH HÀ NAM": 24,
+    "TỈNH NAM ĐỊNH": 25,
+    "TỈNH THÁI BÌNH": 26,
+    "TỈNH NINH BÌNH": 27,
+    "TỈNH THANH HÓA": 28,
+    "TỈNH NGHỆ AN": 29,
+    "TỈNH HÀ TĨNH": 30,
+    "TỈNH QUẢNG BÌNH": 31,
+    "TỈNH QUẢNG TRỊ": 32,
+    "TỈNH THỪA THIÊN": 33,
+    "TỈNH QUẢNG NAM": 34,
+    "TỈNH QUẢNG NGÃI": 35,
+    "TỈNH KON TUM": 36,
+    "TỈNH BÌNH ĐỊNH": 37,
+    "TỈNH GIA LAI": 38,
+    "TỈNH PHÚ YÊN": 39,
+    "TỈNH ĐẮK LẮK": 40,
+    "TỈNH KHÁNH HÒA": 41,
+    "TỈNH LÂM ĐỒNG": 42,
+    "TỈNH BÌNH PHƯỚC": 43,
+    "TỈNH BÌNH DƯƠNG": 44,
+    "TỈNH NINH THUẬN": 45,
+    "TỈNH TÂY NINH": 46,
+    "TỈNH BÌNH THUẬN": 47,
+    "TỈNH ĐỒNG NAI": 48,
+    "TỈNH LONG AN": 49,
+    "TỈNH ĐỒNG THÁP": 50,
+    "TỈNH AN GIANG": 51,
+    "TỈNH BÀ RỊA": 52,
+    "TỈNH TIỀN GIANG": 53,
+    "TỈNH KIÊN GIANG": 54,
+    "THÀNH PHỐ CẦN THƠ": 55,
+    "TỈNH BẾN TRE": 56,
+    "TỈNH VĨNH LONG": 57,
+    "TỈNH TRÀ VINH": 58,
+    "TỈNH SÓC TRĂNG": 59,
+    "TỈNH BẠC LIÊU": 60,
+    "TỈNH CÀ MAU": 61,
+    "TỈNH ĐIỆN BIÊN": 62,
+    "TỈNH ĐĂK NÔNG": 63,
+    "TỈNH HẬU GIANG": 64,
+}
+# category: travel (in general), food with popular keywords to search
+category_dict = {
+    "travel": ["du lịch không thể bỏ qua", "must visit"],
+    "food": ["ăn uống ngon nổi tiếng", "favourite food"],
+}
+
+
+def fold(text: str) -> str:
+    """ASCII-fold Vietnamese text ("Hồ Chí Minh" -> "Ho Chi Minh")."""
+    decomposed = unicodedata.normalize("NFD", text.replace("đ", "d").replace("Đ", "D"))
+    return "".join(c for c in decomposed if unicodedata.category(c) != "Mn")
+
+
+def province_slug(name: str) -> str:
+    """File stem used for tex/ and travel/ files ("TỈNH HÀ GIANG" -> "tinh_ha_giang")."""
+    return fold(name).lower().replace(" ", "_")
+
+
+def province_title(name: str) -> str:
+    """Display name ("TỈNH HÀ GIANG" -> "Tỉnh Hà Giang")."""
+    return name.title()
@@ -0,0 +1,29 @@
+"""
+Async request rate limiting shared by the LLM cleanup job and the search layer.
+"""
+
+import asyncio
+import time
+from typing import Optional
+
+
+class TokenBucket:
+    """Async rate limiter: `rate` requests per minute with a burst of `capacity`."""
+
+    def __init__(self, requests_per_minute: float, capacity: Optional[float] = None):
+        self.rate = requests_per_minute / 60.0
+        self.capacity = capacity or max(1.0, self.rate * 5)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = asyncio.Lock()
+
+    async def acquire(self) -> None:
+        async with self.lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
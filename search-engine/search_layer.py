@@ -0,0 +1,342 @@
+#!/usr/bin/env python3
+"""
+Cached, rate-limited web search over a pool of providers.
+
+The crawler asked DuckDuckGo every query on every run (with 2-5 s sleeps),
+and the notebooks hit Google Custom Search and googlesearch separately.
+This layer sits in front of all of them:
+
+    - persistent cache in SQLite keyed by the normalized query (NFC,
+      lowercase, single spaces) and result count, valid for --ttl-days
+    - a pool of providers tried in priority order (ddgs, google_cse, local);
+      a provider that is rate limited or failing is cooled down and the next
+      one answers, one whose daily quota is used up is skipped
+    - per-provider request rate (rate_limit.TokenBucket, as in llm_cleanup.py),
+      concurrency cap and daily quota; quota counts live in the same SQLite
+      file, so they survive restarts
+    - identical queries issued concurrently hit the provider once
+
+Results are DDGS-shaped dicts ({"title", "href", "body"}) plus "provider".
+
+Usage:
+    python search_layer.py [--providers ddgs,google_cse,local] [--results 3] [--ttl-days 30]
+        [--cache data/search_cache.sqlite] [--out queries.json]
+
+Without arguments it issues every province x category x term query the
+crawler needs (see provinces.py) concurrently and reports cache hits and
+provider usage; new_crawler.py calls search_all() the same way.
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import sqlite3
+import sys
+import time
+import unicodedata
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence
+
+import aiohttp
+
+from provinces import category_dict, province_dict
+from rate_limit import TokenBucket
+
+logger = logging.getLogger(__name__)
+
+PROVIDERS = {
+    "ddgs": {
+        "requests_per_minute": 20,
+        "max_concurrency": 2,
+        "daily_quota": None,
+    },
+    "google_cse": {
+        "url": "https://www.googleapis.com/customsearch/v1",
+        "api_key_env": "GOOGLE_API_KEY",
+        "cx_env": "GOOGLE_CSE_ID",
+        "requests_per_minute": 60,
+        "max_concurrency": 4,
+        "daily_quota": 100,  # free tier
+    },
+    "local": {
+        "url": "http://127.0.0.1:8809/search",  # mock_search_server.py
+        "requests_per_minute": 6000,
+        "max_concurrency": 32,
+        "daily_quota": None,
+    },
+}
+
+CONFIG = {
+    'cache_path': "data/search_cache.sqlite",
+    'ttl_days': 30,
+    'request_timeout': 20,   # seconds
+    'cooldown': 60.0,        # seconds a rate-limited provider is skipped
+    'max_failures': 3,       # consecutive errors before a provider is cooled down
+}
+
+
+class RateLimited(Exception):
+    pass
+
+
+class NoProviderAvailable(Exception):
+    pass
+
+
+def normalize_query(query: str) -> str:
+    return " ".join(unicodedata.normalize("NFC", query).lower().split())
+
+
+class SearchCache:
+    """SQLite cache of search results plus per-provider daily request counts."""
+
+    def __init__(self, path: Path):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self.conn = sqlite3.connect(str(path))
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS searches ("
+            " query TEXT, max_results INTEGER, provider TEXT, results TEXT, created REAL,"
+            " PRIMARY KEY (query, max_results))"
+        )
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS quota (provider TEXT, day TEXT, used INTEGER, PRIMARY KEY (provider, day))"
+        )
+        self.conn.commit()
+
+    def get(self, query: str, max_results: int, ttl: float) -> Optional[List[Dict]]:
+        row = self.conn.execute(
+            "SELECT results, created FROM searches WHERE query = ? AND max_results = ?", (query, max_results)
+        ).fetchone()
+        if row is None or time.time() - row[1] > ttl:
+            return None
+        return json.loads(row[0])
+
+    def put(self, query: str, max_results: int, provider: str, results: List[Dict]) -> None:
+        self.conn.execute(
+            "INSERT OR REPLACE INTO searches VALUES (?, ?, ?, ?, ?)",
+            (query, max_results, provider, json.dumps(results, ensure_ascii=False), time.time()),
+        )
+        self.conn.commit()
+
+    def used_today(self, provider: str) -> int:
+        row = self.conn.execute(
+            "SELECT used FROM quota WHERE provider = ? AND day = ?", (provider, time.strftime("%Y-%m-%d"))
+        ).fetchone()
+        return row[0] if row else 0
+
+    def count(self, provider: str) -> None:
+        self.conn.execute(
+            "INSERT INTO quota VALUES (?, ?, 1) ON CONFLICT (provider, day) DO UPDATE SET used = used + 1",
+            (provider, time.strftime("%Y-%m-%d")),
+        )
+        self.conn.commit()
+
+    def close(self) -> None:
+        self.conn.close()
+
+
+class Provider:
+    def __init__(self, name: str, settings: Dict):
+        self.name = name
+        self.settings = settings
+        self.bucket = TokenBucket(settings["requests_per_minute"])
+        self.semaphore = asyncio.Semaphore(settings["max_concurrency"])
+        self.daily_quota = settings.get("daily_quota")
+        self.cooldown_until = 0.0
+        self.failures = 0
+        self.stats = {"requests": 0, "errors": 0, "rate_limited": 0}
+
+    def available(self, cache: SearchCache) -> bool:
+        if time.monotonic() < self.cooldown_until:
+            return False
+        return self.daily_quota is None or cache.used_today(self.name) < self.daily_quota
+
+    def cool_down(self) -> None:
+        self.cooldown_until = time.monotonic() + CONFIG['cooldown']
+        self.failures = 0
+
+    async def query(self, session: aiohttp.ClientSession, query: str, max_results: int) -> List[Dict]:
+        raise NotImplementedError
+
+
+class DDGSProvider(Provider):
+    async def query(self, session: aiohttp.ClientSession, query: str, max_results: int) -> List[Dict]:
+        from duckduckgo_search import DDGS
+
+        def run():
+            with DDGS() as ddgs:
+                return list(ddgs.text(query, max_results=max_results))
+
+        try:
+            results = await asyncio.get_running_loop().run_in_executor(None, run)
+        except Exception as e:
+            if "Ratelimit" in str(e):
+                raise RateLimited(str(e))
+            raise
+        return [{"title": r.get("title", ""), "href": r["href"], "body": r.get("body", "")} for r in results]
+
+
+class GoogleCSEProvider(Provider):
+    async def query(self, session: aiohttp.ClientSession, query: str, max_results: int) -> List[Dict]:
+        key, cx = os.getenv(self.settings["api_key_env"]), os.getenv(self.settings["cx_env"])
+        if not key or not cx:
+            raise RuntimeError(f"{self.settings['api_key_env']} / {self.settings['cx_env']} not set")
+        params = {"q": query, "key": key, "cx": cx, "num": str(min(max_results, 10))}
+        async with session.get(self.settings["url"], params=params) as resp:
+            if resp.status in (429, 403):  # 403 is how CSE reports an exhausted daily quota
+                raise RateLimited(f"HTTP {resp.status}")
+            resp.raise_for_status()
+            items = (await resp.json()).get("items", [])
+        return [{"title": i.get("title", ""), "href": i["link"], "body": i.get("snippet", "")} for i in items]
+
+
+class LocalProvider(Provider):
+    async def query(self, session: aiohttp.ClientSession, query: str, max_results: int) -> List[Dict]:
+        async with session.get(self.settings["url"], params={"q": query, "max_results": str(max_results)}) as resp:
+            if resp.status == 429:
+                raise RateLimited("HTTP 429")
+            resp.raise_for_status()
+            return [{"title": r.get("title", ""), "href": r["href"], "body": r.get("body", "")}
+                    for r in (await resp.json())["results"]]
+
+
+PROVIDER_CLASSES = {"ddgs": DDGSProvider, "google_cse": GoogleCSEProvider, "local": LocalProvider}
+
+
+class SearchPool:
+    def __init__(self, providers: Sequence[str], cache: SearchCache, ttl_days: float = CONFIG['ttl_days']):
+        self.providers = [PROVIDER_CLASSES[name](name, PROVIDERS[name]) for name in providers]
+        self.cache = cache
+        self.ttl = ttl_days * 86400
+        self.inflight: Dict[tuple, asyncio.Future] = {}
+        self.stats = {"queries": 0, "cache_hits": 0, "deduplicated": 0, "failovers": 0, "failed": 0}
+
+    async def search(self, session: aiohttp.ClientSession, query: str, max_results: int = 3) -> List[Dict]:
+        self.stats["queries"] += 1
+        key = (normalize_query(query), max_results)
+        cached = self.cache.get(*key, self.ttl)
+        if cached is not None:
+            self.stats["cache_hits"] += 1
+            return cached
+        if key in self.inflight:
+            self.stats["deduplicated"] += 1
+            return await asyncio.shield(self.inflight[key])
+
+        future = asyncio.get_running_loop().create_future()
+        self.inflight[key] = future
+        try:
+            results = await self._ask_providers(session, query, *key)
+            future.set_result(results)
+            return results
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            future.exception()  # mark retrieved: nobody else may be waiting
+            raise
+        finally:
+            del self.inflight[key]
+
+    async def _ask_providers(self, session: aiohttp.ClientSession, query: str, normalized: str,
+                             max_results: int) -> List[Dict]:
+        errors = []
+        for n, provider in enumerate(self.providers):
+            if not provider.available(self.cache):
+                errors.append(f"{provider.name}: cooling down or out of quota")
+                continue
+            try:
+                async with provider.semaphore:
+                    await provider.bucket.acquire()
+                    if not provider.available(self.cache):  # cooled down while this query waited
+                        errors.append(f"{provider.name}: cooling down or out of quota")
+                        continue
+                    provider.stats["requests"] += 1
+                    self.cache.count(provider.name)
+                    results = await provider.query(session, query, max_results)
+            except RateLimited as e:
+                provider.stats["rate_limited"] += 1
+                provider.cool_down()
+                errors.append(f"{provider.name}: rate limited ({e})")
+                continue
+            except Exception as e:  # network errors, bad responses, missing credentials
+                provider.stats["errors"] += 1
+                provider.failures += 1
+                if provider.failures >= CONFIG['max_failures']:
+                    provider.cool_down()
+                errors.append(f"{provider.name}: {type(e).__name__}: {e}")
+                continue
+            provider.failures = 0
+            if n > 0:
+                self.stats["failovers"] += 1
+            results = [{**r, "provider": provider.name} for r in results]
+            self.cache.put(normalized, max_results, provider.name, results)
+            return results
+        self.stats["failed"] += 1
+        raise NoProviderAvailable("; ".join(errors))
+
+    async def search_many(self, queries: Sequence[str], max_results: int = 3) -> Dict[str, Optional[List[Dict]]]:
+        """All queries concurrently; providers' rate limits and caps do the pacing."""
+        timeout = aiohttp.ClientTimeout(total=CONFIG['request_timeout'])
+        async with aiohttp.ClientSession(timeout=timeout) as session:
+            async def one(query):
+                try:
+                    return await self.search(session, query, max_results)
+                except NoProviderAvailable as e:
+                    logger.error(f"Search failed for '{query}': {e}")
+                    return None
+
+            results = await asyncio.gather(*(one(q) for q in queries))
+        return dict(zip(queries, results))
+
+
+def crawl_queries() -> List[str]:
+    """The crawler's province x category x term queries, in its order."""
+    return [f"{term} {province}" for province in province_dict for terms in category_dict.values() for term in terms]
+
+
+def search_all(queries: Sequence[str], providers: Sequence[str] = ("ddgs", "google_cse"), max_results: int = 3,
+               cache_path: str = CONFIG['cache_path'], ttl_days: float = CONFIG['ttl_days']) -> Dict[str, Optional[List[Dict]]]:
+    """Blocking entry point for the (synchronous) crawler."""
+    cache = SearchCache(Path(cache_path))
+    pool = SearchPool(providers, cache, ttl_days)
+    try:
+        results = asyncio.run(pool.search_many(list(queries), max_results))
+    finally:
+        cache.close()
+    logger.info(f"Search: {pool.stats}; " + ", ".join(f"{p.name} {p.stats}" for p in pool.providers))
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--providers", default="ddgs,google_cse", help=f"priority order, from {sorted(PROVIDERS)}")
+    parser.add_argument("--results", type=int, default=3, help="results per query")
+    parser.add_argument("--ttl-days", type=float, default=CONFIG['ttl_days'])
+    parser.add_argument("--cache", default=CONFIG['cache_path'])
+    parser.add_argument("--query", action="append", help="query to run instead of the crawler's (repeatable)")
+    parser.add_argument("--out", default=None, help="write {query: results} as JSON")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    providers = [p.strip() for p in args.providers.split(",") if p.strip()]
+    unknown = set(providers) - set(PROVIDERS)
+    if unknown:
+        print(f"Unknown provider(s): {', '.join(sorted(unknown))}")
+        sys.exit(1)
+
+    queries = args.query or crawl_queries()
+    started = time.perf_counter()
+    results = search_all(queries, providers, args.results, args.cache, args.ttl_days)
+    answered = sum(r is not None for r in results.values())
+    logger.info(f"{answered}/{len(queries)} queries answered in {time.perf_counter() - started:.1f}s")
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
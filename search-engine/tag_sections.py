@@ -0,0 +1,96 @@
+"""
+Read crawled *_tag.txt pages and split them into heading sections.
+
+A tag page looks like:
+    Title: ...
+    URL: ...
+
+    Content with tag:
+    [H2] 1. Cột Cờ Lũng Cú
+    [P] ...
+    [LI] ...
+
+Every H2/H3 heading opens a section that runs until the next heading; an
+empty H2 directly above an H3 (a category header) is dropped. H1 closes the
+current section (it starts a new article) and H4 is treated as body text.
+"""
+
+import re
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import List, Optional
+
+TAG_LINE_RE = re.compile(r"^\[(H[1-4]|P|LI)\]\s*(.*)$")
+# "1. ", "01) ", "Top 3: " style list numbering in front of a heading
+NUMBERING_RE = re.compile(r"^(?:top\s*)?\d{1,3}\s*[.):\-–]\s*", re.IGNORECASE)
+SECTION_LEVELS = {"H2": 2, "H3": 3}
+
+
+@dataclass
+class TagPage:
+    path: str
+    title: str
+    url: str
+    lines: List[tuple] = field(default_factory=list)  # (tag, text)
+
+
+@dataclass
+class Section:
+    heading: str
+    level: int
+    lines: List[str] = field(default_factory=list)
+    url: str = ""
+    path: str = ""
+    ordinal: int = 0
+
+    @property
+    def text(self) -> str:
+        return "\n".join(self.lines)
+
+
+def read_tag_file(path) -> TagPage:
+    title = url = ""
+    lines = []
+    with open(path, "r", encoding="utf-8", errors="ignore") as f:
+        for raw in f:
+            raw = raw.rstrip("\n")
+            if not lines:
+                if raw.startswith("Title:") and not title:
+                    title = raw[len("Title:"):].strip()
+                    continue
+                if raw.startswith("URL:") and not url:
+                    url = raw[len("URL:"):].strip()
+                    continue
+            match = TAG_LINE_RE.match(raw)
+            if match and match.group(2).strip():
+                lines.append((match.group(1), match.group(2).strip()))
+    return TagPage(path=str(path), title=title, url=url, lines=lines)
+
+
+def clean_heading(text: str) -> str:
+    return NUMBERING_RE.sub("", text).strip(" :-–")
+
+
+def split_sections(page: TagPage, min_chars: int = 0) -> List[Section]:
+    """Split a page into heading sections (text before the first heading is dropped)."""
+    sections: List[Section] = []
+    current: Optional[Section] = None
+    for tag, text in page.lines:
+        level = SECTION_LEVELS.get(tag)
+        if level is not None:
+            if current is not None and level > current.level and not current.lines:
+                # "H2 Ẩm thực" directly followed by "H3 Phở": the H3 is the real item
+                sections.pop()
+            current = Section(heading=clean_heading(text), level=level, url=page.url,
+                              path=page.path, ordinal=len(sections))
+            sections.append(current)
+        elif tag == "H1":
+            current = None
+        elif current is not None:
+            current.lines.append(text)
+    return [s for s in sections if s.heading and len(s.text) >= min_chars]
+
+
+def iter_sections(paths, min_chars: int = 0):
+    for path in paths:
+        yield from split_sections(read_tag_file(Path(path)), min_chars=min_chars)
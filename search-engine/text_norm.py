@@ -0,0 +1,307 @@
+#!/usr/bin/env python3
+"""
+Text Normalization Pipeline
+
+Normalizes every text file under an input directory and writes the result to
+a mirrored output tree; the crawled files are never modified. Files are
+streamed line by line and spread over a process pool. Files whose content has
+not changed since the last run (same mtime/size, or same hash) are skipped.
+
+Rules (compiled once per worker):
+    - Unicode NFC (Vietnamese diacritics in one canonical form)
+    - drop control characters, emoji and pictographs
+    - collapse runs of spaces/tabs, trim lines, squeeze blank lines
+    - drop boilerplate lines (login, a bare "Hotline:" label, share, cookie,
+      ads, ...); contact numbers are kept
+    - drop a line repeated right after itself
+    - optional diacritic folding ("Hà Nội" -> "Ha Noi")
+
+Digits and punctuation are kept: prices, dates and opening hours matter.
+
+Usage:
+    python text_norm.py <input_dir> <output_dir> [--fold-diacritics] [--workers N]
+
+Example:
+    python text_norm.py ./data ./data_norm
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import re
+import sys
+import time
+import unicodedata
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+# the folding province matching uses, so analyzers and province keys agree
+from provinces import fold as fold_diacritics
+
+TEXT_SUFFIXES = (".txt", ".text", "")
+MANIFEST_NAME = ".text_norm_manifest.json"
+# Bump when the rules change so old outputs are rebuilt.
+RULES_VERSION = 2
+
+# Lines made only of these (after the [TAG] prefix) are navigation/ads.
+BOILERPLATE_PATTERNS = [
+    r"đăng nhập", r"đăng ký", r"đăng xuất", r"login", r"sign ?(in|up)",
+    r"hotline", r"liên hệ( quảng cáo)?", r"quảng cáo", r"advertisement",
+    r"chia sẻ( bài viết)?", r"share( this)?", r"bình luận", r"comments?",
+    r"xem thêm", r"đọc thêm", r"read more", r"tin liên quan", r"bài viết liên quan",
+    r"related (posts|articles)", r"theo dõi chúng tôi", r"follow us",
+    r"trang chủ", r"home", r"menu", r"tìm kiếm", r"search",
+    r"mới nhất", r"copyright.*", r"©.*", r"bản quyền.*",
+    r".*cookies?.*", r"mở ứng dụng", r"tải ứng dụng", r"download (the )?app",
+]
+
+_state: Dict[str, object] = {}
+
+
+@dataclass
+class Options:
+    fold_diacritics: bool = False
+    max_boilerplate_len: int = 80
+
+    def fingerprint(self) -> str:
+        return f"v{RULES_VERSION}-fold{int(self.fold_diacritics)}-bp{self.max_boilerplate_len}"
+
+
+def compile_rules() -> Dict[str, object]:
+    """Compile every regex once; called lazily in each worker process."""
+    return {
+        "tag_prefix": re.compile(r"^(\[[A-Z0-9]+\]\s*)?(.*)$", re.DOTALL),
+        "boilerplate": re.compile(
+            r"^(?:" + "|".join(BOILERPLATE_PATTERNS) + r")[\s.:|/-]*$", re.IGNORECASE
+        ),
+        "spaces": re.compile(r"[ \t\u00a0\u2000-\u200a\u202f\u205f\u3000]+"),
+        # C0/C1 controls except \n, \t; zero-width chars; BOM
+        "controls": re.compile(r"[\x00-\x08\x0b-\x1f\x7f-\x9f\u200b-\u200f\u202a-\u202e\ufeff]"),
+        # emoji, pictographs, dingbats, variation selectors, keycaps
+        "symbols": re.compile(
+            "[\U0001F000-\U0001FAFF\U00002600-\U000027BF\U0000FE00-\U0000FE0F"
+            "\U0001F1E6-\U0001F1FF\U000020E3\U00002B00-\U00002BFF]"
+        ),
+    }
+
+
+def _rules() -> Dict[str, object]:
+    if "rules" not in _state:
+        _state["rules"] = compile_rules()
+    return _state["rules"]
+
+
+WORD_RE = re.compile(r"[^\W\d_]+")
+VIETNAMESE_LETTERS = set("àáảãạăằắẳẵặâầấẩẫậèéẻẽẹêềếểễệìíỉĩịòóỏõọôồốổỗộơờớởỡợùúủũụưừứửữựỳýỷỹỵđ")
+# frequent words people type without diacritics, and their English counterparts
+VIETNAMESE_WORDS = {"va", "cua", "la", "co", "cho", "nhung", "mot", "cac", "den", "nao", "gi", "khong",
+                    "nhat", "nen", "di", "o", "du", "lich", "mon", "ngon", "tinh", "thanh", "pho"}
+ENGLISH_WORDS = {"the", "and", "of", "to", "in", "is", "are", "what", "where", "which", "how", "for",
+                 "a", "an", "best", "should", "i", "do", "can", "with", "visit", "food", "eat", "try"}
+
+
+def detect_language(text: str, min_share: float = 0.15) -> str:
+    """
+    "vi", "en" or "und" from diacritics and function words; good enough for
+    pages and queries. A tie goes to "vi" only if some word carries Vietnamese
+    diacritics, so "Pho in Hanoi" is English.
+    """
+    words = WORD_RE.findall(unicodedata.normalize("NFC", text).lower())
+    if not words:
+        return "und"
+    marked = sum(1 for w in words if not VIETNAMESE_LETTERS.isdisjoint(w))
+    vi = marked + sum(1 for w in words if w in VIETNAMESE_WORDS and VIETNAMESE_LETTERS.isdisjoint(w))
+    en = sum(1 for w in words if w in ENGLISH_WORDS)
+    if vi / len(words) >= min_share and (vi > en or (vi == en and marked)):
+        return "vi"
+    if en or all(w.isascii() for w in words):
+        return "en"
+    return "und"
+
+
+def normalize_lines(lines: Iterable[str], options: Options) -> Iterator[str]:
+    """Normalize a stream of lines; yields output lines without newlines."""
+    rules = _rules()
+    previous = None
+    blank = False
+    for raw in lines:
+        line = unicodedata.normalize("NFC", raw.rstrip("\r\n"))
+        line = rules["controls"].sub("", line)
+        line = rules["symbols"].sub("", line)
+        line = rules["spaces"].sub(" ", line).strip()
+
+        if not line:
+            # squeeze runs of blank lines into one
+            if not blank and previous is not None:
+                blank = True
+                yield ""
+            continue
+
+        body = rules["tag_prefix"].match(line).group(2).strip()
+        if not body:
+            continue
+        if len(body) <= options.max_boilerplate_len and rules["boilerplate"].match(body):
+            continue
+        if options.fold_diacritics:
+            line = fold_diacritics(line)
+        if line == previous:
+            continue
+        previous = line
+        blank = False
+        yield line
+
+
+def normalize_text(text: str, options: Optional[Options] = None) -> str:
+    """Normalize a whole string (convenience wrapper around normalize_lines)."""
+    return "\n".join(normalize_lines(text.splitlines(), options or Options())).strip()
+
+
+def file_digest(path: Path) -> str:
+    h = hashlib.sha1()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 16), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def process_file(task: Tuple[str, str, Options]) -> Tuple[str, int, int, Optional[str]]:
+    """Worker: stream one file to its output path. Returns (src, bytes in, bytes out, error)."""
+    src, dst, options = task
+    tmp = dst + ".tmp"
+    try:
+        os.makedirs(os.path.dirname(dst), exist_ok=True)
+        written = 0
+        with open(src, "r", encoding="utf-8") as fin, open(tmp, "w", encoding="utf-8") as fout:
+            for line in normalize_lines(fin, options):
+                fout.write(line)
+                fout.write("\n")
+                written += len(line.encode("utf-8")) + 1
+        os.replace(tmp, dst)
+        return src, os.path.getsize(src), written, None
+    except (UnicodeDecodeError, OSError) as e:
+        try:
+            os.remove(tmp)
+        except OSError:
+            pass
+        return src, 0, 0, "not UTF-8" if isinstance(e, UnicodeDecodeError) else str(e)
+
+
+def load_manifest(output_dir: Path) -> Dict[str, Dict]:
+    path = output_dir / MANIFEST_NAME
+    if not path.exists():
+        return {}
+    try:
+        return json.loads(path.read_text(encoding="utf-8"))
+    except (OSError, json.JSONDecodeError):
+        return {}
+
+
+def save_manifest(output_dir: Path, manifest: Dict[str, Dict]) -> None:
+    path = output_dir / MANIFEST_NAME
+    tmp = path.with_suffix(".tmp")
+    tmp.write_text(json.dumps(manifest, ensure_ascii=False, indent=1), encoding="utf-8")
+    os.replace(tmp, path)
+
+
+def plan(input_dir: Path, output_dir: Path, options: Options, manifest: Dict[str, Dict]):
+    """Split files into work and skipped; updates manifest entries for new work."""
+    todo: List[Tuple[str, str, Options]] = []
+    pending: Dict[str, Dict] = {}
+    skipped = 0
+    fingerprint = options.fingerprint()
+    for path in sorted(input_dir.glob("**/*")):
+        if not path.is_file() or path.suffix.lower() not in TEXT_SUFFIXES or path.name.startswith("."):
+            continue
+        rel = path.relative_to(input_dir).as_posix()
+        dst = output_dir / rel
+        stat = path.stat()
+        entry = manifest.get(rel)
+        if entry and entry.get("rules") == fingerprint and dst.exists():
+            if entry.get("mtime") == stat.st_mtime_ns and entry.get("size") == stat.st_size:
+                skipped += 1
+                continue
+            # touched but maybe not changed: fall back to the content hash
+            digest = file_digest(path)
+            if entry.get("sha1") == digest:
+                entry["mtime"] = stat.st_mtime_ns
+                skipped += 1
+                continue
+        else:
+            digest = file_digest(path)
+        pending[rel] = {"mtime": stat.st_mtime_ns, "size": stat.st_size, "sha1": digest, "rules": fingerprint}
+        todo.append((str(path), str(dst), options))
+    return todo, pending, skipped
+
+
+def run(input_dir: Path, output_dir: Path, options: Options, workers: Optional[int] = None) -> Dict[str, float]:
+    started = time.perf_counter()
+    output_dir.mkdir(parents=True, exist_ok=True)
+    manifest = load_manifest(output_dir)
+    todo, pending, skipped = plan(input_dir, output_dir, options, manifest)
+
+    bytes_in = bytes_out = 0
+    errors = 0
+    if todo:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            chunksize = max(1, len(todo) // ((workers or os.cpu_count() or 1) * 8))
+            for src, n_in, n_out, error in pool.map(process_file, todo, chunksize=chunksize):
+                rel = Path(src).relative_to(input_dir).as_posix()
+                if error:
+                    errors += 1
+                    print(f"Warning: {src}: {error}. Skipping.")
+                    continue
+                manifest[rel] = pending[rel]
+                bytes_in += n_in
+                bytes_out += n_out
+    save_manifest(output_dir, manifest)
+
+    elapsed = time.perf_counter() - started
+    done = len(todo) - errors
+    return {
+        "processed": done,
+        "skipped": skipped,
+        "errors": errors,
+        "seconds": elapsed,
+        "files_per_s": done / elapsed if elapsed else 0.0,
+        "mb_per_s": bytes_in / 1e6 / elapsed if elapsed else 0.0,
+        "size_ratio": bytes_out / bytes_in if bytes_in else 1.0,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("input_dir", type=Path)
+    parser.add_argument("output_dir", type=Path)
+    parser.add_argument("--fold-diacritics", action="store_true", help="also strip Vietnamese diacritics")
+    parser.add_argument("--workers", type=int, default=None, help="worker processes (default: CPU count)")
+    args = parser.parse_args()
+
+    input_dir = args.input_dir.resolve()
+    output_dir = args.output_dir.resolve()
+    if not input_dir.is_dir():
+        print(f"Error: Directory does not exist: {input_dir}")
+        sys.exit(1)
+    if output_dir == input_dir or input_dir in output_dir.parents:
+        print("Error: output_dir must be outside input_dir")
+        sys.exit(1)
+
+    print(f"Normalizing {input_dir} -> {output_dir}")
+    try:
+        stats = run(input_dir, output_dir, Options(fold_diacritics=args.fold_diacritics), args.workers)
+    except KeyboardInterrupt:
+        print("\nOperation cancelled by user.")
+        sys.exit(1)
+
+    print(
+        f"\nProcessed {stats['processed']} files, skipped {stats['skipped']} unchanged, "
+        f"{stats['errors']} errors in {stats['seconds']:.2f}s "
+        f"({stats['files_per_s']:.1f} files/s, {stats['mb_per_s']:.2f} MB/s, "
+        f"output {100 * stats['size_ratio']:.0f}% of input)"
+    )
+
+
+if __name__ == "__main__":
+    main()
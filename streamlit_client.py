@@ -0,0 +1,71 @@
+import json
+import os
+import requests
+import streamlit as st
+
+# Thin UI over the RAG HTTP service (python -m rag.server): no models are loaded here,
+# so any number of Streamlit workers can share one copy of the LLM.
+SERVER_URL = os.getenv("RAG_SERVER_URL", "http://127.0.0.1:8900")
+ALL_PROVINCES = "Tất cả"
+
+st.title("Du lịch và Ẩm thực Việt Nam")
+
+@st.cache_data(ttl=300)
+def load_provinces():
+    response = requests.get(f"{SERVER_URL}/provinces", timeout=10)
+    response.raise_for_status()
+    return response.json()["provinces"]
+
+def stream_answer(payload):
+    """Yield (event, data) pairs from the /answer/stream Server-Sent Events."""
+    with requests.post(f"{SERVER_URL}/answer/stream", json=payload, stream=True, timeout=(10, 600)) as response:
+        if response.status_code != 200:
+            try:
+                message = response.json().get("error", response.text)
+            except ValueError:
+                message = response.text
+            yield "error", {"error": f"{response.status_code}: {message}"}
+            return
+        event = None
+        for line in response.iter_lines(decode_unicode=True):
+            if line.startswith("event: "):
+                event = line[len("event: "):]
+            elif line.startswith("data: "):
+                yield event, json.loads(line[len("data: "):])
+
+try:
+    provinces = load_provinces()
+except requests.RequestException as e:
+    st.error(f"Không kết nối được tới máy chủ RAG ({SERVER_URL}): {e}")
+    st.stop()
+
+selected_province = st.selectbox("Chọn tỉnh:", [ALL_PROVINCES] + provinces)
+template = st.radio("Kiểu prompt:", ["oneshot_cot", "fewshot_tot"], horizontal=True)
+
+user_question = st.text_input(f"Nhập câu hỏi của bạn về {selected_province}:")
+if st.button("Hỏi"):
+    if user_question:
+        payload = {
+            "question": user_question,
+            "province": None if selected_province == ALL_PROVINCES else selected_province,
+            "topk": 5,
+            "template": template,
+        }
+        contexts, answer = [], ""
+        st.write("**Câu trả lời:**")
+        placeholder = st.empty()
+        with st.spinner("Đang xử lý..."):
+            for event, data in stream_answer(payload):
+                if event == "contexts":
+                    contexts = data
+                elif event == "token":
+                    answer += data
+                    placeholder.write(answer)
+                elif event == "error":
+                    st.error(data["error"])
+        with st.expander("Ngữ cảnh được sử dụng"):
+            for i, context in enumerate(contexts):
+                st.write(f"**Ngữ cảnh {i+1}:**")
+                st.write(context["text"])
+    else:
+        st.warning("Vui lòng nhập câu hỏi.")
@@ -0,0 +1,30 @@
+import sys
+
+import pytest
+
+from rag.corpus import SEARCH_ENGINE_DIR
+
+sys.path.insert(0, str(SEARCH_ENGINE_DIR))
+from text_norm import detect_language  # noqa: E402
+
+
+@pytest.mark.parametrize("question", [
+    "Pho in Hanoi",
+    "Pho in Hanoi?",
+    "Best pho in Hanoi?",
+    "What to eat in Da Nang?",
+    "Where is Ben Thanh market?",
+])
+def test_short_english_questions(question):
+    assert detect_language(question) == "en"
+
+
+@pytest.mark.parametrize("question", [
+    "Phở ở Hà Nội",
+    "Ăn gì ở Cần Thơ?",
+    "an gi o ha noi",
+    "Chợ nổi Cái Răng mở cửa mấy giờ?",
+    "pho o dau ngon",
+])
+def test_short_vietnamese_questions(question):
+    assert detect_language(question) == "vi"
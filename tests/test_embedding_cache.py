@@ -0,0 +1,32 @@
+import numpy as np
+
+from rag.embeddings import EmbeddingCache
+
+
+def test_put_after_interrupted_first_put(tmp_path):
+    # a first put that grew vectors.f16 but died before writing keys.bin
+    cache = EmbeddingCache(str(tmp_path), "model", 4)
+    with open(cache.vectors_path, "ab") as f:
+        f.truncate(100 * 4 * 2)
+
+    cache = EmbeddingCache(str(tmp_path), "model", 4)
+    cache.put([b"k" * 16], np.ones((1, 4), dtype=np.float32))
+
+    hits, out = EmbeddingCache(str(tmp_path), "model", 4).get([b"k" * 16])
+    assert hits.tolist() == [True]
+    assert out[0].tolist() == [1.0] * 4
+
+
+def test_put_past_a_mapping_grown_by_another_writer(tmp_path):
+    first = EmbeddingCache(str(tmp_path), "model", 4)
+    second = EmbeddingCache(str(tmp_path), "model", 4)
+    first.put([b"a" * 16], np.zeros((1, 4), dtype=np.float32))
+    second.put([i.to_bytes(16, "big") for i in range(EmbeddingCache.GROW_ROWS + 10)],
+               np.ones((EmbeddingCache.GROW_ROWS + 10, 4), dtype=np.float32))
+
+    first.put([b"b" * 16], np.full((1, 4), 2.0, dtype=np.float32))
+
+    hits, out = second.get([b"b" * 16, b"a" * 16])
+    assert hits.tolist() == [True, True]
+    assert out[0].tolist() == [2.0] * 4
+    assert out[1].tolist() == [0.0] * 4